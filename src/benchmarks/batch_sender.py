@@ -0,0 +1,42 @@
+from time import perf_counter
+import argparse
+import socket
+
+from core.batch_io import BatchSender
+
+PACKET = bytes(60)
+
+
+def bench(count: int, batch_size: int, use_sendmmsg: bool) -> tuple[float, float]:
+    recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    recv_sock.bind(("127.0.0.1", 0))
+    addr = recv_sock.getsockname()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # flush on a full batch only
+    sender = BatchSender(sock, batch_size, 3600, use_sendmmsg)
+
+    start = perf_counter()
+    for _ in range(count):
+        sender.send(PACKET, addr)
+    sender.flush()
+    elapsed = perf_counter() - start
+
+    sock.close()
+    recv_sock.close()
+    return sender.syscalls / elapsed, sender.packets / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched send benchmark on loopback")
+    parser.add_argument("-n", "--count", type=int, default=200_000)
+    parser.add_argument("-b", "--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    for name, use_sendmmsg in (("sendto", False), ("sendmmsg", True)):
+        syscalls, packets = bench(args.count, args.batch_size, use_sendmmsg)
+        print(f"{name:9} {syscalls:12,.0f} syscalls/s {packets:12,.0f} packets/s")
+
+
+if __name__ == "__main__":
+    main()
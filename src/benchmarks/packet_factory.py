@@ -0,0 +1,47 @@
+from time import perf_counter
+import argparse
+import socket
+
+from core.packet_factory import PacketFactory
+
+SRC_ADDR = socket.inet_aton("192.0.2.1")
+DST_ADDR = socket.inet_aton("198.51.100.1")
+SRC_PORT = 54321
+
+
+def bench_generate_packet(count: int) -> float:
+    start = perf_counter()
+    for i in range(count):
+        port = i % 65535 + 1
+        pf = PacketFactory(SRC_ADDR, SRC_PORT, DST_ADDR, port)
+        pf.tcp_header.tcp_syn = 1
+        pf.tcp_header.seq_num = i
+        pf.generate_packet()
+    return count / (perf_counter() - start)
+
+
+def bench_template(count: int) -> float:
+    start = perf_counter()
+    pf = PacketFactory(SRC_ADDR, SRC_PORT, DST_ADDR, 0)
+    pf.tcp_header.tcp_syn = 1
+    template = pf.generate_template()
+    for i in range(count):
+        template.build(i % 65535 + 1, i)
+    return count / (perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SYN packet build benchmark")
+    parser.add_argument("-n", "--count", type=int, default=200_000)
+    args = parser.parse_args()
+
+    before = bench_generate_packet(args.count)
+    after = bench_template(args.count)
+
+    print(f"generate_packet: {before:12,.0f} packets/s")
+    print(f"template:        {after:12,.0f} packets/s")
+    print(f"speedup:         {after / before:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+from dataclasses import asdict, replace
+from time import perf_counter
+import argparse
+import json
+import resource
+import sys
+
+from benchmarks.simnet import Conditions, SimulatedNetwork, reply_flags
+from core.results import PortFinding, PortStatus
+from core.scan_manager import ScanManager
+from core.scanners.probe_profiles import PROFILES, SYN, ProbeProfile
+from core.scanners.scanner import ScanType
+
+# connect scans see the replies to a SYN, the blocking one calls timeouts closed
+CONNECT_PROFILES = {
+    ScanType.TCP: replace(SYN, no_reply=PortStatus.CLOSED),
+    ScanType.ASYNC_TCP: SYN,
+}
+
+
+def expected_status(profile: ProbeProfile, truth: PortStatus) -> PortStatus:
+    flags = reply_flags(profile.flags, truth)
+    status = None if flags is None else profile.classify(flags, 0)
+    return status or profile.no_reply
+
+
+def cpu_time() -> float:
+    # worker processes count once they are reaped, at the end of the scan
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def bench(network: SimulatedNetwork, manager: ScanManager) -> dict:
+    probes = network.probes
+    cpu = cpu_time()
+    start = perf_counter()
+    findings = [f for f in manager.iter_results() if isinstance(f, PortFinding)]
+    wall = perf_counter() - start
+    cpu = cpu_time() - cpu
+    probes = network.probes - probes
+
+    scan_type = manager.scan_type
+    profile = PROFILES.get(scan_type) or CONNECT_PROFILES[scan_type]
+    truth = network.conditions.truth
+    correct = sum(
+        f.status == expected_status(profile, truth(f.host.packed, f.port))
+        for f in findings
+    )
+    targets = len(manager.target_hosts) * len(manager.target_ports)
+    return {
+        "scan_type": scan_type.name.lower(),
+        "workers": manager.workers,
+        "rate": manager.pacer.ceiling if manager.pacer else None,
+        "targets": targets,
+        "findings": len(findings),
+        "probes": probes,
+        "wall_time": wall,
+        "cpu_time": cpu,
+        "probes_per_sec": probes / wall,
+        "targets_per_sec": targets / wall,
+        "accuracy": correct / targets,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Scan benchmark against a simulated network, needs root"
+    )
+    parser.add_argument(
+        "-t",
+        "--scan-types",
+        nargs="+",
+        choices=[t.name.lower() for t in ScanType],
+        default=[t.name.lower() for t in ScanType],
+    )
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[1])
+    parser.add_argument("-H", "--hosts", type=int, default=32)
+    parser.add_argument("-p", "--ports", type=int, default=128)
+    parser.add_argument("-r", "--rate", type=int, default=50_000)
+    parser.add_argument("--open", type=float, default=0.1)
+    parser.add_argument("--closed", type=float, default=0.8)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="JSON report, stdout by default")
+    args = parser.parse_args()
+
+    conditions = Conditions(
+        open_ratio=args.open,
+        closed_ratio=args.closed,
+        latency=args.latency,
+        jitter=args.jitter,
+        loss=args.loss,
+        seed=args.seed,
+    )
+    ports = list(range(1, args.ports + 1))
+
+    results = []
+    with SimulatedNetwork(conditions) as network:
+        for name in args.scan_types:
+            for workers in args.workers:
+                manager = ScanManager(
+                    ScanType[name.upper()],
+                    do_ping=False,
+                    workers=workers,
+                    rate=args.rate,
+                )
+                manager.set_source_ips([str(network.address)])
+                for host in network.hosts(args.hosts):
+                    manager.add_target_host(host)
+                manager.set_target_ports(ports)
+
+                result = bench(network, manager)
+                print(
+                    f"{name:9} workers={workers:<3} {result['probes_per_sec']:12,.0f}"
+                    f" probes/s {result['wall_time']:8.2f}s wall"
+                    f" {result['cpu_time']:8.2f}s cpu {result['accuracy']:8.2%} accurate",
+                    file=sys.stderr,
+                )
+                results.append(result)
+
+    report = {
+        "conditions": asdict(conditions),
+        "hosts": args.hosts,
+        "ports": args.ports,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from ipaddress import IPv4Address, IPv4Network
+from multiprocessing import get_context
+from multiprocessing.process import BaseProcess
+from random import Random
+from struct import pack, pack_into, unpack_from
+from time import monotonic
+from zlib import crc32
+import fcntl
+import os
+import select
+import socket
+
+from core.discovery import checksum
+from core.headers import TCP_ACK, TCP_FIN, TCP_RST, TCP_SYN
+from core.packet_factory import PacketFactory
+from core.results import PortStatus
+
+# linux/if_tun.h and linux/sockios.h
+TUNSETIFF = 0x400454CA
+IFF_TUN = 0x0001
+IFF_NO_PI = 0x1000
+SIOCGIFFLAGS = 0x8913
+SIOCSIFFLAGS = 0x8914
+SIOCSIFADDR = 0x8916
+SIOCSIFNETMASK = 0x891C
+SIOCSIFTXQLEN = 0x8943
+IFF_UP = 0x1
+IFF_RUNNING = 0x40
+# probes queue up here while the responder is busy, the default is 500
+TX_QUEUE_LEN = 1 << 16
+
+# RFC 2544 sets this range aside for benchmarks, it is never routed
+NETWORK = IPv4Network("198.18.0.0/15")
+
+
+@dataclass(frozen=True)
+class Conditions:
+    # the rest of the ports are filtered
+    open_ratio: float = 0.1
+    closed_ratio: float = 0.8
+    # seconds added to every reply, plus up to jitter more
+    latency: float = 0.0
+    jitter: float = 0.0
+    # share of probes dropped before they reach the host
+    loss: float = 0.0
+    seed: int = 0
+
+    def truth(self, addr: bytes, port: int) -> PortStatus:
+        # fixed by the seed, so the scanner can be checked against it
+        share = crc32(addr + pack("!H", port), self.seed) / 0xFFFFFFFF
+        if share < self.open_ratio:
+            return PortStatus.OPEN
+        if share < self.open_ratio + self.closed_ratio:
+            return PortStatus.CLOSED
+        return PortStatus.FILTERED
+
+
+def reply_flags(probe_flags: int, state: PortStatus) -> int | None:
+    # RFC 793: ACKs are reset, closed ports reset, open ports answer SYNs only
+    if state == PortStatus.FILTERED or probe_flags & TCP_RST:
+        return None
+    if probe_flags & TCP_ACK:
+        return TCP_RST
+    if state == PortStatus.CLOSED:
+        return TCP_RST | TCP_ACK
+    if probe_flags & TCP_SYN:
+        return TCP_SYN | TCP_ACK
+    return None
+
+
+def _ifreq(name: str, payload: bytes = b"") -> bytes:
+    return pack("16s", name.encode()) + payload.ljust(16, b"\0")
+
+
+def _sockaddr(addr: IPv4Address) -> bytes:
+    return pack("H2s4s", socket.AF_INET, b"", addr.packed)
+
+
+def open_tun(name: str, address: IPv4Address, netmask: IPv4Address) -> int:
+    fd = os.open("/dev/net/tun", os.O_RDWR | os.O_NONBLOCK)
+    try:
+        fcntl.ioctl(fd, TUNSETIFF, _ifreq(name, pack("H", IFF_TUN | IFF_NO_PI)))
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            fcntl.ioctl(sock, SIOCSIFADDR, _ifreq(name, _sockaddr(address)))
+            fcntl.ioctl(sock, SIOCSIFNETMASK, _ifreq(name, _sockaddr(netmask)))
+            fcntl.ioctl(sock, SIOCSIFTXQLEN, _ifreq(name, pack("i", TX_QUEUE_LEN)))
+            ifr = fcntl.ioctl(sock, SIOCGIFFLAGS, _ifreq(name))
+            (flags,) = unpack_from("H", ifr, 16)
+            flags |= IFF_UP | IFF_RUNNING
+            fcntl.ioctl(sock, SIOCSIFFLAGS, _ifreq(name, pack("H", flags)))
+    except OSError:
+        os.close(fd)
+        raise
+    return fd
+
+
+class Responder:
+    """Answers the TCP probes that come out of the tun device.
+
+    Every probe is answered the way RFC 793 says, from the port state the
+    conditions give it. Only answered handshakes are remembered, so that
+    connect scans see an open port and not a reset.
+    """
+
+    POLL_INTERVAL = 0.05
+    # delayed replies go out in batches, not one wakeup each
+    SLACK = 0.001
+
+    def __init__(self, fd: int, conditions: Conditions):
+        self.fd = fd
+        self.conditions = conditions
+        self.rng = Random(conditions.seed)
+        # replies held back by the latency, as (due, order, packet)
+        self._pending: list[tuple[float, int, bytes]] = []
+        self._order = 0
+        # addresses and ports of the handshakes we answered
+        self._connections: set[bytes] = set()
+
+    def respond(self, packet: bytes) -> bytes | None:
+        if len(packet) < 40 or packet[0] >> 4 != 4 or packet[9] != socket.IPPROTO_TCP:
+            return None
+        begin = (packet[0] & 0x0F) * 4
+        # the probe comes from the peer and goes to one of our hosts
+        peer_addr, host_addr = packet[12:16], packet[16:20]
+        peer_port, host_port, seq, ack = unpack_from("!HHLL", packet, begin)
+        flags = packet[begin + 13]
+
+        if self.rng.random() < self.conditions.loss:
+            return None
+        connection = packet[12:20] + packet[begin : begin + 4]
+        if connection in self._connections:
+            # connect scans finish the handshake, their close gets reset below
+            if not flags & (TCP_FIN | TCP_RST):
+                return None
+            self._connections.discard(connection)
+        reply = reply_flags(flags, self.conditions.truth(host_addr, host_port))
+        if reply is None:
+            return None
+
+        pf = PacketFactory(host_addr, host_port, peer_addr, peer_port)
+        pf.tcp_header.flags = reply
+        if reply == TCP_RST:
+            pf.tcp_header.seq_num = ack
+        else:
+            seg_len = len(packet) - begin - (packet[begin + 12] >> 4) * 4
+            seg_len += bool(flags & TCP_SYN) + bool(flags & TCP_FIN)
+            pf.tcp_header.ack_num = (seq + seg_len) & 0xFFFFFFFF
+        if reply & TCP_SYN:
+            pf.tcp_header.seq_num = self.rng.getrandbits(32)
+            self._connections.add(connection)
+        else:
+            pf.tcp_header.window = 0
+
+        # unlike a raw socket, the tun device takes the ip header as it is
+        pf.ip_header.tot_len = 40
+        out = bytearray(pf.generate_packet())
+        pack_into("!H", out, 10, checksum(bytes(out[:20])))
+        return bytes(out)
+
+    def _schedule(self, reply: bytes):
+        delay = self.conditions.latency + self.rng.random() * self.conditions.jitter
+        if not delay:
+            os.write(self.fd, reply)
+            return
+        self._order += 1
+        heappush(self._pending, (monotonic() + delay, self._order, reply))
+
+    def serve(self, stop, probes):
+        while not stop.is_set():
+            timeout = self.POLL_INTERVAL
+            if self._pending:
+                due = self._pending[0][0] - monotonic()
+                timeout = min(timeout, max(self.SLACK, due))
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+
+            received = 0
+            while readable:
+                try:
+                    packet = os.read(self.fd, 65535)
+                except BlockingIOError:
+                    break
+                received += 1
+                reply = self.respond(packet)
+                if reply is not None:
+                    self._schedule(reply)
+            if received:
+                with probes.get_lock():
+                    probes.value += received
+
+            now = monotonic() + self.SLACK
+            while self._pending and self._pending[0][0] <= now:
+                os.write(self.fd, heappop(self._pending)[2])
+
+
+def _serve(fd: int, conditions: Conditions, stop, probes):
+    Responder(fd, conditions).serve(stop, probes)
+
+
+class SimulatedNetwork:
+    """Hosts on a tun device, answered by a responder in its own process.
+
+    Probes to 198.18.0.0/15 are routed to the device instead of going out,
+    so the kernel never answers them itself. Needs root, linux only.
+    """
+
+    def __init__(self, conditions: Conditions, name: str = "pscan0"):
+        self.conditions = conditions
+        self.name = name
+        self.address = NETWORK[1]
+
+        # fork, the child has to inherit the tun descriptor
+        self._context = get_context("fork")
+        self._stop = self._context.Event()
+        self._probes = self._context.Value("Q", 0)
+        self._process: BaseProcess | None = None
+
+    def __enter__(self) -> "SimulatedNetwork":
+        fd = open_tun(self.name, self.address, NETWORK.netmask)
+        self._process = self._context.Process(
+            target=_serve, args=(fd, self.conditions, self._stop, self._probes)
+        )
+        self._process.start()
+        # the device lives as long as the responder keeps it open
+        os.close(fd)
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._process is not None:
+            self._process.join()
+
+    @property
+    def probes(self) -> int:
+        # packets the hosts got, retransmissions and handshakes included
+        return self._probes.value
+
+    def hosts(self, count: int) -> list[IPv4Address]:
+        # 198.18.0.0/24 is left to the scanner side
+        return [NETWORK[257 + i] for i in range(count)]
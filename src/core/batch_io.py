@@ -0,0 +1,317 @@
+from errno import EAGAIN, EINTR, EWOULDBLOCK
+from struct import pack, pack_into, unpack_from
+from time import monotonic
+import ctypes
+import ctypes.util
+import os
+import socket
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+# big enough for sockaddr_in6
+SOCKADDR_LEN = 28
+
+
+def _load_libc_function(name: str):
+    path = ctypes.util.find_library("c")
+    if path is None:
+        return None
+    try:
+        libc = ctypes.CDLL(path, use_errno=True)
+    except OSError:
+        return None
+    return getattr(libc, name, None)
+
+
+def sockaddr(family: int, addr: tuple[str, int]) -> bytes:
+    host, port = addr[0], addr[1]
+    if family == socket.AF_INET:
+        return (
+            pack("=H", family)
+            + pack("!H", port)
+            + socket.inet_pton(family, host)
+            + bytes(8)
+        )
+    return (
+        pack("=H", family)
+        + pack("!HL", port, 0)
+        + socket.inet_pton(family, host)
+        + pack("=L", 0)
+    )
+
+
+def _packed_address(name: bytes) -> bytes:
+    # the address part of a sockaddr_in or sockaddr_in6
+    (family,) = unpack_from("=H", name)
+    if family == socket.AF_INET:
+        return name[4:8]
+    return name[8:24]
+
+
+class BatchSender:
+    """Queues prepared packets and sends them with one sendmmsg call.
+
+    Falls back to a sendto loop where sendmmsg is not available. Packets are
+    flushed when the batch is full or the oldest one waited flush_interval
+    seconds by the next send, a caller about to go idle flushes them itself.
+    Not thread safe, every sending thread needs its own.
+    """
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        batch_size: int = 64,
+        flush_interval: float = 0.005,
+        use_sendmmsg: bool = True,
+    ):
+        self.sock = sock
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.syscalls = 0
+        self.packets = 0
+
+        self._queue: list[tuple[bytes, tuple[str, int]]] = []
+        self._first_queued = 0.0
+
+        self._sendmmsg = _load_libc_function("sendmmsg") if use_sendmmsg else None
+        if self._sendmmsg is not None:
+            self._setup_batch()
+
+    @property
+    def batched(self) -> bool:
+        return self._sendmmsg is not None
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def send(self, packet: bytes, addr: tuple[str, int]):
+        if not self._queue:
+            self._first_queued = monotonic()
+        self._queue.append((packet, addr))
+
+        if (
+            len(self._queue) >= self.batch_size
+            or monotonic() - self._first_queued >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if not self._queue:
+            return
+
+        sendmmsg = self._sendmmsg
+        if sendmmsg is None:
+            for packet, addr in self._queue:
+                self.sock.sendto(packet, addr)
+            self.syscalls += len(self._queue)
+        else:
+            self._flush_batched(sendmmsg)
+
+        self.packets += len(self._queue)
+        self._queue.clear()
+
+    def _setup_batch(self):
+        # everything but the iovecs and addresses is set once and reused
+        self._msgs = (_MMsgHdr * self.batch_size)()
+        self._iovs = (_IOVec * self.batch_size)()
+        self._names = ctypes.create_string_buffer(SOCKADDR_LEN * self.batch_size)
+        self._names_addr: tuple[str, int] | None = None
+        self._last_addr: tuple[str, int] | None = None
+        self._last_name = b""
+
+        namelen = 16 if self.sock.family == socket.AF_INET else SOCKADDR_LEN
+        names_base = ctypes.addressof(self._names)
+        for i in range(self.batch_size):
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = names_base + i * SOCKADDR_LEN
+            hdr.msg_namelen = namelen
+            hdr.msg_iov = ctypes.pointer(self._iovs[i])
+            hdr.msg_iovlen = 1
+
+    def _name(self, addr: tuple[str, int]) -> bytes:
+        if addr != self._last_addr:
+            self._last_addr = addr
+            self._last_name = sockaddr(self.sock.family, addr).ljust(
+                SOCKADDR_LEN, b"\0"
+            )
+        return self._last_name
+
+    def _flush_batched(self, sendmmsg):
+        count = len(self._queue)
+
+        # one contiguous copy of all packets, the iovecs point into it
+        data = b"".join(packet for packet, _ in self._queue)
+        base = ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value or 0
+        iov_fields: list[int] = []
+        for packet, _ in self._queue:
+            iov_fields += (base, len(packet))
+            base += len(packet)
+        pack_into("PN" * count, self._iovs, 0, *iov_fields)
+
+        addrs = {addr for _, addr in self._queue}
+        if len(addrs) > 1:
+            self._names_addr = None
+            names = b"".join(self._name(addr) for _, addr in self._queue)
+            ctypes.memmove(self._names, names, len(names))
+        elif self._names_addr not in addrs:
+            # usually the whole batch goes to one host
+            self._names_addr = addrs.pop()
+            names = self._name(self._names_addr) * self.batch_size
+            ctypes.memmove(self._names, names, len(names))
+
+        sent = 0
+        while sent < count:
+            first = ctypes.byref(self._msgs, sent * ctypes.sizeof(_MMsgHdr))
+            res = sendmmsg(self.sock.fileno(), first, count - sent, 0)
+            self.syscalls += 1
+            if res < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            sent += res
+
+
+class BatchReceiver:
+    """Receives packets into a preallocated buffer pool.
+
+    Uses recvmmsg to drain a whole batch in one call, or a non-blocking
+    recv_into loop where it is not available, the socket must not have a
+    timeout for that one. Returned views point into the pool and are only
+    valid until the next receive.
+    """
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        batch_size: int = 64,
+        buffer_size: int = 2048,
+        use_recvmmsg: bool = True,
+    ):
+        self.sock = sock
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+
+        self.syscalls = 0
+        self.packets = 0
+
+        # replies are small, anything longer is truncated to the buffer
+        self._pool = bytearray(batch_size * buffer_size)
+        view = memoryview(self._pool)
+        self._slots = [
+            view[i * buffer_size : (i + 1) * buffer_size] for i in range(batch_size)
+        ]
+
+        self._recvmmsg = _load_libc_function("recvmmsg") if use_recvmmsg else None
+        if self._recvmmsg is not None:
+            self._setup_batch()
+
+    def _setup_batch(self):
+        self._msgs = (_MMsgHdr * self.batch_size)()
+        self._iovs = (_IOVec * self.batch_size)()
+        # source addresses, only read by receive_from
+        self._names = ctypes.create_string_buffer(SOCKADDR_LEN * self.batch_size)
+        names_base = ctypes.addressof(self._names)
+
+        base = ctypes.addressof(
+            (ctypes.c_char * len(self._pool)).from_buffer(self._pool)
+        )
+        for i in range(self.batch_size):
+            iov = self._iovs[i]
+            iov.iov_base = base + i * self.buffer_size
+            iov.iov_len = self.buffer_size
+
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = names_base + i * SOCKADDR_LEN
+            hdr.msg_namelen = SOCKADDR_LEN
+            hdr.msg_iov = ctypes.pointer(iov)
+            hdr.msg_iovlen = 1
+
+    def receive(self) -> list[memoryview]:
+        recvmmsg = self._recvmmsg
+        if recvmmsg is None:
+            return self._receive_single()
+
+        count = recvmmsg(
+            self.sock.fileno(), self._msgs, self.batch_size, socket.MSG_DONTWAIT, None
+        )
+        self.syscalls += 1
+        if count < 0:
+            errno = ctypes.get_errno()
+            if errno in (EAGAIN, EWOULDBLOCK, EINTR):
+                return []
+            raise OSError(errno, os.strerror(errno))
+
+        self.packets += count
+        msgs = self._msgs
+        return [
+            self._slots[i][: min(msgs[i].msg_len, self.buffer_size)]
+            for i in range(count)
+        ]
+
+    def receive_from(self) -> list[tuple[memoryview, bytes]]:
+        # ipv6 raw sockets strip the ip header, the sender is only in the address
+        recvmmsg = self._recvmmsg
+        if recvmmsg is None:
+            return self._receive_single_from()
+
+        msgs = self._msgs
+        for i in range(self.batch_size):
+            # the kernel shrinks it to the length of the address it wrote
+            msgs[i].msg_hdr.msg_namelen = SOCKADDR_LEN
+
+        packets = self.receive()
+        names = self._names.raw
+        return [
+            (packet, _packed_address(names[i * SOCKADDR_LEN : (i + 1) * SOCKADDR_LEN]))
+            for i, packet in enumerate(packets)
+        ]
+
+    def _receive_single_from(self) -> list[tuple[memoryview, bytes]]:
+        packets: list[tuple[memoryview, bytes]] = []
+        for slot in self._slots:
+            try:
+                size, addr = self.sock.recvfrom_into(
+                    slot, self.buffer_size, socket.MSG_DONTWAIT
+                )
+            except (BlockingIOError, InterruptedError):
+                break
+            finally:
+                self.syscalls += 1
+            packets.append((slot[:size], socket.inet_pton(self.sock.family, addr[0])))
+
+        self.packets += len(packets)
+        return packets
+
+    def _receive_single(self) -> list[memoryview]:
+        packets: list[memoryview] = []
+        for slot in self._slots:
+            try:
+                size = self.sock.recv_into(slot, self.buffer_size, socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                break
+            finally:
+                self.syscalls += 1
+            packets.append(slot[:size])
+
+        self.packets += len(packets)
+        return packets
@@ -0,0 +1,136 @@
+from base64 import b64decode, b64encode
+from ipaddress import IPv4Address, IPv6Address, ip_address
+from typing import Iterator, TextIO
+from zlib import compress, decompress
+import json
+import os
+
+from core.results import HostFinding, PingStatus, PortFinding, PortStates
+
+
+class Checkpoint:
+    """Append-only log of a scan, so an interrupted scan can be resumed.
+
+    Every line is a JSON record: a header with the fingerprint of the scan
+    configuration and the number of shards it was split in, the hosts that
+    answered ping, and one record per finished chunk with its findings,
+    stored per host as compressed port state bytes. A resumed scan is split
+    the same way, whatever its number of workers. A line cut short by a
+    crash is dropped on resume.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.resume = resume
+
+        self.done: set[int] = set()
+        # shards per group of hosts, the chunk indexes depend on it
+        self.shards = 1
+        self.pinged: list[HostFinding] | None = None
+        self._chunks: list[dict[str, str]] = []
+        self._file: TextIO | None = None
+
+    def open(self, fingerprint: str, shards: int = 1):
+        # a file cut short before its header holds nothing, it starts over
+        resumed = self.resume and os.path.exists(self.path) and self._load(fingerprint)
+        if not resumed:
+            self.shards = shards
+
+        # stays open for the whole scan, closed by close()
+        self._file = open(  # pylint: disable=consider-using-with
+            self.path, "a" if resumed else "w", encoding="utf-8"
+        )
+        if not resumed:
+            self._write(
+                {"version": self.VERSION, "fingerprint": fingerprint, "shards": shards}
+            )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _load(self, fingerprint: str) -> bool:
+        # replays the records, False if there were none
+        valid = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not valid and "fingerprint" not in record:
+                    raise ValueError(f"Checkpoint {self.path} has no header")
+                self._replay(record, fingerprint)
+                valid += len(line)
+
+        # drop a torn last record, new ones are appended after the good ones
+        with open(self.path, "r+b") as f:
+            f.truncate(valid)
+        return valid > 0
+
+    def _replay(self, record: dict, fingerprint: str):
+        if "fingerprint" in record:
+            if record.get("version") != self.VERSION:
+                raise ValueError(
+                    f"Checkpoint {self.path} was written by another version"
+                )
+            if record["fingerprint"] != fingerprint:
+                raise ValueError(
+                    f"Checkpoint {self.path} was written for a different scan"
+                )
+            self.shards = record["shards"]
+        elif "ping" in record:
+            self.pinged = [
+                HostFinding(ip_address(host), PingStatus(delay_ms, success))
+                for host, delay_ms, success in record["ping"]
+            ]
+        elif "chunk" in record:
+            self.done.add(record["chunk"])
+            self._chunks.append(record["ports"])
+
+    def _write(self, record: dict):
+        if self._file is None:
+            raise ValueError("Checkpoint is not open")
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+        # a checkpoint has to survive a reboot, not only a crash
+        os.fsync(self._file.fileno())
+
+    def record_ping(self, pinged: list[HostFinding]):
+        self.pinged = pinged
+        self._write(
+            {
+                "ping": [
+                    [str(f.host), f.ping_status.delay_ms, f.ping_status.success]
+                    for f in pinged
+                ]
+            }
+        )
+
+    def record_chunk(self, index: int, findings: list[PortFinding]):
+        by_host: dict[IPv4Address | IPv6Address, PortStates] = {}
+        for finding in findings:
+            by_host.setdefault(finding.host, PortStates())[finding.port] = (
+                finding.status
+            )
+
+        ports = {
+            str(host): b64encode(compress(states.to_bytes())).decode()
+            for host, states in by_host.items()
+        }
+        self._write({"chunk": index, "ports": ports})
+        self.done.add(index)
+
+    def saved_findings(self) -> Iterator[PortFinding]:
+        # findings of the chunks finished before the scan was resumed
+        for ports in self._chunks:
+            for host, data in ports.items():
+                address = ip_address(host)
+                states = PortStates.from_bytes(decompress(b64decode(data)))
+                for port, status in states.items():
+                    yield PortFinding(address, port, status)
@@ -0,0 +1,15 @@
+from hashlib import blake2b
+import os
+
+# bytes of key, too many to guess from the cookies seen on the wire
+KEY_LEN = 16
+
+
+def new_key() -> bytes:
+    return os.urandom(KEY_LEN)
+
+
+def keyed_cookie(data: bytes, key: bytes) -> int:
+    # a keyed PRF, unlike a crc a cookie seen for one target tells nothing of
+    # the cookie of another
+    return int.from_bytes(blake2b(data, key=key, digest_size=4).digest(), "big")
@@ -0,0 +1,189 @@
+from ipaddress import IPv4Address, IPv6Address
+from struct import Struct, pack_into
+from threading import Event, Thread
+from time import monotonic, monotonic_ns
+from typing import Sequence
+import select
+import socket
+
+from core.batch_io import BatchReceiver, BatchSender
+from core.cookie import keyed_cookie, new_key
+from core.pacer import Pacer
+from core.rtt import RTTEstimator
+from core.targets import host_count
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+# type, code, checksum, identifier, sequence
+ECHO_STRUCT = Struct("!BBHHH")
+# target address, cookie and send time, echoed back by the host
+PAYLOAD_STRUCT = Struct("!16sLQ")
+
+
+def checksum(data: bytes) -> int:
+    if len(data) % 2 == 1:
+        data += b"\x00"
+    s = sum(Struct(f"!{len(data) // 2}H").unpack(data))
+    s = (s & 0xFFFF) + (s >> 16)
+    s = (s & 0xFFFF) + (s >> 16)
+    return ~s & 0xFFFF
+
+
+class ICMPDiscovery:
+    """Finds live hosts with one sweep of ICMP and ICMPv6 echo requests.
+
+    Requests to all hosts go out as fast as the pacer allows while a
+    receiver thread matches replies by identifier and sequence. Each
+    request carries its target, a keyed hash of it and the send time, so
+    nothing is stored per host until it answers.
+    """
+
+    POLL_INTERVAL = 0.01
+
+    def __init__(
+        self,
+        pacer: Pacer,
+        timeout: float = 1.0,
+        retries: int = 2,
+        batch_size: int = 64,
+    ):
+        self.pacer = pacer
+        self.timeout = timeout
+        self.retries = retries
+        self.batch_size = batch_size
+        self.rtt = RTTEstimator(initial_rto=timeout, max_rto=timeout)
+
+        self.key = new_key()
+        self.ident = int.from_bytes(self.key[:2], "big")
+        # rtt in seconds of every host that answered
+        self.alive: dict[IPv4Address | IPv6Address, float] = {}
+
+        self._expected = 0
+        self._stop = Event()
+        self._answered = Event()
+
+    def cookie(self, addr: bytes) -> int:
+        return keyed_cookie(addr, self.key)
+
+    def echo_request(self, host: IPv4Address | IPv6Address) -> bytes:
+        addr = host.packed.ljust(16, b"\0")
+        cookie = self.cookie(addr)
+        packet = bytearray(ECHO_STRUCT.size + PAYLOAD_STRUCT.size)
+        PAYLOAD_STRUCT.pack_into(packet, ECHO_STRUCT.size, addr, cookie, monotonic_ns())
+
+        if host.version == 4:
+            ECHO_STRUCT.pack_into(
+                packet, 0, ICMP_ECHO_REQUEST, 0, 0, self.ident, cookie & 0xFFFF
+            )
+            pack_into("!H", packet, 2, checksum(bytes(packet)))
+        else:
+            # the kernel fills in the ICMPv6 checksum
+            ECHO_STRUCT.pack_into(
+                packet, 0, ICMPV6_ECHO_REQUEST, 0, 0, self.ident, cookie & 0xFFFF
+            )
+        return bytes(packet)
+
+    def _open_sockets(self) -> dict[int, socket.socket]:
+        socks = {4: socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)}
+        try:
+            socks[6] = socket.socket(
+                socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_ICMPV6
+            )
+        except OSError:
+            # no ipv6 here, those hosts are reported as down
+            pass
+        return socks
+
+    def run(
+        self, hosts: Sequence[IPv4Address | IPv6Address]
+    ) -> dict[IPv4Address | IPv6Address, float]:
+        self._expected = host_count(hosts)
+        socks = self._open_sockets()
+        receiver = Thread(target=self._receive_loop, args=(socks,), daemon=True)
+        receiver.start()
+
+        senders = {
+            version: BatchSender(sock, self.batch_size)
+            for version, sock in socks.items()
+        }
+
+        def flush():
+            for sender in senders.values():
+                sender.flush()
+
+        try:
+            for _ in range(self.retries):
+                for host in hosts:
+                    sender = senders.get(host.version)
+                    if sender is None or host in self.alive:
+                        continue
+                    self.pacer.acquire(before_sleep=flush)
+                    sender.send(self.echo_request(host), (str(host), 0))
+                flush()
+                if self._wait():
+                    break
+        finally:
+            self._stop.set()
+            receiver.join()
+            for sock in socks.values():
+                sock.close()
+
+        return self.alive
+
+    def _wait(self) -> bool:
+        # a host not heard from yet may be far away, the full timeout is
+        # waited unless every host answered
+        start = monotonic()
+        while not self._answered.wait(self.POLL_INTERVAL):
+            if monotonic() - start >= self.timeout:
+                return False
+        return True
+
+    def _receive_loop(self, socks: dict[int, socket.socket]):
+        receivers = {
+            sock: (version, BatchReceiver(sock, self.batch_size))
+            for version, sock in socks.items()
+        }
+        while not self._stop.is_set():
+            readable, _, _ = select.select(list(receivers), [], [], self.POLL_INTERVAL)
+            for sock in readable:
+                version, receiver = receivers[sock]
+                for packet in receiver.receive():
+                    if version == 4:
+                        # raw ipv4 sockets get the ip header too
+                        self.handle_reply(packet, (packet[0] & 0x0F) * 4, 4)
+                    else:
+                        self.handle_reply(packet, 0, 6)
+
+    def handle_reply(self, packet: memoryview, begin: int, version: int):
+        if len(packet) < begin + ECHO_STRUCT.size + PAYLOAD_STRUCT.size:
+            return
+
+        icmp_type, _, _, ident, seq = ECHO_STRUCT.unpack_from(packet, begin)
+        reply_type = ICMP_ECHO_REPLY if version == 4 else ICMPV6_ECHO_REPLY
+        if icmp_type != reply_type or ident != self.ident:
+            return
+
+        addr, cookie, sent = PAYLOAD_STRUCT.unpack_from(
+            packet, begin + ECHO_STRUCT.size
+        )
+        if cookie != self.cookie(addr) or seq != cookie & 0xFFFF:
+            return
+
+        host: IPv4Address | IPv6Address
+        if version == 4:
+            host = IPv4Address(addr[:4])
+        else:
+            host = IPv6Address(addr)
+        if host in self.alive:
+            return
+
+        rtt = (monotonic_ns() - sent) / 1e9
+        self.alive[host] = rtt
+        self.rtt.update(str(host), rtt)
+        self.pacer.on_reply()
+        if len(self.alive) >= self._expected:
+            self._answered.set()
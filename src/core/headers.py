@@ -1,10 +1,30 @@
 from socket import IPPROTO_TCP, htons
-from struct import pack, unpack
+from struct import Struct
 from dataclasses import dataclass
 
 IP_HDR_LEN = 20
-TCP_HDR_BEGIN = 20
-TCP_HDR_END = 40
+IPV6_HDR_LEN = 40
+
+IP_STRUCT = Struct("!BBHHHBBH4s4s")
+IPV6_STRUCT = Struct("!LHBB16s16s")
+TCP_STRUCT = Struct("!HHLLBBHHH")
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+TCP_URG = 0x20
+
+TCP_OPT_EOL = 0
+TCP_OPT_NOP = 1
+TCP_OPT_MSS = 2
+TCP_OPT_WSCALE = 3
+TCP_OPT_SACK_PERM = 4
+TCP_OPT_TIMESTAMP = 8
+
+_MSS_STRUCT = Struct("!H")
+_TIMESTAMP_STRUCT = Struct("!LL")
 
 
 @dataclass
@@ -20,11 +40,11 @@ class IPHeader:
     ttl: int = 255
     proto: int = IPPROTO_TCP
     check: int = 0  # kernel will also do this
+    options: bytes = b""  # only parsed, never sent
 
     def get_header(self):
         ihl_ver = (self.version << 4) + self.ihl
-        return pack(
-            "!BBHHHBBH4s4s",
+        return IP_STRUCT.pack(
             ihl_ver,
             self.dscp_ecn,
             self.tot_len,
@@ -50,7 +70,7 @@ class IPHeader:
             check,
             src_addr,
             dst_addr,
-        ) = unpack("!BBHHHBBH4s4s", data)
+        ) = IP_STRUCT.unpack_from(data)
 
         version = ihl_ver >> 4
         ihl = ihl_ver & 0x0F
@@ -67,9 +87,58 @@ class IPHeader:
             ttl=ttl,
             proto=proto,
             check=check,
+            options=bytes(data[IP_HDR_LEN : ihl * 4]),
         )
 
 
+@dataclass
+class IPv6Header:
+    src_addr: bytes
+    dst_addr: bytes
+    version: int = 6
+    traffic_class: int = 0
+    flow_label: int = 0
+    payload_len: int = 0  # unlike ipv4, not filled in by the kernel
+    next_header: int = IPPROTO_TCP
+    hop_limit: int = 255
+
+    def get_header(self):
+        ver_tc_flow = (
+            (self.version << 28) | (self.traffic_class << 20) | self.flow_label
+        )
+        return IPV6_STRUCT.pack(
+            ver_tc_flow,
+            self.payload_len,
+            self.next_header,
+            self.hop_limit,
+            self.src_addr,
+            self.dst_addr,
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        (
+            ver_tc_flow,
+            payload_len,
+            next_header,
+            hop_limit,
+            src_addr,
+            dst_addr,
+        ) = IPV6_STRUCT.unpack_from(data)
+
+        return cls(
+            src_addr=src_addr,
+            dst_addr=dst_addr,
+            version=ver_tc_flow >> 28,
+            traffic_class=(ver_tc_flow >> 20) & 0xFF,
+            flow_label=ver_tc_flow & 0xFFFFF,
+            payload_len=payload_len,
+            next_header=next_header,
+            hop_limit=hop_limit,
+        )
+
+
+# pylint: disable=too-many-instance-attributes
 @dataclass
 class TCPHeader:
     src_port: int
@@ -91,9 +160,17 @@ class TCPHeader:
     check: int = 0
     urg_ptr: int = 0
 
-    def get_header(self):
-        offset_res = self.data_off << 4
-        tcp_flags = (
+    # options, only parsed, never sent
+    options: bytes = b""
+    mss: int | None = None
+    window_scale: int | None = None
+    sack_permitted: bool = False
+    ts_val: int | None = None
+    ts_ecr: int | None = None
+
+    @property
+    def flags(self) -> int:
+        return (
             self.tcp_fin
             + (self.tcp_syn << 1)
             + (self.tcp_rst << 2)
@@ -103,14 +180,27 @@ class TCPHeader:
             + (self.tcp_ece << 6)
             + (self.tcp_cwr << 7)
         )
-        return pack(
-            "!HHLLBBHHH",
+
+    @flags.setter
+    def flags(self, tcp_flags: int):
+        self.tcp_fin = tcp_flags & 0x01
+        self.tcp_syn = (tcp_flags >> 1) & 0x01
+        self.tcp_rst = (tcp_flags >> 2) & 0x01
+        self.tcp_psh = (tcp_flags >> 3) & 0x01
+        self.tcp_ack = (tcp_flags >> 4) & 0x01
+        self.tcp_urg = (tcp_flags >> 5) & 0x01
+        self.tcp_ece = (tcp_flags >> 6) & 0x01
+        self.tcp_cwr = (tcp_flags >> 7) & 0x01
+
+    def get_header(self):
+        offset_res = self.data_off << 4
+        return TCP_STRUCT.pack(
             self.src_port,
             self.dst_port,
             self.seq_num,
             self.ack_num,
             offset_res,
-            tcp_flags,
+            self.flags,
             self.window,
             self.check,
             self.urg_ptr,
@@ -128,11 +218,11 @@ class TCPHeader:
             window,
             check,
             urg_ptr,
-        ) = unpack("!HHLLBBHHH", data)
+        ) = TCP_STRUCT.unpack_from(data)
 
         data_off = offset_res >> 4
 
-        return cls(
+        header = cls(
             src_port=src_port,
             dst_port=dst_port,
             seq_num=seq_num,
@@ -149,10 +239,42 @@ class TCPHeader:
             window=window,
             check=check,
             urg_ptr=urg_ptr,
+            options=bytes(data[TCP_STRUCT.size : data_off * 4]),
         )
+        header.parse_options()
+        return header
+
+    def parse_options(self):
+        opts = self.options
+        i = 0
+        while i < len(opts):
+            kind = opts[i]
+            if kind == TCP_OPT_EOL:
+                break
+            if kind == TCP_OPT_NOP:
+                i += 1
+                continue
+
+            if i + 1 >= len(opts) or opts[i + 1] < 2:
+                break  # malformed, keep what we have
+            length = opts[i + 1]
+            if i + length > len(opts):
+                break
+
+            if kind == TCP_OPT_MSS and length == 4:
+                (self.mss,) = _MSS_STRUCT.unpack_from(opts, i + 2)
+            elif kind == TCP_OPT_WSCALE and length == 3:
+                self.window_scale = opts[i + 2]
+            elif kind == TCP_OPT_SACK_PERM and length == 2:
+                self.sack_permitted = True
+            elif kind == TCP_OPT_TIMESTAMP and length == 10:
+                self.ts_val, self.ts_ecr = _TIMESTAMP_STRUCT.unpack_from(opts, i + 2)
+
+            i += length
 
 
-def unpack_headers(packet: bytes) -> tuple[IPHeader, TCPHeader]:
-    ip_data = packet[:IP_HDR_LEN]
-    tcp_data = packet[TCP_HDR_BEGIN:TCP_HDR_END]
-    return IPHeader.from_bytes(ip_data), TCPHeader.from_bytes(tcp_data)
+def unpack_headers(packet: bytes | memoryview) -> tuple[IPHeader, TCPHeader]:
+    # both headers may carry options, so offsets come from ihl and data_off
+    ip_hdr = IPHeader.from_bytes(packet)
+    tcp_hdr = TCPHeader.from_bytes(memoryview(packet)[ip_hdr.ihl * 4 :])
+    return ip_hdr, tcp_hdr
@@ -0,0 +1,236 @@
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field
+from threading import Event, Thread
+from time import monotonic
+from typing import Callable, TextIO
+import json
+import socket
+import sys
+
+REPLY_SYN_ACK = "syn_ack"
+REPLY_RST = "rst"
+REPLY_ICMP = "icmp"
+# not ours, or ours but saying nothing about the port
+REPLY_UNRELATED = "unrelated"
+REPLY_CLASSES = (REPLY_SYN_ACK, REPLY_RST, REPLY_ICMP, REPLY_UNRELATED)
+
+# upper bounds in seconds, doubling from 100us to about 13s
+RTT_BOUNDS = tuple(0.0001 * 2**i for i in range(18))
+
+
+@dataclass
+class Histogram:
+    bounds: tuple[float, ...] = RTT_BOUNDS
+    # one count per bound plus the values past the last one
+    counts: list[int] = field(default_factory=list)
+    total: float = 0.0
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * (len(self.bounds) + 1)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def quantile(self, q: float) -> float | None:
+        # the bound of the bucket the quantile falls in, not interpolated
+        wanted = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if count and seen >= wanted:
+                return bound
+        return None if not self.count else float("inf")
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        return Histogram(
+            self.bounds,
+            [a + b for a, b in zip(self.counts, other.counts)],
+            self.total + other.total,
+        )
+
+
+@dataclass
+class ScanMetrics:  # pylint: disable=too-many-instance-attributes
+    """Counters of the probe hot path, None on scanners when disabled.
+
+    Every field is written by one thread only, the sender or the receiver,
+    so they are not locked. A reader may see a slightly stale snapshot.
+    """
+
+    probes: int = 0
+    retransmits: int = 0
+    timeouts: int = 0
+    replies: dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(REPLY_CLASSES, 0)
+    )
+    rtt: Histogram = field(default_factory=Histogram)
+    # seconds spent in each part of the hot path
+    build_time: float = 0.0
+    send_time: float = 0.0
+    receive_time: float = 0.0
+    parse_time: float = 0.0
+
+    def on_probe(self, build_time: float, send_time: float, retransmit: bool):
+        self.probes += 1
+        self.retransmits += retransmit
+        self.build_time += build_time
+        self.send_time += send_time
+
+    def merge(self, other: "ScanMetrics") -> "ScanMetrics":
+        # workers run side by side, so their counters add up
+        return ScanMetrics(
+            probes=self.probes + other.probes,
+            retransmits=self.retransmits + other.retransmits,
+            timeouts=self.timeouts + other.timeouts,
+            replies={
+                kind: self.replies[kind] + other.replies[kind] for kind in REPLY_CLASSES
+            },
+            rtt=self.rtt.merge(other.rtt),
+            build_time=self.build_time + other.build_time,
+            send_time=self.send_time + other.send_time,
+            receive_time=self.receive_time + other.receive_time,
+            parse_time=self.parse_time + other.parse_time,
+        )
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["rtt"] = {
+            "count": self.rtt.count,
+            "sum": self.rtt.total,
+            "p50": self.rtt.quantile(0.5),
+            "p99": self.rtt.quantile(0.99),
+            "buckets": dict(zip(map(str, self.rtt.bounds), self.rtt.counts)),
+            "overflow": self.rtt.counts[-1],
+        }
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# TYPE portscanner_probes_total counter",
+            f"portscanner_probes_total {self.probes}",
+            "# TYPE portscanner_retransmits_total counter",
+            f"portscanner_retransmits_total {self.retransmits}",
+            "# TYPE portscanner_timeouts_total counter",
+            f"portscanner_timeouts_total {self.timeouts}",
+            "# TYPE portscanner_replies_total counter",
+        ]
+        lines += [
+            f'portscanner_replies_total{{class="{kind}"}} {count}'
+            for kind, count in self.replies.items()
+        ]
+        lines.append("# TYPE portscanner_phase_seconds_total counter")
+        for phase in ("build", "send", "receive", "parse"):
+            seconds = getattr(self, f"{phase}_time")
+            lines.append(
+                f'portscanner_phase_seconds_total{{phase="{phase}"}} {seconds}'
+            )
+
+        lines.append("# TYPE portscanner_rtt_seconds histogram")
+        cumulative = 0
+        for bound, count in zip(self.rtt.bounds, self.rtt.counts):
+            cumulative += count
+            lines.append(
+                f'portscanner_rtt_seconds_bucket{{le="{bound:g}"}} {cumulative}'
+            )
+        lines.append(f'portscanner_rtt_seconds_bucket{{le="+Inf"}} {self.rtt.count}')
+        lines.append(f"portscanner_rtt_seconds_sum {self.rtt.total}")
+        lines.append(f"portscanner_rtt_seconds_count {self.rtt.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _ms(seconds: float | None) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:g}ms"
+
+
+class ProgressReporter:
+    """Prints a line of scan metrics every interval, from a thread of its own."""
+
+    def __init__(
+        self,
+        get_metrics: Callable[[], ScanMetrics | None],
+        interval: float = 5.0,
+        out: TextIO = sys.stderr,
+    ):
+        self.get_metrics = get_metrics
+        self.interval = interval
+        self.out = out
+        self._stop = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "ProgressReporter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        start = last = monotonic()
+        last_probes = 0
+        while not self._stop.wait(self.interval):
+            metrics = self.get_metrics()
+            if metrics is None:
+                continue
+            now = monotonic()
+            rate = (metrics.probes - last_probes) / (now - last)
+            last, last_probes = now, metrics.probes
+            print(self.format(metrics, now - start, rate), file=self.out, flush=True)
+
+    @staticmethod
+    def format(metrics: ScanMetrics, elapsed: float, rate: float) -> str:
+        replies = ", ".join(f"{n} {kind}" for kind, n in metrics.replies.items())
+        return (
+            f"[{elapsed:.1f}s] {metrics.probes} probes ({rate:.0f}/s), "
+            f"{metrics.retransmits} retransmits, {metrics.timeouts} timeouts, "
+            f"replies: {replies}, "
+            f"rtt p50 {_ms(metrics.rtt.quantile(0.5))} "
+            f"p99 {_ms(metrics.rtt.quantile(0.99))}, "
+            f"cpu: build {metrics.build_time:.2f}s send {metrics.send_time:.2f}s "
+            f"receive {metrics.receive_time:.2f}s parse {metrics.parse_time:.2f}s"
+        )
+
+
+def serve_prometheus(
+    get_metrics: Callable[[], ScanMetrics | None],
+    port: int,
+    host: str = "127.0.0.1",
+):
+    # only loaded when asked for, the http server is slow to import
+    from http.server import (  # pylint: disable=import-outside-toplevel
+        BaseHTTPRequestHandler,
+        ThreadingHTTPServer,
+    )
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            metrics = get_metrics()
+            if self.path != "/metrics" or metrics is None:
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    # local only unless asked otherwise, the metrics tell what is scanned
+    class Server(ThreadingHTTPServer):
+        address_family = socket.AF_INET6 if ":" in host else socket.AF_INET
+
+    server = Server((host, port), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
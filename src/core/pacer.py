@@ -0,0 +1,184 @@
+from dataclasses import dataclass
+from threading import Lock
+from time import monotonic, sleep
+from typing import Callable
+
+
+@dataclass
+class PacerStats:
+    ceiling: float = 0.0
+    rate: float = 0.0
+    sent: int = 0
+    replies: int = 0
+    elapsed: float = 0.0
+    backoffs: int = 0
+
+    @property
+    def achieved_rate(self) -> float:
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def merge(self, other: "PacerStats") -> "PacerStats":
+        # workers run side by side, so their rates add up
+        return PacerStats(
+            ceiling=self.ceiling + other.ceiling,
+            rate=self.rate + other.rate,
+            sent=self.sent + other.sent,
+            replies=self.replies + other.replies,
+            elapsed=max(self.elapsed, other.elapsed),
+            backoffs=self.backoffs + other.backoffs,
+        )
+
+    def __str__(self):
+        return (
+            f"{self.achieved_rate:.0f} packets/s achieved "
+            f"(ceiling {self.ceiling:.0f}, now {self.rate:.0f}), "
+            f"{self.sent} sent, {self.replies} replies, {self.backoffs} backoffs"
+        )
+
+
+class Pacer:
+    """Token bucket limiting the send rate of every scanner sharing it.
+
+    The rate starts at the ceiling and is adjusted AIMD style once per
+    window: when the share of probes that get a reply collapses compared
+    to what we have seen so far, the rate is halved, otherwise it slowly
+    grows back to the ceiling.
+    """
+
+    WINDOW = 0.5
+    MIN_WINDOW_PROBES = 100
+    COLLAPSE = 0.5
+    DECREASE = 0.5
+    INCREASE = 0.05
+    # sleeping for less than this costs more than it paces
+    MIN_SLEEP = 0.001
+    # seconds of probes the bucket lets out at once, no rate is measured
+    # over less than that
+    BURST = 0.01
+
+    def __init__(self, rate: float, min_rate: float = 10.0):
+        self.ceiling = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+
+        self.sent = 0
+        self.replies = 0
+        self.backoffs = 0
+
+        self._lock = Lock()
+        self._tokens = 0.0
+        self._last = 0.0
+        self._start = 0.0
+        # when the last probe left, the send phase is timed up to it
+        self._end = 0.0
+
+        self._window_start = 0.0
+        self._window_sent = 0
+        self._window_replies = 0
+        self._baseline: float | None = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def split(self, parts: int) -> "Pacer":
+        # for workers in other processes, each gets an equal share
+        return Pacer(max(1.0, self.ceiling / parts), self.min_rate)
+
+    @property
+    def burst(self) -> float:
+        return max(1.0, self.rate * self.BURST)
+
+    def start(self):
+        # the send phase begins, shards sharing the pacer only start it once
+        with self._lock:
+            self._start_at(monotonic())
+
+    def _start_at(self, now: float):
+        if not self._start:
+            self._start = self._last = self._window_start = now
+            self._tokens = self.burst
+
+    def acquire(
+        self,
+        retransmit: bool = False,
+        before_sleep: Callable[[], None] | None = None,
+    ):
+        with self._lock:
+            now = monotonic()
+            self._start_at(now)
+
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= 1
+
+            self.sent += 1
+            # a retransmission is expected to go unanswered
+            if not retransmit:
+                self._window_sent += 1
+            if now - self._window_start >= self.WINDOW:
+                self._adjust(now)
+
+            delay = -self._tokens / self.rate
+
+        if delay < self.MIN_SLEEP:
+            return
+        if before_sleep is not None:
+            # e.g. send what is queued, it would otherwise wait out the sleep
+            wake = monotonic() + delay
+            before_sleep()
+            delay = wake - monotonic()
+        if delay > 0:
+            sleep(delay)
+
+    def on_flush(self):
+        # the probes paced so far are out, sleeps included
+        with self._lock:
+            self._end = monotonic()
+
+    def on_reply(self):
+        with self._lock:
+            self.replies += 1
+            self._window_replies += 1
+
+    def _adjust(self, now: float):
+        sent, replies = self._window_sent, self._window_replies
+        if sent < self.MIN_WINDOW_PROBES:
+            return
+
+        self._window_start = now
+        self._window_sent = self._window_replies = 0
+
+        # replies to the previous window can land in this one, a share
+        # above 1 would raise the baseline past anything reachable
+        ratio = min(1.0, replies / sent)
+        if self._baseline is None:
+            self._baseline = ratio
+        elif ratio < self._baseline * self.COLLAPSE:
+            # drops upstream, back off before the results turn into FILTERED
+            self.rate = max(self.min_rate, self.rate * self.DECREASE)
+            self.backoffs += 1
+        else:
+            self._baseline = 0.9 * self._baseline + 0.1 * ratio
+            self.rate = min(self.ceiling, self.rate + self.ceiling * self.INCREASE)
+
+    def stats(self) -> PacerStats:
+        with self._lock:
+            return PacerStats(
+                ceiling=self.ceiling,
+                rate=self.rate,
+                sent=self.sent,
+                replies=self.replies,
+                elapsed=max(self._end, self._last, self._start + self.BURST)
+                - self._start
+                if self._start
+                else 0.0,
+                backoffs=self.backoffs,
+            )
@@ -1,12 +1,94 @@
-from struct import pack, unpack
+from abc import ABC, abstractmethod
+from struct import Struct, pack, pack_into, unpack
 from socket import IPPROTO_TCP
 
-from core.headers import IPHeader, TCPHeader
+from core.headers import (
+    IPHeader,
+    IPv6Header,
+    TCPHeader,
+    IP_HDR_LEN,
+    IPV6_HDR_LEN,
+    TCP_ACK,
+)
 
 
-class PacketFactory:
-    def __init__(self, src_addr: bytes, src_port: int, dst_addr: bytes, dst_port: int):
-        self.ip_header = IPHeader(src_addr=src_addr, dst_addr=dst_addr)
+class PacketTemplate:
+    """Pre-packed IP and TCP headers for one (src, dst) pair.
+
+    Per-probe fields are patched in place and the TCP checksum is updated
+    incrementally as in RFC 1624 instead of being summed over again. A
+    template packed with a zero destination address can be shared by all
+    hosts, the address is then patched in per probe too.
+
+    Probes with ACK set are answered with an RST whose seq is our ack, so
+    seq is patched into the ack field too. ICMP errors that only quote the
+    first 8 bytes of TCP still carry it in the seq field.
+    """
+
+    IP_ID_OFFSET = 4
+    DST_ADDR_OFFSET = 16
+    DST_PORT_OFFSET = IP_HDR_LEN + 2
+    SEQ_OFFSET = IP_HDR_LEN + 4
+    ACK_OFFSET = IP_HDR_LEN + 8
+    FLAGS_OFFSET = IP_HDR_LEN + 13
+    CHECK_OFFSET = IP_HDR_LEN + 16
+    # the destination address as words of the pseudo header
+    ADDR_WORDS = Struct("!2H")
+
+    def __init__(self, packet: bytes, check: int):
+        # packed with dst port, seq, ack and ip id set to 0
+        self.packet = bytearray(packet)
+        self.check = check
+        self.seq_in_ack = bool(packet[self.FLAGS_OFFSET] & TCP_ACK)
+
+    def build(
+        self, dst_port: int, seq: int, ip_id: int = 0, dst_addr: bytes | None = None
+    ) -> bytes:
+        # RFC 1624 eqn. 3, HC' = ~(~HC + ~m + m'). Every patched field is 0
+        # in the template and ~0 is negative zero, so only m' is added.
+        seq_sum = (seq >> 16) + (seq & 0xFFFF)
+        if self.seq_in_ack:
+            seq_sum *= 2
+        s = (~self.check & 0xFFFF) + dst_port + seq_sum
+
+        packet = self.packet
+        if dst_addr is not None:
+            # the address is part of the pseudo header
+            s += sum(self.ADDR_WORDS.unpack(dst_addr))
+            begin = self.DST_ADDR_OFFSET
+            packet[begin : begin + len(dst_addr)] = dst_addr
+
+        s = (s & 0xFFFF) + (s >> 16)
+        s = (s & 0xFFFF) + (s >> 16)
+
+        pack_into("!H", packet, self.IP_ID_OFFSET, ip_id)
+        pack_into("!H", packet, self.DST_PORT_OFFSET, dst_port)
+        pack_into("!L", packet, self.SEQ_OFFSET, seq)
+        if self.seq_in_ack:
+            pack_into("!L", packet, self.ACK_OFFSET, seq)
+        pack_into("!H", packet, self.CHECK_OFFSET, ~s & 0xFFFF)
+        return bytes(packet)
+
+
+class IPv6PacketTemplate(PacketTemplate):
+    """PacketTemplate behind an IPv6 header.
+
+    IPv6 has no identification field, ip_id goes to the low bits of the
+    flow label instead, which are not checksummed either.
+    """
+
+    IP_ID_OFFSET = 2
+    DST_ADDR_OFFSET = 24
+    DST_PORT_OFFSET = IPV6_HDR_LEN + 2
+    SEQ_OFFSET = IPV6_HDR_LEN + 4
+    ACK_OFFSET = IPV6_HDR_LEN + 8
+    FLAGS_OFFSET = IPV6_HDR_LEN + 13
+    CHECK_OFFSET = IPV6_HDR_LEN + 16
+    ADDR_WORDS = Struct("!8H")
+
+
+class BasePacketFactory(ABC):
+    def __init__(self, src_port: int, dst_port: int):
         self.tcp_header = TCPHeader(src_port=src_port, dst_port=dst_port)
 
     def _checksum(self, msg: bytes) -> int:
@@ -20,13 +102,17 @@ class PacketFactory:
 
         return ~s & 0xFFFF
 
+    @abstractmethod
     def _generate_pseudo_header(self, tcp_hdr_len: int, usr_data_len: int) -> bytes:
-        src_addr = self.ip_header.src_addr
-        dst_addr = self.ip_header.dst_addr
-        placeholder = 0
-        protocol = IPPROTO_TCP
-        length = tcp_hdr_len + usr_data_len
-        return pack("!4s4sBBH", src_addr, dst_addr, placeholder, protocol, length)
+        pass
+
+    @abstractmethod
+    def _generate_ip_header(self, payload_len: int) -> bytes:
+        pass
+
+    @abstractmethod
+    def generate_template(self) -> PacketTemplate:
+        pass
 
     def generate_packet(self, msg: bytes = bytes()) -> bytes:
         self.tcp_header.check = 0
@@ -38,6 +124,67 @@ class PacketFactory:
 
         self.tcp_header.check = checksum
         tcp_hdr = self.tcp_header.get_header()
-        ip_hdr = self.ip_header.get_header()
+        ip_hdr = self._generate_ip_header(len(tcp_hdr) + len(msg))
 
         return ip_hdr + tcp_hdr + msg
+
+
+class PacketFactory(BasePacketFactory):
+    def __init__(self, src_addr: bytes, src_port: int, dst_addr: bytes, dst_port: int):
+        super().__init__(src_port, dst_port)
+        self.ip_header = IPHeader(src_addr=src_addr, dst_addr=dst_addr)
+
+    def _generate_pseudo_header(self, tcp_hdr_len: int, usr_data_len: int) -> bytes:
+        src_addr = self.ip_header.src_addr
+        dst_addr = self.ip_header.dst_addr
+        placeholder = 0
+        protocol = IPPROTO_TCP
+        length = tcp_hdr_len + usr_data_len
+        return pack("!4s4sBBH", src_addr, dst_addr, placeholder, protocol, length)
+
+    def _generate_ip_header(self, payload_len: int) -> bytes:
+        return self.ip_header.get_header()
+
+    def generate_template(self) -> PacketTemplate:
+        self.ip_header.id = 0
+        self.tcp_header.dst_port = 0
+        self.tcp_header.seq_num = 0
+        self.tcp_header.ack_num = 0
+
+        packet = self.generate_packet()
+        return PacketTemplate(packet, self.tcp_header.check)
+
+
+class IPv6PacketFactory(BasePacketFactory):
+    def __init__(self, src_addr: bytes, src_port: int, dst_addr: bytes, dst_port: int):
+        super().__init__(src_port, dst_port)
+        self.ip_header = IPv6Header(src_addr=src_addr, dst_addr=dst_addr)
+
+    def _generate_pseudo_header(self, tcp_hdr_len: int, usr_data_len: int) -> bytes:
+        # RFC 8200 8.1, the lengths are 32 bits wide and the protocol is last
+        src_addr = self.ip_header.src_addr
+        dst_addr = self.ip_header.dst_addr
+        length = tcp_hdr_len + usr_data_len
+        return pack("!16s16sL3xB", src_addr, dst_addr, length, IPPROTO_TCP)
+
+    def _generate_ip_header(self, payload_len: int) -> bytes:
+        self.ip_header.payload_len = payload_len
+        return self.ip_header.get_header()
+
+    def generate_template(self) -> PacketTemplate:
+        self.ip_header.flow_label = 0
+        self.tcp_header.dst_port = 0
+        self.tcp_header.seq_num = 0
+        self.tcp_header.ack_num = 0
+
+        packet = self.generate_packet()
+        return IPv6PacketTemplate(packet, self.tcp_header.check)
+
+
+def packet_factory(
+    src_addr: bytes, src_port: int, dst_addr: bytes, dst_port: int
+) -> BasePacketFactory:
+    # the address length tells the ip version
+    if len(src_addr) == 16:
+        return IPv6PacketFactory(src_addr, src_port, dst_addr, dst_port)
+    return PacketFactory(src_addr, src_port, dst_addr, dst_port)
@@ -0,0 +1,96 @@
+from random import Random
+from typing import Iterator
+
+# deterministic Miller-Rabin bases for every n below 3.3 * 10**24
+_WITNESSES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+
+def is_prime(n: int) -> bool:
+    if n < 2:
+        return False
+    for p in _WITNESSES:
+        if n % p == 0:
+            return n == p
+
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+
+    for a in _WITNESSES:
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def next_prime(n: int) -> int:
+    while not is_prime(n):
+        n += 1
+    return n
+
+
+def prime_factors(n: int) -> set[int]:
+    factors = set()
+    p = 2
+    while p * p <= n:
+        while n % p == 0:
+            factors.add(p)
+            n //= p
+        p += 1 if p == 2 else 2
+    if n > 1:
+        factors.add(n)
+    return factors
+
+
+class CyclicPermutation:
+    """Pseudo-random order of range(size) in O(1) memory.
+
+    Like zmap, walks the multiplicative group of integers modulo a prime
+    p > size, from a random element with a random generator, and skips
+    the elements past size. The order is fixed by the seed, and the walk
+    can be resumed from any step in O(log n).
+    """
+
+    def __init__(self, size: int, seed: int | None = None):
+        self.size = size
+        self.prime = next_prime(size + 1)
+        # every step of the walk, including the skipped ones
+        self.steps = self.prime - 1
+
+        rng = Random(seed)
+        self.generator = self._find_generator(rng)
+        self.first = rng.randrange(1, self.prime)
+
+    def _find_generator(self, rng: Random) -> int:
+        if self.prime < 3:
+            return 1
+
+        factors = prime_factors(self.prime - 1)
+        while True:
+            g = rng.randrange(2, self.prime)
+            # g generates the whole group unless its order divides (p-1)/q
+            if all(pow(g, self.steps // q, self.prime) != 1 for q in factors):
+                return g
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        for _, index in self.walk():
+            yield index
+
+    def walk(self, start: int = 0) -> Iterator[tuple[int, int]]:
+        # yields (step, index), a walk resumed at step goes on where it stopped
+        p, g, size = self.prime, self.generator, self.size
+        x = self.first * pow(g, start, p) % p
+        for step in range(start, self.steps):
+            if x <= size:
+                yield step, x - 1
+            x = x * g % p
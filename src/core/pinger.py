@@ -1,12 +1,16 @@
 from ipaddress import IPv4Address, IPv6Address
 import time
 
-from scapy.all import IP, ICMP, IPv6, ICMPv6EchoRequest, ICMPv6EchoReply, sr1
-
 from core.results import PingStatus
 
 
 class Pinger:
+    """Pings one host at a time with scapy.
+
+    Scans use core.discovery instead. scapy takes seconds to import, so it
+    is only loaded on the first ping and never at startup.
+    """
+
     def __init__(self, timeout: int = 1):
         self.timeout = timeout
 
@@ -24,6 +28,8 @@ class Pinger:
         return self._ping_ipv4(ip_str)
 
     def _ping_ipv4(self, ip: str) -> PingStatus:
+        from scapy.all import IP, ICMP, sr1  # pylint: disable=import-outside-toplevel
+
         packet = IP(dst=ip) / ICMP()
         start = time.time()
         reply = sr1(packet, timeout=self.timeout, verbose=0)
@@ -31,12 +37,18 @@ class Pinger:
 
         if reply and reply.haslayer(ICMP) and reply[ICMP].type == 0:
             rtt = int(round((end - start) * 1000, 2))
-            # print("aaaaaaaaa")
             return PingStatus(delay_ms=rtt, success=True)
 
         return PingStatus(delay_ms=0, success=False)
 
     def _ping_ipv6(self, ip: str) -> PingStatus:
+        from scapy.all import (  # pylint: disable=import-outside-toplevel
+            IPv6,
+            ICMPv6EchoRequest,
+            ICMPv6EchoReply,
+            sr1,
+        )
+
         packet = IPv6(dst=ip) / ICMPv6EchoRequest()
         start = time.time()
         reply = sr1(packet, timeout=self.timeout, verbose=0)
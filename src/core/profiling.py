@@ -0,0 +1,104 @@
+from cProfile import Profile
+from io import StringIO
+from pathlib import Path
+from pstats import Stats
+import os
+import sys
+import threading
+
+# the directory main.py is in, subsystems are named after the paths below it
+SRC_ROOT = Path(__file__).resolve().parents[1]
+
+# from 3.12 on cProfile sees every thread, before that only the one enabling it
+PER_THREAD = sys.version_info < (3, 12)
+
+
+def subsystem(filename: str) -> str:
+    # the module for core, one group for the scanners, stdlib and builtins apart
+    if filename.startswith("~") or filename.startswith("<"):
+        return "builtins"
+    try:
+        parts = Path(filename).resolve().relative_to(SRC_ROOT).with_suffix("").parts
+    except ValueError:
+        return "python"
+    if parts[:2] == ("core", "scanners"):
+        return "scanners"
+    return parts[-1]
+
+
+class ScanProfiler:
+    """cProfile over the threads a scan starts, merged into one pstats file.
+
+    Threads started while profiling get a profile of their own, the scan
+    runs its engine and receivers in threads. Worker processes profile
+    themselves and their files are added with add_file.
+    """
+
+    def __init__(self):
+        self._profiles = [Profile()]
+        self._files: list[str] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "ScanProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if PER_THREAD:
+            threading.setprofile(self._start_thread)
+        self._profiles[0].enable()
+
+    def stop(self):
+        self._profiles[0].disable()
+        if PER_THREAD:
+            threading.setprofile(None)
+
+    def _start_thread(self, *_):
+        # runs once in every new thread, which then profiles itself
+        sys.setprofile(None)
+        profile = Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def add_file(self, path: str):
+        self._files.append(path)
+
+    def stats(self) -> Stats:
+        stats = Stats(self._profiles[0])
+        with self._lock:
+            profiles = self._profiles[1:]
+        for profile in profiles:
+            stats.add(profile)
+        for path in self._files:
+            if os.path.exists(path):
+                stats.add(path)
+        return stats
+
+    def dump(self, path: str):
+        self.stats().dump_stats(path)
+
+    def report(self, top: int = 5) -> str:
+        # own time by subsystem, then the hottest functions of each
+        by_subsystem: dict[str, list[tuple[float, int, str]]] = {}
+        entries = self.stats().stats.items()  # type: ignore[attr-defined]
+        for (filename, line, name), (_, calls, tottime, _, _) in entries:
+            by_subsystem.setdefault(subsystem(filename), []).append(
+                (tottime, calls, f"{Path(filename).name}:{line}({name})")
+            )
+
+        out = StringIO()
+        groups = sorted(
+            by_subsystem.items(), key=lambda item: -sum(t for t, _, _ in item[1])
+        )
+        for group, functions in groups:
+            total = sum(t for t, _, _ in functions)
+            if total <= 0:
+                continue
+            print(f"{group:16} {total:10.3f}s", file=out)
+            for tottime, calls, where in sorted(functions, reverse=True)[:top]:
+                print(f"  {tottime:10.3f}s {calls:10} {where}", file=out)
+        return out.getvalue()
@@ -0,0 +1,129 @@
+from ipaddress import IPv4Address, IPv6Address
+from time import time
+from typing import Generator, Iterable, Sequence
+import sqlite3
+
+from core.results import PortFinding, PortStatus
+
+# hosts that still need probing and the ports to probe on them
+ProbeGroup = tuple[Sequence[IPv4Address | IPv6Address], list[int]]
+
+
+class ResultCache:
+    """Last status of every (scan type, host, port), kept in SQLite across scans.
+
+    A fresh entry is served instead of probing the port again. Open ports
+    are always probed again, they are the ones worth watching. Entries
+    expire after ttl seconds. When the scan is done the expired ones are
+    dropped, then the oldest ones if there are more than max_entries.
+    """
+
+    # findings written per transaction
+    BATCH = 4096
+    MAX_ENTRIES = 1 << 22
+
+    def __init__(self, path: str, ttl: float, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # findings served from the cache and probed, in the last scan
+        self.served = 0
+        self.recorded = 0
+
+        self._db: sqlite3.Connection | None = None
+        self._scan_type = ""
+        self._pending: list[tuple[str, bytes, int, int, float]] = []
+
+    def open(self, scan_type: str):
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "scan_type TEXT, host BLOB, port INTEGER, status INTEGER, seen REAL, "
+            "PRIMARY KEY (scan_type, host, port)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_seen ON results (seen)")
+        self._scan_type = scan_type
+        self.served = self.recorded = 0
+
+    def close(self):
+        if self._db is None:
+            return
+        self._flush()
+        self.evict()
+        self._db.close()
+        self._db = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            raise ValueError("Result cache is not open")
+        return self._db
+
+    def plan(
+        self,
+        hosts: Iterable[IPv4Address | IPv6Address],
+        ports: list[int],
+        serve: bool = True,
+    ) -> Generator[PortFinding, None, list[ProbeGroup]]:
+        # yields the fresh findings, returns what is left to probe
+        db = self._connection()
+        oldest = time() - self.ttl
+        # hosts needing the same ports are scanned together
+        groups: dict[tuple[int, ...], list[IPv4Address | IPv6Address]] = {}
+        for host in hosts:
+            fresh = dict(
+                db.execute(
+                    "SELECT port, status FROM results "
+                    "WHERE scan_type = ? AND host = ? AND seen >= ?",
+                    (self._scan_type, host.packed, oldest),
+                )
+            )
+            stale = []
+            for port in ports:
+                code = fresh.get(port)
+                if code is None or code == PortStatus.OPEN.value:
+                    stale.append(port)
+                    continue
+                self.served += 1
+                if serve:
+                    yield PortFinding(host, port, PortStatus(code))
+            if stale:
+                groups.setdefault(tuple(stale), []).append(host)
+
+        return [(group, list(stale)) for stale, group in groups.items()]
+
+    def record(self, finding: PortFinding):
+        self._pending.append(
+            (
+                self._scan_type,
+                finding.host.packed,
+                finding.port,
+                finding.status.value,
+                time(),
+            )
+        )
+        self.recorded += 1
+        if len(self._pending) >= self.BATCH:
+            self._flush()
+
+    def _flush(self):
+        db = self._connection()
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", self._pending
+            )
+        self._pending.clear()
+
+    def evict(self):
+        db = self._connection()
+        with db:
+            db.execute("DELETE FROM results WHERE seen < ?", (time() - self.ttl,))
+            (count,) = db.execute("SELECT COUNT(*) FROM results").fetchone()
+            if count > self.max_entries:
+                db.execute(
+                    "DELETE FROM results WHERE (scan_type, host, port) IN ("
+                    "SELECT scan_type, host, port FROM results ORDER BY seen LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def __str__(self):
+        return f"{self.served} findings served from {self.path}, {self.recorded} probed"
@@ -1,15 +1,105 @@
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping
 from dataclasses import dataclass, field
 from enum import Enum
 from ipaddress import IPv4Address, IPv6Address
+from itertools import compress
 
 
 class PortStatus(Enum):
     OPEN = 1
     CLOSED = 2
     FILTERED = 4
+    # no reply to a FIN, NULL or XMAS probe, either open or dropped
+    OPEN_FILTERED = 5
+    # the ACK probe got through, open or closed is not known
+    UNFILTERED = 8
 
 
-@dataclass
+# state codes fit in a byte, 0 marks a port that was not scanned
+_STATUS_BY_CODE = {status.value: status for status in PortStatus}
+
+
+class PortStates(MutableMapping[int, PortStatus]):
+    """Port to PortStatus mapping stored as one state byte per port.
+
+    The array only grows up to the highest port set, so a sweep of a few
+    low ports stays small and a full range costs 64 KiB per host. Ports
+    iterate in ascending order.
+    """
+
+    __slots__ = ("_codes",)
+
+    def __init__(
+        self,
+        states: Mapping[int, PortStatus] | Iterable[tuple[int, PortStatus]] = (),
+    ):
+        self._codes = bytearray()
+        self.update(states)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PortStates":
+        states = cls()
+        states._codes[:] = data
+        return states
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._codes.rstrip(b"\0"))
+
+    def __getitem__(self, port: int) -> PortStatus:
+        code = self._codes[port] if 0 <= port < len(self._codes) else 0
+        if not code:
+            raise KeyError(port)
+        return _STATUS_BY_CODE[code]
+
+    def __setitem__(self, port: int, status: PortStatus):
+        if not 0 <= port < 65536:
+            raise ValueError(f"Wrong port number: {port}")
+        if port >= len(self._codes):
+            self._codes.extend(bytes(port + 1 - len(self._codes)))
+        self._codes[port] = status.value
+
+    def __delitem__(self, port: int):
+        if port not in self:
+            raise KeyError(port)
+        self._codes[port] = 0
+
+    def __contains__(self, port: object) -> bool:
+        return (
+            isinstance(port, int)
+            and 0 <= port < len(self._codes)
+            and bool(self._codes[port])
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        return compress(range(len(self._codes)), self._codes)
+
+    def __len__(self) -> int:
+        return len(self._codes) - self._codes.count(0)
+
+    def __repr__(self):
+        return f"PortStates({dict(self.items())})"
+
+    def count(self, status: PortStatus) -> int:
+        return self._codes.count(status.value)
+
+    def ports(self, status: PortStatus) -> list[int]:
+        # find runs in C, only the matching ports reach python
+        found: list[int] = []
+        codes, value = self._codes, status.value
+        port = codes.find(value)
+        while port != -1:
+            found.append(port)
+            port = codes.find(value, port + 1)
+        return found
+
+    def count_open(self) -> int:
+        return self.count(PortStatus.OPEN)
+
+    def open_ports(self) -> list[int]:
+        return self.ports(PortStatus.OPEN)
+
+
+@dataclass(slots=True)
 class PingStatus:
     delay_ms: int
     success: bool
@@ -19,12 +109,65 @@ def default_ping_status():
     return PingStatus(0, False)
 
 
-@dataclass
+def _endpoint(host: IPv4Address | IPv6Address, port: int) -> str:
+    return f"[{host}]:{port}" if isinstance(host, IPv6Address) else f"{host}:{port}"
+
+
+@dataclass(slots=True)
+class PortFinding:
+    host: IPv4Address | IPv6Address
+    port: int
+    status: PortStatus
+
+    def __str__(self):
+        return f"{_endpoint(self.host, self.port)} {self.status.name}"
+
+
+@dataclass(slots=True)
+class Service:
+    name: str
+    version: str = ""
+    # the first line it sent, kept for services no signature knows
+    banner: str = ""
+
+    def __str__(self):
+        if self.version:
+            return f"{self.name} {self.version}"
+        if self.banner:
+            return f"{self.name} ({self.banner})"
+        return self.name
+
+
+@dataclass(slots=True)
+class ServiceFinding:
+    host: IPv4Address | IPv6Address
+    port: int
+    service: Service
+
+    def __str__(self):
+        return f"{_endpoint(self.host, self.port)} {self.service}"
+
+
+@dataclass(slots=True)
+class HostFinding:
+    host: IPv4Address | IPv6Address
+    ping_status: PingStatus
+
+    def __str__(self):
+        result = f"Host: {self.host} Ping: "
+        if self.ping_status.success:
+            return result + f"Success ({self.ping_status.delay_ms}ms)"
+        return result + "Failed"
+
+
+@dataclass(slots=True)
 class ScanResult:
-    port_status: dict[int, PortStatus] = field(default_factory=dict)
+    port_status: PortStates = field(default_factory=PortStates)
     host: IPv4Address | IPv6Address = IPv4Address("0.0.0.0")
     ping_status: PingStatus = field(default_factory=default_ping_status)
     ping_enabled: bool = False
+    # what runs on the open ports, when service detection is on
+    services: dict[int, Service] = field(default_factory=dict)
 
     def __str__(self):
         result = f"Host: {self.host}"
@@ -37,5 +180,7 @@ class ScanResult:
             result += "\nPorts:"
             for port, status in self.port_status.items():
                 result += f"\n  {port}: {status.name}"
+                if port in self.services:
+                    result += f" {self.services[port]}"
 
         return result
@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class RTTState:
+    srtt: float
+    rttvar: float
+
+
+class RTTEstimator:
+    """Per host retransmission timeouts, computed like TCP's RTO (RFC 6298).
+
+    Hosts without samples of their own use the initial timeout, a nearby
+    host answering quickly says nothing about a far one.
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+
+    def __init__(
+        self, initial_rto: float = 1.0, min_rto: float = 0.3, max_rto: float = 10.0
+    ):
+        self.initial_rto = initial_rto
+        # the floor keeps a few lucky samples from cutting replies off
+        self.min_rto = min(min_rto, initial_rto)
+        self.max_rto = max(max_rto, initial_rto)
+
+        self._hosts: dict[str, RTTState] = {}
+        # the largest rto any host had, kept as samples come in
+        self._longest: float | None = None
+
+    def _update_state(self, state: RTTState | None, rtt: float) -> RTTState:
+        if state is None:
+            return RTTState(rtt, rtt / 2)
+
+        state.rttvar = (1 - self.BETA) * state.rttvar + self.BETA * abs(
+            state.srtt - rtt
+        )
+        state.srtt = (1 - self.ALPHA) * state.srtt + self.ALPHA * rtt
+        return state
+
+    def seed(self, host: str, rtt: float):
+        # only the first measurement, e.g. from ping, counts as a seed
+        if host not in self._hosts:
+            self.update(host, rtt)
+
+    def update(self, host: str, rtt: float):
+        state = self._update_state(self._hosts.get(host), rtt)
+        self._hosts[host] = state
+        rto = self._rto(state)
+        if self._longest is None or rto > self._longest:
+            self._longest = rto
+
+    def _rto(self, state: RTTState) -> float:
+        rto = state.srtt + self.K * state.rttvar
+        return min(self.max_rto, max(self.min_rto, rto))
+
+    def rto(self, host: str) -> float:
+        state = self._hosts.get(host)
+        if state is None:
+            return self.initial_rto
+        return self._rto(state)
+
+    def longest_rto(self) -> float:
+        # how long the slowest sampled host may take, never shrinks
+        return self.initial_rto if self._longest is None else self._longest
+
+    def srtt(self, host: str) -> float | None:
+        state = self._hosts.get(host)
+        return state.srtt if state else None
@@ -5,27 +5,124 @@ from ipaddress import (
     IPv4Network,
     IPv6Network,
 )
-import asyncio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from hashlib import sha256
+from itertools import chain
+from typing import TYPE_CHECKING, Generator, Iterable, Iterator, Sequence
+import os
 
 from core.scanners.scanner import ScanType, Scanner
 from core.scanners.syn_scanner import SYNScanner
+from core.scanners.probe_engine import EngineOptions
+from core.scanners.probe_profiles import PROFILES
 from core.scanners.tcp_scanner import TCPScanner
-from core.results import ScanResult
-from core.pinger import Pinger
+from core.results import (
+    ScanResult,
+    PortFinding,
+    HostFinding,
+    PingStatus,
+    PortStatus,
+    ServiceFinding,
+)
+from core.discovery import ICMPDiscovery
+from core.metrics import ScanMetrics
+from core.pacer import Pacer, PacerStats
+from core.profiling import ScanProfiler
+from core.targets import TargetSet, host_count
+from core.checkpoint import Checkpoint
+
+if TYPE_CHECKING:
+    # sqlite3 is only loaded for a scan with a cache, see set_cache
+    from core.result_cache import ProbeGroup, ResultCache
+
+
+# the scanner of a worker process, kept across its shards
+_worker_scanner: Scanner | None = None  # pylint: disable=invalid-name
+# where the worker saves its profile, when the scan is profiled
+_worker_profile: tuple[ScanProfiler, str] | None = None  # pylint: disable=invalid-name
+
+
+def worker_profile_path(path: str, pid: int) -> str:
+    return f"{path}.{pid}"
+
+
+def init_worker(scanner: Scanner, profile_path: str | None = None):
+    global _worker_scanner, _worker_profile  # pylint: disable=global-statement
+    _worker_scanner = scanner
+    if profile_path is not None:
+        _worker_profile = (
+            ScanProfiler(),
+            worker_profile_path(profile_path, os.getpid()),
+        )
 
 
-class ScanManager:
+def scan_shard(
+    hosts: Sequence[IPv4Address | IPv6Address], ports: list[int], open_only: bool
+) -> tuple[list[PortFinding], int, PacerStats | None, ScanMetrics | None]:
+    # runs in a worker process, every worker opens its own sockets
+    scanner = _worker_scanner
+    if scanner is None:
+        raise ValueError("Worker process was not initialized")
+
+    if _worker_profile is not None:
+        _worker_profile[0].start()
+    findings = [
+        finding
+        for finding in scanner.iter_scan(hosts, ports)
+        if not open_only or finding.status == PortStatus.OPEN
+    ]
+    if _worker_profile is not None:
+        # saved after every shard, workers are not told when the scan ends
+        profiler, path = _worker_profile
+        profiler.stop()
+        profiler.dump(path)
+    # the pacer lives as long as the worker, its stats cover all its shards
+    stats = scanner.pacer.stats() if scanner.pacer else None
+    return findings, os.getpid(), stats, scanner.metrics
+
+
+class ScanManager:  # pylint: disable=too-many-instance-attributes
+    SHARDS_PER_WORKER = 4
+    # echo requests per second when the scan itself is not paced
+    DISCOVERY_RATE = 10_000
+    # probes between two checkpoints
+    CHECKPOINT_PROBES = 1 << 16
+    # the whole ipv4 space, an ipv6 /64 would not be done in a lifetime
+    MAX_HOSTS = 1 << 32
+
     def __init__(
-        self, scan_type: ScanType = ScanType.TCP, do_ping: bool = True, threads: int = 1
+        self,
+        scan_type: ScanType = ScanType.TCP,
+        do_ping: bool = True,
+        workers: int = 1,
+        rate: int | None = None,
+        concurrency: int = 5000,
     ):
         self.results: list[ScanResult] = []
         self.scan_time: timedelta = timedelta(0)
 
-        self.target_hosts: list[IPv4Address | IPv6Address] = []
+        # hosts are only built from the target ranges as they are scanned
+        self.target_hosts = TargetSet()
         self.target_ports: list[int] = []
         self.scan_type = scan_type
         self.ping = do_ping
-        self.threads = threads
+        self.workers = workers
+        self.concurrency = concurrency
+        self.seed: int | None = None
+        self.source_ips: list[str] = []
+        self.checkpoint: Checkpoint | None = None
+        self.cache: "ResultCache | None" = None
+
+        # shared by every raw scanner, rate is the packets/s ceiling
+        self.pacer = Pacer(rate) if rate else None
+        self.pacer_stats: PacerStats | None = None
+        self.metrics: ScanMetrics | None = None
+        # latest metrics of every worker process, by pid
+        self._worker_metrics: dict[int, ScanMetrics] = {}
+        self.profile_path: str | None = None
+        self.worker_pids: set[int] = set()
+        # connections in flight while probing open ports, None when it is off
+        self.service_concurrency: int | None = None
 
     def get_results(self) -> list[ScanResult]:
         return self.results
@@ -33,11 +130,38 @@ class ScanManager:
     def get_scan_time(self) -> timedelta:
         return self.scan_time
 
+    def get_pacer_stats(self) -> PacerStats | None:
+        # only raw scans are paced, the others never touch the pacer
+        if self.scan_type not in PROFILES:
+            return None
+        if self.pacer_stats is None and self.pacer is not None:
+            return self.pacer.stats()
+        return self.pacer_stats
+
     def add_target_host(self, ipaddress: IPv4Address | IPv6Address):
-        self.target_hosts.append(ipaddress)
+        self.target_hosts.add_host(ipaddress)
 
     def add_target_network(self, ipnetwork: IPv4Network | IPv6Network):
-        self.target_hosts += ipnetwork.hosts()
+        self._check_sweep(ipnetwork.num_addresses, str(ipnetwork))
+        self.target_hosts.add_network(ipnetwork)
+
+    def add_target_range(
+        self, first: IPv4Address | IPv6Address, last: IPv4Address | IPv6Address
+    ):
+        self._check_sweep(abs(int(last) - int(first)) + 1, f"{first} - {last}")
+        self.target_hosts.add_range(first, last)
+
+    def _check_sweep(self, hosts: int, target: str):
+        if hosts > self.MAX_HOSTS:
+            raise ValueError(
+                f"{target} has {hosts} addresses, more than the {self.MAX_HOSTS} "
+                "a scan can sweep"
+            )
+
+    def exclude_target(
+        self, target: IPv4Address | IPv6Address | IPv4Network | IPv6Network
+    ):
+        self.target_hosts.exclude(target)
 
     def set_target_ports(self, ports: list[int]):
         for port in ports:
@@ -47,6 +171,53 @@ class ScanManager:
 
         self.target_ports = ports
 
+    def set_seed(self, seed: int | None):
+        # the same seed probes in the same order again
+        self.seed = seed
+
+    def set_source_ips(self, source_ips: list[str]):
+        # raw probes take turns over these local addresses
+        self.source_ips = source_ips
+
+    def enable_metrics(self):
+        self.metrics = ScanMetrics()
+
+    def get_metrics(self) -> ScanMetrics | None:
+        # workers report theirs whenever one of their shards is done
+        metrics = self.metrics
+        if metrics is None:
+            return None
+        for worker_metrics in list(self._worker_metrics.values()):
+            metrics = metrics.merge(worker_metrics)
+        return metrics
+
+    def set_profile(self, path: str):
+        # workers save their profiles next to it, see worker_profiles
+        self.profile_path = path
+
+    def worker_profiles(self) -> list[str]:
+        if self.profile_path is None:
+            return []
+        return [worker_profile_path(self.profile_path, pid) for pid in self.worker_pids]
+
+    def enable_service_detection(self, concurrency: int = 100):
+        # open ports are probed for what runs on them once the scan is done
+        self.service_concurrency = concurrency
+
+    def set_checkpoint(self, path: str, resume: bool = False):
+        # progress is appended to path, resume skips what it already holds
+        self.checkpoint = Checkpoint(path, resume)
+
+    def set_cache(self, path: str, ttl: float, max_entries: int | None = None):
+        # only ports not seen for ttl seconds, or seen open, are probed again
+        from core.result_cache import (  # pylint: disable=import-outside-toplevel
+            ResultCache,
+        )
+
+        if max_entries is None:
+            max_entries = ResultCache.MAX_ENTRIES
+        self.cache = ResultCache(path, ttl, max_entries)
+
     def set_target_port_range(self, lower_bound: int, upper_bound: int):
         if not 0 < lower_bound < 65536 or not 0 < upper_bound < 65536:
             raise ValueError("Wrong port range")
@@ -56,68 +227,276 @@ class ScanManager:
 
         self.target_ports = list(range(lower_bound, upper_bound + 1))
 
-    def _create_scanner(self) -> Scanner:
+    def _create_scanner(self, workers: int = 1) -> Scanner:
+        # limits are global, so every worker gets its share of them
         if self.scan_type == ScanType.TCP:
             return TCPScanner()
-        if self.scan_type == ScanType.SYN:
-            return SYNScanner()
+        if self.scan_type in PROFILES:
+            pacer = self.pacer
+            if pacer is not None and workers > 1:
+                pacer = pacer.split(workers)
+            options = EngineOptions(
+                seed=self.seed,
+                src_ips=self.source_ips,
+                profile=PROFILES[self.scan_type],
+            )
+            return SYNScanner(pacer=pacer, options=options)
+        if self.scan_type == ScanType.ASYNC_TCP:
+            # asyncio is the slowest import at startup, only load it when needed
+            from core.scanners.async_tcp_scanner import (  # pylint: disable=import-outside-toplevel
+                AsyncTCPScanner,
+            )
+
+            return AsyncTCPScanner(
+                concurrency=max(1, self.concurrency // workers), seed=self.seed
+            )
 
         raise ValueError(f"Unknown scan type: {self.scan_type}")
 
-    def _scan_single_threaded(self):
-        scanner = self._create_scanner()
-        pinger = Pinger()
-        for host in self.target_hosts:
-            res = ScanResult(host=host)
-            if self.ping:
-                res.ping_status = pinger.ping(host)
-                res.ping_enabled = True
-            if (not self.ping) or res.ping_status.success:
-                port_result = scanner.scan(host, self.target_ports)
-                res.port_status = port_result.port_status
-            self.results.append(res)
-
-    async def _scanner_thread(
-        self, hosts: list[IPv4Address | IPv6Address], ports: list[int]
-    ) -> list[ScanResult]:
-        scanner = self._create_scanner()
-        pinger = Pinger()
-        results: list[ScanResult] = []
+    def _ping_hosts(
+        self, hosts: Sequence[IPv4Address | IPv6Address]
+    ) -> Iterator[HostFinding]:
+        # all hosts are pinged at once, at the scan rate when there is one
+        rate = self.pacer.ceiling if self.pacer else self.DISCOVERY_RATE
+        alive = ICMPDiscovery(Pacer(rate)).run(hosts)
+
         for host in hosts:
-            res = ScanResult(host=host)
-            if self.ping:
-                res.ping_status = pinger.ping(host)
-                res.ping_enabled = True
-            if (not self.ping) or res.ping_status.success:
-                port_result = scanner.scan(host, ports)
-                res.port_status = port_result.port_status
-            results.append(res)
-        return results
+            rtt = alive.get(host)
+            if rtt is None:
+                yield HostFinding(host, PingStatus(0, False))
+            else:
+                yield HostFinding(host, PingStatus(round(rtt * 1000), True))
+
+    def _seed_rtt(self, scanner: Scanner, pinged: list[HostFinding]):
+        for finding in pinged:
+            scanner.rtt.seed(str(finding.host), finding.ping_status.delay_ms / 1000)
 
-    def _chunkify(self, lst: list, chunks: int) -> list[list]:
+    def _chunkify(self, lst: Sequence, chunks: int) -> list[Sequence]:
         return [lst[i::chunks] for i in range(chunks)]
 
-    async def _scan_multi_threaded(self):
-        hosts_divided = self._chunkify(self.target_hosts, self.threads)
-        tasks: list[asyncio.Task[list[ScanResult]]] = []
+    def _shards_count(self) -> int:
+        # a few shards per worker, so results come back while the scan runs
+        return self.workers * self.SHARDS_PER_WORKER if self.workers > 1 else 1
+
+    def _shard(
+        self, hosts: Sequence[IPv4Address | IPv6Address], ports: list[int]
+    ) -> list[tuple[Sequence[IPv4Address | IPv6Address], list[int]]]:
+        shards_count = self._shards_count()
+        if self.checkpoint is not None:
+            # resumed scans are split like the saved one, -w may have changed
+            shards_count = self.checkpoint.shards
+            # a checkpoint is written whenever a shard is done
+            probes = host_count(hosts) * len(ports)
+            shards_count = max(shards_count, -(-probes // self.CHECKPOINT_PROBES))
+
+        if host_count(hosts) >= shards_count:
+            shards = [(chunk, ports) for chunk in self._chunkify(hosts, shards_count)]
+        else:
+            # not enough hosts to go around, split the ports instead
+            shards = [
+                (hosts, list(chunk)) for chunk in self._chunkify(ports, shards_count)
+            ]
+        return [(h, p) for h, p in shards if h and p]
 
-        for i in range(self.threads):
-            task = asyncio.create_task(
-                self._scanner_thread(hosts_divided[i], self.target_ports)
+    def _shard_done(self, index: int, findings: list[PortFinding]):
+        if self.checkpoint is not None:
+            self.checkpoint.record_chunk(index, findings)
+
+    def _iter_single_process(
+        self,
+        scanner: Scanner,
+        shards: list[tuple[int, Sequence[IPv4Address | IPv6Address], list[int]]],
+    ) -> Iterator[PortFinding]:
+        for index, hosts, ports in shards:
+            findings: list[PortFinding] = []
+            for finding in scanner.iter_scan(hosts, ports):
+                if self.checkpoint is not None:
+                    findings.append(finding)
+                yield finding
+            self._shard_done(index, findings)
+
+    def _iter_multi_process(
+        self,
+        scanner: Scanner,
+        shards: list[tuple[int, Sequence[IPv4Address | IPv6Address], list[int]]],
+        open_only: bool,
+    ) -> Iterator[PortFinding]:
+        # a checkpoint or a cache needs every finding, not only the open ones
+        open_only = open_only and self.checkpoint is None and self.cache is None
+        worker_stats: dict[int, PacerStats] = {}
+
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker,
+            initargs=(scanner, self.profile_path),
+        )
+        try:
+            futures = {
+                executor.submit(scan_shard, hosts, ports, open_only): index
+                for index, hosts, ports in shards
+            }
+            # yield shards as soon as their worker is done
+            for future in as_completed(futures):
+                findings, pid, stats, metrics = future.result()
+                self._shard_done(futures[future], findings)
+                self.worker_pids.add(pid)
+                if stats is not None:
+                    worker_stats[pid] = stats
+                if metrics is not None:
+                    self._worker_metrics[pid] = metrics
+                yield from findings
+        finally:
+            # do not start shards nobody is waiting for anymore
+            executor.shutdown(cancel_futures=True)
+
+        for stats in worker_stats.values():
+            self.pacer_stats = (
+                stats if self.pacer_stats is None else self.pacer_stats.merge(stats)
             )
-            tasks.append(task)
 
-        for task in tasks:
-            result = await task
-            self.results += result
+    def _fingerprint(self) -> str:
+        # a checkpoint only resumes the very same scan
+        config = (
+            self.scan_type.value,
+            self.ping,
+            self.seed,
+            self.target_hosts.blocks,
+            self.target_ports,
+            # the chunk indexes depend on it too
+            self.CHECKPOINT_PROBES,
+        )
+        return sha256(repr(config).encode()).hexdigest()
 
-    def scan_all(self):
+    def _discover(
+        self, scanner: Scanner
+    ) -> Generator[HostFinding, None, Sequence[IPv4Address | IPv6Address]]:
+        # yields the ping results, returns the hosts left to scan
+        if not self.ping:
+            return self.target_hosts
+
+        checkpoint = self.checkpoint
+        if checkpoint is not None and checkpoint.pinged is not None:
+            pinged = checkpoint.pinged
+            # only live hosts are saved, every other target was down
+            live = {finding.host: finding for finding in pinged}
+            for host in self.target_hosts:
+                saved = live.get(host)
+                yield (
+                    HostFinding(host, PingStatus(0, False)) if saved is None else saved
+                )
+        else:
+            pinged = []
+            for host_finding in self._ping_hosts(self.target_hosts):
+                yield host_finding
+                # only live hosts are kept, down ones were already reported
+                if host_finding.ping_status.success:
+                    pinged.append(host_finding)
+            if checkpoint is not None:
+                checkpoint.record_ping(pinged)
+
+        self._seed_rtt(scanner, pinged)
+        return [finding.host for finding in pinged]
+
+    def _open_stores(self):
+        if self.checkpoint is not None and self.cache is not None:
+            # the cache changes what is probed, a resumed scan would not match
+            raise ValueError("A result cache cannot be used with a checkpoint")
+        if self.checkpoint is not None:
+            self.checkpoint.open(self._fingerprint(), self._shards_count())
+        if self.cache is not None:
+            self.cache.open(self.scan_type.value)
+
+    def _close_stores(self):
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _plan(
+        self, hosts: Sequence[IPv4Address | IPv6Address], open_only: bool
+    ) -> Generator[PortFinding, None, list["ProbeGroup"]]:
+        # yields what the cache knows, returns the hosts and ports left to probe
+        if self.cache is None:
+            return [(hosts, self.target_ports)]
+        # nothing is served open, so open_only does not need the cache findings
+        return (yield from self.cache.plan(hosts, self.target_ports, not open_only))
+
+    def _detect_services(
+        self, open_ports: list[PortFinding]
+    ) -> Iterator[ServiceFinding]:
+        if self.service_concurrency is None or not open_ports:
+            return iter(())
+        # asyncio is only loaded when it is needed, see _create_scanner
+        from core.services import (  # pylint: disable=import-outside-toplevel
+            ServiceDetector,
+        )
+
+        return ServiceDetector(self.service_concurrency).run(open_ports)
+
+    def iter_results(
+        self, open_only: bool = False
+    ) -> Iterator[HostFinding | PortFinding | ServiceFinding]:
         start_time = datetime.now()
 
-        if self.threads == 1:
-            self._scan_single_threaded()
-        elif self.threads > 1:
-            asyncio.run(self._scan_multi_threaded())
+        scanner = self._create_scanner(self.workers)
+        # every worker gets a copy of its own, sent back with its shards
+        scanner.metrics = self.metrics
+        checkpoint = self.checkpoint
+        self._open_stores()
+
+        try:
+            hosts = yield from self._discover(scanner)
+            groups = yield from self._plan(hosts, open_only)
+
+            findings: Iterable[PortFinding] = ()
+            if checkpoint is not None:
+                # replay what was found before the scan was resumed
+                findings = checkpoint.saved_findings()
+            shards = [
+                (index, shard_hosts, ports)
+                for index, (shard_hosts, ports) in enumerate(
+                    chain.from_iterable(self._shard(*group) for group in groups)
+                )
+                if checkpoint is None or index not in checkpoint.done
+            ]
+
+            if self.workers > 1:
+                findings = chain(
+                    findings, self._iter_multi_process(scanner, shards, open_only)
+                )
+            else:
+                findings = chain(findings, self._iter_single_process(scanner, shards))
+
+            # only kept for service detection, it probes them once the scan is done
+            detect = self.service_concurrency is not None
+            open_ports = []
+            for finding in findings:
+                if self.cache is not None:
+                    self.cache.record(finding)
+                if finding.status == PortStatus.OPEN:
+                    if detect:
+                        open_ports.append(finding)
+                elif open_only:
+                    continue
+                yield finding
+        finally:
+            self._close_stores()
+
+        yield from self._detect_services(open_ports)
+
+        self.scan_time = datetime.now() - start_time
+
+    def scan_all(self):
+        results = {host: ScanResult(host=host) for host in self.target_hosts}
+
+        for finding in self.iter_results():
+            res = results[finding.host]
+            if isinstance(finding, HostFinding):
+                res.ping_status = finding.ping_status
+                res.ping_enabled = True
+            elif isinstance(finding, ServiceFinding):
+                res.services[finding.port] = finding.service
+            else:
+                res.port_status[finding.port] = finding.status
 
-        stop_time = datetime.now()
-        self.scan_time = stop_time - start_time
+        self.results += results.values()
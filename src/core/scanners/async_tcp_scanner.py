@@ -0,0 +1,132 @@
+from ipaddress import IPv4Address, IPv6Address
+from time import monotonic
+from typing import Callable, Iterator, Sequence
+import asyncio
+import socket
+
+from core.metrics import REPLY_ICMP, REPLY_RST, REPLY_SYN_ACK
+from core.scanners.scanner import Scanner
+from core.results import ScanResult, PortStatus, PortFinding
+from core.rtt import RTTEstimator
+from core.permutation import CyclicPermutation
+from core.targets import host_count
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None  # type: ignore[assignment]
+
+
+class AsyncTCPScanner(Scanner):
+    # descriptors kept for stdio, raw sockets and the event loop itself
+    FD_RESERVE = 64
+
+    def __init__(
+        self, timeout: float = 1.0, concurrency: int = 5000, seed: int | None = None
+    ):
+        self.timeout = timeout
+        self.concurrency = self.raise_fd_limit(concurrency)
+        # fixes the probe order, random when not set
+        self.seed = seed
+        self.rtt = RTTEstimator(initial_rto=timeout)
+
+    def raise_fd_limit(self, concurrency: int) -> int:
+        if resource is None:
+            return concurrency
+
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = concurrency + self.FD_RESERVE
+        if soft < wanted:
+            if hard != resource.RLIM_INFINITY:
+                wanted = min(wanted, hard)
+            try:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+                soft = wanted
+            except (ValueError, OSError):
+                pass
+
+        # never keep more sockets in flight than we can open
+        return max(1, min(concurrency, soft - self.FD_RESERVE))
+
+    async def _probe(self, host: IPv4Address | IPv6Address, port: int) -> PortStatus:
+        if isinstance(host, IPv4Address):
+            family = socket.AF_INET
+        else:
+            family = socket.AF_INET6
+
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+
+        host_ip = str(host)
+        start = monotonic()
+        try:
+            await asyncio.wait_for(
+                loop.sock_connect(sock, (host_ip, port)), self.rtt.rto(host_ip)
+            )
+        except asyncio.TimeoutError:
+            self._count(None)
+            return PortStatus.FILTERED
+        except ConnectionRefusedError:
+            self._sample(host_ip, monotonic() - start, REPLY_RST)
+            return PortStatus.CLOSED
+        except OSError:
+            # unreachable errors, reported to the socket from icmp
+            self._count(REPLY_ICMP)
+            return PortStatus.CLOSED
+        finally:
+            sock.close()
+
+        self._sample(host_ip, monotonic() - start, REPLY_SYN_ACK)
+        return PortStatus.OPEN
+
+    def _sample(self, host_ip: str, rtt: float, kind: str):
+        self.rtt.update(host_ip, rtt)
+        if self.metrics is not None:
+            self.metrics.rtt.observe(rtt)
+        self._count(kind)
+
+    def _count(self, kind: str | None):
+        # a connect is one probe, None when it timed out
+        metrics = self.metrics
+        if metrics is None:
+            return
+        metrics.probes += 1
+        if kind is None:
+            metrics.timeouts += 1
+        else:
+            metrics.replies[kind] += 1
+
+    async def _worker(
+        self,
+        targets: Iterator[tuple[IPv4Address | IPv6Address, int]],
+        emit: Callable[[PortFinding], None],
+    ):
+        # workers share one iterator, so at most `concurrency` connects are in flight
+        for host, port in targets:
+            emit(PortFinding(host, port, await self._probe(host, port)))
+
+    async def scan_async(
+        self,
+        hosts: Sequence[IPv4Address | IPv6Address],
+        ports: list[int],
+        emit: Callable[[PortFinding], None],
+    ):
+        # spread the connects over all hosts instead of one host at a time
+        order = CyclicPermutation(host_count(hosts) * len(ports), self.seed)
+        targets = (
+            (hosts[index // len(ports)], ports[index % len(ports)]) for index in order
+        )
+
+        workers = min(self.concurrency, len(order))
+        await asyncio.gather(*(self._worker(targets, emit) for _ in range(workers)))
+
+    def iter_scan(
+        self, hosts: Sequence[IPv4Address | IPv6Address], ports: list[int]
+    ) -> Iterator[PortFinding]:
+        return self.stream(
+            lambda emit: asyncio.run(self.scan_async(hosts, ports, emit))
+        )
+
+    def scan(self, host: IPv4Address | IPv6Address, ports: list[int]) -> ScanResult:
+        return self.scan_hosts([host], ports)[0]
@@ -0,0 +1,409 @@
+from dataclasses import dataclass, field
+from ipaddress import IPv4Address, IPv6Address, ip_address
+from itertools import cycle
+from struct import unpack_from
+from threading import Event, Thread
+from time import monotonic, perf_counter
+from typing import Any, Callable, Sequence
+import select
+import socket
+
+from core.batch_io import BatchReceiver, BatchSender
+from core.cookie import new_key
+from core.metrics import REPLY_ICMP, REPLY_SYN_ACK, REPLY_UNRELATED, ScanMetrics
+from core.packet_factory import PacketTemplate, packet_factory
+from core.pacer import Pacer
+from core.permutation import CyclicPermutation
+from core.results import PortStatus
+from core.rtt import RTTEstimator
+from core.scanners.probe_profiles import SYN, ProbeProfile
+from core.scanners.reply_classifier import ProbeKey, Reply, ReplyClassifier
+from core.targets import TargetSet, TargetView, host_count
+
+# not exported by the socket module, linux only
+IPV6_HDRINCL = getattr(socket, "IPV6_HDRINCL", 36)
+
+
+def _ntop(addr: bytes) -> str:
+    if len(addr) == 4:
+        return socket.inet_ntoa(addr)
+    return socket.inet_ntop(socket.AF_INET6, addr)
+
+
+@dataclass
+class EngineOptions:
+    retries: int = 2
+    batch_size: int = 64
+    flush_interval: float = 0.005
+    # fixes the probe order, random when not set
+    seed: int | None = None
+    # local addresses probes are sent from, the default route when empty
+    src_ips: list[str] = field(default_factory=list)
+    src_ports: int = 16
+    # the raw scan type, SYN unless set
+    profile: ProbeProfile = SYN
+
+
+class ProbeEngine:
+    """Stateless raw probe engine.
+
+    A sender loop fires one probe per (host, port) as fast as the pacer
+    allows while a receiver thread drains the raw sockets. Replies are
+    matched back to probes by the sequence number, which is a keyed hash of
+    the target, so all that is kept per probe is one bit telling it has been
+    resolved. Send times are kept for a ring of recent probes only, enough
+    for round trip samples. The probe profile in the options sets the flags
+    of the probes and what the replies mean.
+
+    Probes take turns over a pool of source addresses and ports, so one host
+    can have many probes in flight.
+
+    Probes go out in a pseudo-random order over all (host, port) pairs, so
+    no single host sees a burst of them. IPv4 and IPv6 hosts can be mixed,
+    each version has its own sockets and needs a source address of its own.
+    """
+
+    POLL_INTERVAL = 0.1
+    RECV_BUFFER = 1 << 22
+    HOST_CACHE = 1 << 16
+    # recent first transmissions whose replies can be sampled, a power of two
+    RTT_RING = 1 << 12
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        sources: list[tuple[str, int]],
+        options: EngineOptions,
+        rtt: RTTEstimator,
+        pacer: Pacer,
+        metrics: ScanMetrics | None = None,
+    ):
+        # packed source addresses by their length, 4 for ipv4 and 16 for ipv6
+        self.sources: dict[int, list[tuple[bytes, int]]] = {}
+        for ip, port in sources:
+            addr = ip_address(ip).packed
+            self.sources.setdefault(len(addr), []).append((addr, port))
+        # ipv6 replies come without the ip header, the port tells where they went
+        self._local_addrs = {port: addr for addr, port in self.sources.get(16, [])}
+        if len({port for _, port in sources}) < len(sources):
+            raise ValueError("Every source needs a port of its own")
+        self.options = options
+        self.rtt = rtt
+        self.pacer = pacer
+        self.metrics = metrics
+
+        self.classifier = ReplyClassifier(
+            options.profile,
+            frozenset(port for _, port in sources),
+            new_key(),
+        )
+        # one bit per probe, by its index in the probe order
+        self.resolved = bytearray()
+        self._resolved_count = 0
+        self._on_result: Callable[[ProbeKey, PortStatus], None] = lambda *_: None
+        self._index_of: Callable[[ProbeKey], int | None] = lambda _: None
+        # hosts with an rtt sample from this scan, one byte each
+        self._sampled = bytearray()
+
+        # (probe index, send time) of recent first transmissions, by index
+        self._sent_at: list[tuple[int, float]] = []
+        self._expected = 0
+        self._stop = Event()
+        self._resolved = Event()
+
+    def run(
+        self,
+        hosts: Sequence[IPv4Address | IPv6Address],
+        ports: list[int],
+        on_result: Callable[[ProbeKey, PortStatus], None],
+    ):
+        # on_result is called from the receiver thread as replies come in
+        order = self._reset(hosts, ports, on_result)
+        socks = self._open_sockets()
+        receiver = Thread(target=self._receive_loop, args=(socks,), daemon=True)
+        receiver.start()
+
+        senders = {
+            length: BatchSender(
+                sock, self.options.batch_size, self.options.flush_interval
+            )
+            for length, (sock, _) in socks.items()
+        }
+
+        self.pacer.start()
+        try:
+            for attempt in range(self.options.retries):
+                self._send_pass(senders, order, hosts, ports, attempt == 0)
+                self.pacer.on_flush()
+                # replies keep arriving while we wait out the last probes
+                if self._resolved.wait(self._timeout(hosts)):
+                    break
+        finally:
+            self._stop.set()
+            receiver.join()
+            for sock, icmp_sock in socks.values():
+                sock.close()
+                icmp_sock.close()
+            self._sent_at = []
+
+        # no response after retransmissions
+        packed = self._packed_hosts(hosts)
+        for _, index in order.walk():
+            if not self.resolved[index >> 3] & 1 << (index & 7):
+                key = (packed(index // len(ports)), ports[index % len(ports)])
+                if self.metrics is not None:
+                    self.metrics.timeouts += 1
+                self._on_result(key, self.options.profile.no_reply)
+
+    def _reset(
+        self,
+        hosts: Sequence[IPv4Address | IPv6Address],
+        ports: list[int],
+        on_result: Callable[[ProbeKey, PortStatus], None],
+    ) -> CyclicPermutation:
+        # nothing resolved yet, returns the probe order
+        self._on_result = on_result
+        self._expected = host_count(hosts) * len(ports)
+        self.resolved = bytearray((self._expected + 7) // 8)
+        self._resolved_count = 0
+        self._index_of = self._probe_index(hosts, ports)
+        self._sampled = bytearray(host_count(hosts))
+        self._stop.clear()
+        self._resolved.clear()
+        return CyclicPermutation(self._expected, self.options.seed)
+
+    def _timeout(self, hosts: Sequence[IPv4Address | IPv6Address]) -> float:
+        # hosts without samples of their own may be far away
+        sampled = self._sampled
+        i = sampled.find(0)
+        while i != -1:
+            if self.rtt.srtt(str(hosts[i])) is None:
+                return self.rtt.initial_rto
+            sampled[i] = 1
+            i = sampled.find(0, i + 1)
+        return self.rtt.longest_rto()
+
+    def _open_sockets(self) -> dict[int, tuple[socket.socket, socket.socket]]:
+        # tcp and icmp sockets by address length, for the versions with a source
+        socks = {}
+        for length in self.sources:
+            if length == 4:
+                sock = socket.socket(
+                    socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP
+                )
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_HDRINCL, 1)
+                icmp_sock = socket.socket(
+                    socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP
+                )
+            else:
+                sock = socket.socket(
+                    socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_TCP
+                )
+                sock.setsockopt(socket.IPPROTO_IPV6, IPV6_HDRINCL, 1)
+                icmp_sock = socket.socket(
+                    socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_ICMPV6
+                )
+            # replies come in bursts, do not let the kernel drop them
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECV_BUFFER)
+            socks[length] = (sock, icmp_sock)
+        return socks
+
+    def _send_pass(  # pylint: disable=too-many-arguments,too-many-locals
+        self,
+        senders: dict[int, BatchSender],
+        order: CyclicPermutation,
+        hosts: Sequence[IPv4Address | IPv6Address],
+        ports: list[int],
+        first: bool,
+    ):
+        # the sender, the templates taking turns and the indexes of the
+        # probes queued in the sender, by address length
+        outputs: dict[int, tuple[BatchSender, Callable[[], PacketTemplate], list[int]]]
+        outputs = {
+            length: (sender, cycle(self._templates(length)).__next__, [])
+            for length, sender in senders.items()
+        }
+
+        # replies to retransmissions are ambiguous (Karn), not sampled
+        sent_at = self._sent_at = [(-1, 0.0)] * self.RTT_RING if first else []
+        ring_mask = self.RTT_RING - 1
+
+        def stamp(queued: list[int]):
+            # rtts are timed from the flush, not from the queue
+            now = monotonic()
+            for index in queued:
+                sent_at[index & ring_mask] = (index, now)
+            queued.clear()
+
+        def flush():
+            for sender, _, queued in outputs.values():
+                sender.flush()
+                stamp(queued)
+
+        resolved = self.resolved
+        metrics = self.metrics
+        cookie = self.classifier.cookie
+        packed = self._packed_hosts(hosts)
+        for _, index in order.walk():
+            if resolved[index >> 3] & 1 << (index & 7):
+                continue
+            dst_addr, port = packed(index // len(ports)), ports[index % len(ports)]
+
+            try:
+                sender, next_template, queued = outputs[len(dst_addr)]
+            except KeyError:
+                raise ValueError(
+                    f"No source address of the same version as {_ntop(dst_addr)}"
+                ) from None
+
+            self.pacer.acquire(retransmit=not first, before_sleep=flush)
+            # timed only when metrics are kept, the clock is not free either
+            start = perf_counter() if metrics is not None else 0.0
+            packet = next_template().build(
+                port, cookie(dst_addr, port), dst_addr=dst_addr
+            )
+            built = perf_counter() if metrics is not None else 0.0
+            sender.send(packet, (_ntop(dst_addr), 0))
+            if metrics is not None:
+                metrics.on_probe(built - start, perf_counter() - built, not first)
+
+            if first:
+                queued.append(index)
+                if not sender.queued:
+                    stamp(queued)
+        flush()
+
+    def _templates(self, length: int) -> list[PacketTemplate]:
+        # one per source for every host, the address is patched per probe
+        templates = []
+        for src_addr, src_port in self.sources[length]:
+            pf = packet_factory(src_addr, src_port, bytes(length), 0)
+            pf.tcp_header.flags = self.options.profile.flags
+            templates.append(pf.generate_template())
+        return templates
+
+    def _packed_hosts(
+        self, hosts: Sequence[IPv4Address | IPv6Address]
+    ) -> Callable[[int], bytes]:
+        # probes jump between hosts, so small sets are packed only once
+        if host_count(hosts) <= self.HOST_CACHE:
+            return [host.packed for host in hosts].__getitem__
+        return lambda index: hosts[index].packed
+
+    def _probe_index(
+        self, hosts: Sequence[IPv4Address | IPv6Address], ports: list[int]
+    ) -> Callable[[ProbeKey], int | None]:
+        # the index of a probe in the probe order, None if it is not in the scan
+        port_indexes = {port: i for i, port in enumerate(ports)}
+        # target sets find a host from their ranges, anything else is a
+        # list whose index() would walk every host
+        host_indexes = None
+        if (
+            not isinstance(hosts, (TargetSet, TargetView))
+            or host_count(hosts) <= self.HOST_CACHE
+        ):
+            host_indexes = {host.packed: i for i, host in enumerate(hosts)}
+
+        def host_index(addr: bytes) -> int | None:
+            if host_indexes is not None:
+                return host_indexes.get(addr)
+            try:
+                return hosts.index(ip_address(addr))
+            except ValueError:
+                return None
+
+        def index_of(key: ProbeKey) -> int | None:
+            host = host_index(key[0])
+            port = port_indexes.get(key[1])
+            if host is None or port is None:
+                return None
+            return host * len(ports) + port
+
+        return index_of
+
+    def _receive_loop(self, socks: dict[int, tuple[socket.socket, socket.socket]]):
+        receivers = {}
+        for sock, icmp_sock in socks.values():
+            receivers[sock] = BatchReceiver(sock, self.options.batch_size)
+            receivers[icmp_sock] = BatchReceiver(icmp_sock, self.options.batch_size)
+
+        metrics = self.metrics
+        while not self._stop.is_set():
+            readable, _, _ = select.select(list(receivers), [], [], self.POLL_INTERVAL)
+            for s in readable:
+                start = perf_counter() if metrics is not None else 0.0
+                packets, handle = self._receive_batch(s, receivers[s])
+                received = perf_counter() if metrics is not None else 0.0
+                for packet in packets:
+                    kind = handle(packet)
+                    if metrics is not None:
+                        metrics.replies[kind] += 1
+                if metrics is not None:
+                    metrics.receive_time += received - start
+                    metrics.parse_time += perf_counter() - received
+
+    def _receive_batch(
+        self, s: socket.socket, receiver: BatchReceiver
+    ) -> tuple[list[Any], Callable[[Any], str]]:
+        # the packets waiting on a socket and the handler returning their class
+        classify = self.classifier.classify
+        if s.proto == socket.IPPROTO_ICMPV6:
+            classify6 = self.classifier.classify_icmp6
+            return receiver.receive(), lambda packet: self._handle(
+                s, packet, classify6(packet)
+            )
+        if s.family == socket.AF_INET6:
+            return receiver.receive_from(), lambda item: self._handle(
+                s, item[0], classify(*item)
+            )
+        # the ipv4 tcp and icmp sockets both get whole ip packets
+        return receiver.receive(), lambda packet: self._handle(
+            s, packet, classify(packet)
+        )
+
+    def _resolve(self, key: ProbeKey, status: PortStatus, sample: bool = True):
+        index = self._index_of(key)
+        if index is None or self.resolved[index >> 3] & 1 << (index & 7):
+            return
+        self.resolved[index >> 3] |= 1 << (index & 7)
+        self._resolved_count += 1
+        self._on_result(key, status)
+        self.pacer.on_reply()
+
+        # only the first pass fills the ring
+        sent_at = self._sent_at
+        sent_index, sent = (
+            sent_at[index & (self.RTT_RING - 1)] if sent_at else (-1, 0.0)
+        )
+        # icmp errors come from routers, they say nothing about the host
+        if sent_index == index and sample:
+            rtt = monotonic() - sent
+            self.rtt.update(_ntop(key[0]), rtt)
+            # probes of a host are consecutive in the probe index
+            self._sampled[index * len(self._sampled) // self._expected] = 1
+            if self.metrics is not None:
+                self.metrics.rtt.observe(rtt)
+
+        if self._resolved_count >= self._expected:
+            self._resolved.set()
+
+    def _handle(
+        self, sock: socket.socket, packet: memoryview, reply: Reply | None
+    ) -> str:
+        if reply is None:
+            return REPLY_UNRELATED
+        key, status, kind = reply
+        self._resolve(key, status, sample=kind != REPLY_ICMP)
+        if kind == REPLY_SYN_ACK:
+            self._tear_down(sock, packet, key)
+        return kind
+
+    def _tear_down(self, sock: socket.socket, packet: memoryview, key: ProbeKey):
+        # answer the SYN-ACK with an RST so the half open connection goes away
+        # ipv4 replies come with the ip header, ipv6 ones without
+        tcp_begin = (packet[0] & 0x0F) * 4 if len(key[0]) == 4 else 0
+        dst_port, _, ack_num = unpack_from("!HLL", packet, tcp_begin + 2)
+        local_addr = bytes(packet[16:20]) if tcp_begin else self._local_addrs[dst_port]
+        pf = packet_factory(local_addr, dst_port, *key)
+        pf.tcp_header.tcp_rst = 1
+        pf.tcp_header.seq_num = ack_num
+        sock.sendto(pf.generate_packet(), (_ntop(key[0]), 0))
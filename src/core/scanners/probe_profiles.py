@@ -0,0 +1,89 @@
+from dataclasses import dataclass, replace
+
+from core.headers import TCP_ACK, TCP_FIN, TCP_PSH, TCP_RST, TCP_SYN, TCP_URG
+from core.results import PortStatus
+from core.scanners.scanner import ScanType
+
+
+@dataclass(frozen=True)
+class ProbeProfile:
+    """The flags of a raw probe and what the replies to it mean.
+
+    Every raw scan type is a profile on the same engine, they only differ
+    in the packet they send and in how a reply maps to a PortStatus.
+    """
+
+    flags: int
+    syn_ack: PortStatus | None
+    rst: PortStatus
+    no_reply: PortStatus
+    # verdict of the unreachable codes that do not mean filtered
+    icmp_error: PortStatus
+    # window scan, an RST with a non zero window comes from an open port
+    rst_window: PortStatus | None = None
+
+    @property
+    def seq_len(self) -> int:
+        # SYN and FIN take one sequence number each, replies ack past them
+        return bool(self.flags & TCP_SYN) + bool(self.flags & TCP_FIN)
+
+    def reply_cookie(self, seq: int, ack: int) -> int:
+        # the cookie a reply echoes, see PacketTemplate for ACK probes
+        if self.flags & TCP_ACK:
+            return seq
+        return (ack - self.seq_len) & 0xFFFFFFFF
+
+    def classify(self, flags: int, window: int) -> PortStatus | None:
+        if flags & TCP_RST:
+            if self.rst_window is not None and window:
+                return self.rst_window
+            return self.rst
+        if flags & TCP_SYN and flags & TCP_ACK:
+            return self.syn_ack
+        return None
+
+
+SYN = ProbeProfile(
+    TCP_SYN,
+    syn_ack=PortStatus.OPEN,
+    rst=PortStatus.CLOSED,
+    no_reply=PortStatus.FILTERED,
+    icmp_error=PortStatus.CLOSED,
+)
+
+# RFC 793 says closed ports answer with RST and open ones stay quiet
+FIN = ProbeProfile(
+    TCP_FIN,
+    syn_ack=None,
+    rst=PortStatus.CLOSED,
+    no_reply=PortStatus.OPEN_FILTERED,
+    icmp_error=PortStatus.CLOSED,
+)
+NULL = replace(FIN, flags=0)
+XMAS = replace(FIN, flags=TCP_FIN | TCP_PSH | TCP_URG)
+
+# any RST means the probe got through the firewall
+ACK = ProbeProfile(
+    TCP_ACK,
+    syn_ack=None,
+    rst=PortStatus.UNFILTERED,
+    no_reply=PortStatus.FILTERED,
+    icmp_error=PortStatus.FILTERED,
+)
+WINDOW = ProbeProfile(
+    TCP_ACK,
+    syn_ack=None,
+    rst=PortStatus.CLOSED,
+    no_reply=PortStatus.FILTERED,
+    icmp_error=PortStatus.FILTERED,
+    rst_window=PortStatus.OPEN,
+)
+
+PROFILES = {
+    ScanType.SYN: SYN,
+    ScanType.FIN: FIN,
+    ScanType.NULL: NULL,
+    ScanType.XMAS: XMAS,
+    ScanType.ACK: ACK,
+    ScanType.WINDOW: WINDOW,
+}
@@ -0,0 +1,148 @@
+from struct import unpack_from
+import socket
+
+from core.cookie import keyed_cookie
+from core.headers import IP_HDR_LEN, IPV6_HDR_LEN, TCP_RST
+from core.metrics import REPLY_ICMP, REPLY_RST, REPLY_SYN_ACK
+from core.results import PortStatus
+from core.scanners.probe_profiles import ProbeProfile
+
+ProbeKey = tuple[bytes, int]
+# the status of a port and the class of the reply telling it
+Verdict = tuple[PortStatus, str]
+# the probe a reply answers and its verdict
+Reply = tuple[ProbeKey, PortStatus, str]
+
+TCP_MIN_LEN = 20
+
+ICMP_UNREACHABLE = 3
+ICMP_FILTERED_CODES = frozenset({1, 2, 3, 9, 10, 13})
+# same verdicts as above: prohibited, address or port unreachable, policy
+ICMP6_UNREACHABLE = 1
+ICMP6_FILTERED_CODES = frozenset({1, 3, 4, 5, 6})
+
+# the table index of a reply with a non zero window
+WINDOW_BIT = 0x100
+
+
+def _tcp_verdict(profile: ProbeProfile, flags: int, window: int) -> Verdict | None:
+    status = profile.classify(flags, window)
+    if status is None:
+        return None
+    if flags & TCP_RST:
+        return status, REPLY_RST
+    return status, REPLY_SYN_ACK
+
+
+class ReplyClassifier:
+    """Matches raw replies to probes, reading them straight from the buffer.
+
+    Probes carry a keyed hash of their target as the cookie, so a reply is
+    ours when the cookie it echoes is the hash of where it came from. ICMP
+    errors are matched by the probe header they quote. What a reply means
+    is looked up in tables built from the profile, by TCP flags and window
+    or by unreachable code.
+    """
+
+    def __init__(self, profile: ProbeProfile, src_ports: frozenset[int], key: bytes):
+        self.profile = profile
+        self.src_ports = src_ports
+        self.key = key
+        self._tcp = tuple(
+            _tcp_verdict(profile, index & 0xFF, index & WINDOW_BIT)
+            for index in range(2 * WINDOW_BIT)
+        )
+        self._icmp = self._icmp_table(ICMP_FILTERED_CODES)
+        self._icmp6 = self._icmp_table(ICMP6_FILTERED_CODES)
+
+    def _icmp_table(self, filtered_codes: frozenset[int]) -> tuple[Verdict, ...]:
+        return tuple(
+            (
+                PortStatus.FILTERED
+                if code in filtered_codes
+                else self.profile.icmp_error,
+                REPLY_ICMP,
+            )
+            for code in range(256)
+        )
+
+    def cookie(self, dst_addr: bytes, dst_port: int) -> int:
+        return keyed_cookie(dst_addr + dst_port.to_bytes(2, "big"), self.key)
+
+    def classify(
+        self, packet: memoryview, src_addr: bytes | None = None
+    ) -> Reply | None:
+        # ipv4 packets start with the ip header, ipv6 ones come with src_addr
+        if src_addr is not None:
+            return self._tcp_reply(packet, 0, src_addr)
+        if len(packet) < IP_HDR_LEN:
+            return None
+        proto, begin = packet[9], (packet[0] & 0x0F) * 4
+        if proto == socket.IPPROTO_TCP:
+            return self._tcp_reply(packet, begin, packet[12:16])
+        if proto == socket.IPPROTO_ICMP:
+            return self._icmp_reply(packet, begin)
+        return None
+
+    def _tcp_reply(
+        self, packet: memoryview, begin: int, src_addr: bytes | memoryview
+    ) -> Reply | None:
+        # most of the traffic is not ours, drop it before allocating anything
+        if len(packet) < begin + TCP_MIN_LEN:
+            return None
+        src_port, dst_port, seq, ack_num = unpack_from("!HHLL", packet, begin)
+        if dst_port not in self.src_ports:
+            return None
+
+        flags, window = unpack_from("!BH", packet, begin + 13)
+        verdict = self._tcp[flags | WINDOW_BIT if window else flags]
+        if verdict is None:
+            return None
+        key = (bytes(src_addr), src_port)
+        if self.profile.reply_cookie(seq, ack_num) != self.cookie(*key):
+            return None
+        return key, *verdict
+
+    def _icmp_reply(self, packet: memoryview, begin: int) -> Reply | None:
+        # unreachable carries the original ip header and 8 bytes of tcp
+        inner_begin = begin + 8
+        if len(packet) < inner_begin + IP_HDR_LEN:
+            return None
+        if packet[begin] != ICMP_UNREACHABLE:
+            return None
+        if packet[inner_begin + 9] != socket.IPPROTO_TCP:
+            return None
+
+        tcp_begin = inner_begin + (packet[inner_begin] & 0x0F) * 4
+        dst_addr = packet[inner_begin + 16 : inner_begin + 20]
+        return self._quoted_probe(
+            packet, tcp_begin, dst_addr, self._icmp[packet[begin + 1]]
+        )
+
+    def classify_icmp6(self, packet: memoryview) -> Reply | None:
+        # no outer ip header on icmpv6 sockets, the inner one has no options
+        inner_begin = 8
+        if len(packet) < inner_begin + IPV6_HDR_LEN:
+            return None
+        if packet[0] != ICMP6_UNREACHABLE:
+            return None
+        if packet[inner_begin + 6] != socket.IPPROTO_TCP:
+            return None
+
+        tcp_begin = inner_begin + IPV6_HDR_LEN
+        dst_addr = packet[inner_begin + 24 : inner_begin + 40]
+        return self._quoted_probe(packet, tcp_begin, dst_addr, self._icmp6[packet[1]])
+
+    def _quoted_probe(
+        self, packet: memoryview, tcp_begin: int, dst_addr: memoryview, verdict: Verdict
+    ) -> Reply | None:
+        if len(packet) < tcp_begin + 8:
+            return None
+        src_port, dst_port, seq = unpack_from("!HHL", packet, tcp_begin)
+        if src_port not in self.src_ports:
+            return None
+
+        key = (bytes(dst_addr), dst_port)
+        if seq != self.cookie(*key):
+            return None
+        return key, *verdict
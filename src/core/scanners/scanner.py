@@ -1,54 +1,61 @@
 from abc import ABC, abstractmethod
 from ipaddress import IPv4Address, IPv6Address
 from enum import Enum
-from socket import socket, AF_INET, SOCK_DGRAM, SOCK_STREAM, error as socket_error
-from random import randint
-from errno import EADDRINUSE
+from typing import Callable, Iterator, Sequence
 
-from core.results import ScanResult
+from core.results import ScanResult, PortFinding
+from core.rtt import RTTEstimator
+from core.metrics import ScanMetrics
+from core.pacer import Pacer
+from core.source_pool import local_ip
+from core.streaming import stream
 
 
 class ScanType(Enum):
     TCP = "TCP"
     SYN = "SYN"
-    # XMAS = "XMAS"
-    # FIN = "FIN"
-    # NULL = "NULL"
+    ASYNC_TCP = "ASYNC_TCP"
+    XMAS = "XMAS"
+    FIN = "FIN"
+    NULL = "NULL"
+    ACK = "ACK"
+    WINDOW = "WINDOW"
 
 
 class Scanner(ABC):
+    rtt: RTTEstimator
+    # only raw scanners are paced
+    pacer: Pacer | None = None
+    # hot path counters, only kept when asked for
+    metrics: ScanMetrics | None = None
+
     @abstractmethod
     def scan(self, host: IPv4Address | IPv6Address, ports: list[int]) -> ScanResult:
         pass
 
+    def iter_scan(
+        self, hosts: Sequence[IPv4Address | IPv6Address], ports: list[int]
+    ) -> Iterator[PortFinding]:
+        # scanners that can do better yield ports as soon as they are resolved
+        for host in hosts:
+            res = self.scan(host, ports)
+            for port, status in res.port_status.items():
+                yield PortFinding(host, port, status)
+
+    def scan_hosts(
+        self, hosts: Sequence[IPv4Address | IPv6Address], ports: list[int]
+    ) -> list[ScanResult]:
+        found = {host: ScanResult(host=host) for host in hosts}
+        for finding in self.iter_scan(hosts, ports):
+            found[finding.host].port_status[finding.port] = finding.status
+
+        return list(found.values())
+
+    def stream(
+        self, run: Callable[[Callable[[PortFinding], None]], None]
+    ) -> Iterator[PortFinding]:
+        # runs a scan that reports through a callback in a thread of its own
+        return stream(run)
+
     def get_self_ip(self) -> str:
-        s = socket(AF_INET, SOCK_DGRAM)
-        s.settimeout(0)
-        try:
-            # does not have be reachable
-            s.connect(("10.254.254.254", 1))
-            ip = s.getsockname()[0]
-        except socket_error:
-            ip = "127.0.0.1"
-        finally:
-            s.close()
-
-        return ip
-
-    def get_free_port(self, ip_addr: str) -> int:
-        port: int
-
-        while True:
-            # ephemeral ports are from 49152 to 65535
-            port = randint(49152, 65535)
-            s = socket(AF_INET, SOCK_STREAM)
-
-            try:
-                s.bind((ip_addr, port))
-            except socket_error as e:
-                if e.errno == EADDRINUSE:
-                    continue
-                return -1
-
-            s.close()
-            return port
+        return local_ip()
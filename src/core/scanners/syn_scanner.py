@@ -1,166 +1,204 @@
-from ipaddress import IPv4Address, IPv6Address
-from random import randint
-from struct import unpack
-from datetime import datetime
+from dataclasses import replace
+from ipaddress import IPv4Address, IPv6Address, ip_address
+from time import monotonic
+from typing import Callable, Iterator, Sequence
 import socket
 
 from core.scanners.scanner import Scanner
-from core.packet_factory import PacketFactory
-from core.headers import unpack_headers, TCPHeader, IPHeader, IP_HDR_LEN
-from core.results import ScanResult, PortStatus
+from core.scanners.probe_engine import ProbeEngine, EngineOptions, IPV6_HDRINCL
+from core.scanners.reply_classifier import ReplyClassifier
+from core.packet_factory import BasePacketFactory, packet_factory
+from core.headers import TCP_ACK, TCP_SYN
+from core.cookie import new_key
+from core.metrics import REPLY_ICMP
+from core.results import ScanResult, PortStates, PortStatus, PortFinding
+from core.rtt import RTTEstimator
+from core.pacer import Pacer
+from core.source_pool import SourcePool, local_ip
+from core.targets import TargetSet, TargetView
 
 
 class SYNScanner(Scanner):
-    ICMP_RES_FILTERED = 1
-    ICMP_RES_ERROR = 2
-    ICMP_RES_OK = 0
-
-    ICMP_UNREACHABLE = 3
-
-    def __init__(self, timeout: int = 10, retires: int = 2):
+    def __init__(
+        self,
+        timeout: int = 10,
+        retires: int = 2,
+        pacer: Pacer | None = None,
+        options: EngineOptions | None = None,
+    ):
         self.timeout = timeout
         self.retries = retires
+        # a pacer enables the decoupled send/receive engine
+        self.pacer = pacer
+        # a copy, the caller's options may be shared with other scanners
+        self.options = replace(options or EngineOptions(), retries=retires)
         self.src_ip = self.get_self_ip()
-
-    def is_packet_for_us(
-        self, tcp_hdr: TCPHeader, src_port: int, dst_port: int
-    ) -> bool:
-        if tcp_hdr.src_port != dst_port or tcp_hdr.dst_port != src_port:
-            return False
-
-        return True
-
-    def is_packet_syn_ack(self, tcp_hdr: TCPHeader, seq: int) -> bool:
-        return (
-            tcp_hdr.tcp_syn == 1 and tcp_hdr.tcp_ack == 1 and tcp_hdr.ack_num == seq + 1
-        )
-
-    def is_packet_rst(self, tcp_hdr: TCPHeader) -> bool:
-        return tcp_hdr.tcp_rst == 1
-
-    def icmp_error(self, packet: bytes) -> int:
-        ip_hdr = IPHeader.from_bytes(packet[:IP_HDR_LEN])
-
-        if not ip_hdr.proto == socket.IPPROTO_ICMP:
-            return self.ICMP_RES_OK
-
-        icmp_type, icmp_code = unpack("!BB", packet[IP_HDR_LEN : IP_HDR_LEN + 2])
-
-        if icmp_type != self.ICMP_UNREACHABLE:
-            return self.ICMP_RES_ERROR
-
-        icmp_filtered_codes = {1, 2, 3, 9, 10, 13}
-        if icmp_code in icmp_filtered_codes:
-            return self.ICMP_RES_FILTERED
-
-        return self.ICMP_RES_ERROR
+        # timeout is only used until the host answers for the first time
+        self.rtt = RTTEstimator(initial_rto=timeout)
 
     # returns if it was success (or got timeout)
+    # pylint: disable=too-many-locals
     def try_send_syn(
         self,
-        src_port: int,
+        classifier: ReplyClassifier,
         dst_ip_port: tuple[str, int],
         sock: socket.socket,
-        pf: PacketFactory,
+        pf: BasePacketFactory,
+        buffer: memoryview,
     ) -> PortStatus:
-        pf.tcp_header.tcp_syn = 1
-        seq = randint(100, 1_000_000_000)
+        profile = classifier.profile
+        key = (ip_address(dst_ip_port[0]).packed, dst_ip_port[1])
+        pf.tcp_header.flags = profile.flags
+        seq = classifier.cookie(*key)
         pf.tcp_header.seq_num = seq
+        if profile.flags & TCP_ACK:
+            # answered with an RST whose seq is our ack
+            pf.tcp_header.ack_num = seq
 
         out_packet = pf.generate_packet()
 
-        sock.settimeout(self.timeout)
+        rto = self.rtt.rto(dst_ip_port[0])
+        sock.settimeout(rto)
 
         i = 0
         old_i = -1
-        listen_start: datetime
+        listen_start: float
 
         while i < self.retries:
             if i != old_i:
-                # print("Sending SYN")
                 sock.sendto(out_packet, (dst_ip_port[0], 0))
-                listen_start = datetime.now()
+                listen_start = monotonic()
                 old_i = i
             try:
-                in_packet, in_addr = sock.recvfrom(65535)
+                size, in_addr = sock.recvfrom_into(buffer)
             except socket.error:
                 # no response
-                # print("No response")
                 i += 1
                 continue
 
             # got timeout (w/ other packets in between)
-            if (datetime.now() - listen_start).seconds >= self.timeout:
+            if monotonic() - listen_start >= rto:
                 i += 1
-                # print("No response")
                 continue
 
-            # idk how would that happen but ok
-            if in_addr[0] != dst_ip_port[0]:
-                # print("Wrong response src ip")
+            # ipv6 raw sockets strip the ip header, the address comes apart
+            if sock.family == socket.AF_INET6:
+                reply = classifier.classify(
+                    buffer[:size], socket.inet_pton(socket.AF_INET6, in_addr[0])
+                )
+            else:
+                reply = classifier.classify(buffer[:size])
+            if reply is None or reply[0] != key:
                 continue
 
-            icmp_res = self.icmp_error(in_packet)
-
-            if icmp_res == self.ICMP_RES_FILTERED:
-                return PortStatus.FILTERED
-
-            if icmp_res == self.ICMP_RES_ERROR:
-                return PortStatus.CLOSED
-
-            _, tcp_hdr = unpack_headers(in_packet)
-
-            if not self.is_packet_for_us(tcp_hdr, src_port, dst_ip_port[1]):
-                # print("Packet for another port")
-                continue
-
-            if self.is_packet_syn_ack(tcp_hdr, seq):
-                # print("Received SYN/ACK")
-                return PortStatus.OPEN
-
-            if self.is_packet_rst(tcp_hdr):
-                # print("Received RST")
-                return PortStatus.CLOSED
-
-            return PortStatus.CLOSED
+            # replies to retransmissions are ambiguous (Karn), not sampled
+            if i == 0 and reply[2] != REPLY_ICMP:
+                self.rtt.update(dst_ip_port[0], monotonic() - listen_start)
+            return reply[1]
 
         # no response after retransmissions
-        return PortStatus.FILTERED
+        return profile.no_reply
+
+    def _default_sources(self, hosts: Sequence[IPv4Address | IPv6Address]) -> list[str]:
+        if isinstance(hosts, (TargetSet, TargetView)):
+            versions = hosts.versions
+        else:
+            versions = {host.version for host in hosts}
+        if not versions:
+            return [self.src_ip]
+        return [
+            self.src_ip if version == 4 else local_ip(6) for version in sorted(versions)
+        ]
+
+    def _run_engine(
+        self,
+        hosts: Sequence[IPv4Address | IPv6Address],
+        ports: list[int],
+        emit: Callable[[PortFinding], None],
+    ):
+        if self.pacer is None:
+            raise ValueError("The probe engine needs a pacer")
+
+        src_ips = self.options.src_ips or self._default_sources(hosts)
+        with SourcePool(src_ips, self.options.src_ports) as pool:
+            engine = ProbeEngine(
+                pool.sources, self.options, self.rtt, self.pacer, self.metrics
+            )
+
+            # unanswered probes are reported as FILTERED at the end
+            engine.run(
+                hosts,
+                ports,
+                lambda key, status: emit(
+                    PortFinding(ip_address(key[0]), key[1], status)
+                ),
+            )
+
+    def iter_scan(
+        self, hosts: Sequence[IPv4Address | IPv6Address], ports: list[int]
+    ) -> Iterator[PortFinding]:
+        if self.pacer is not None:
+            yield from self.stream(lambda emit: self._run_engine(hosts, ports, emit))
+            return
+
+        for host in hosts:
+            for port, status in self._scan_blocking(host, ports):
+                yield PortFinding(host, port, status)
 
-    # pylint: disable=duplicate-code
     def scan(self, host: IPv4Address | IPv6Address, ports: list[int]) -> ScanResult:
-        # do some actual work
-        port_status: dict[int, PortStatus] = {}
-
-        src_addr = socket.inet_aton(self.src_ip)
-        dst_addr = socket.inet_aton(str(host))
-
-        src_port = self.get_free_port(self.src_ip)
-
-        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_HDRINCL, 1)
-
-        for port in ports:
-            sock.bind((self.src_ip, src_port))
-            pf = PacketFactory(src_addr, src_port, dst_addr, port)
+        if self.pacer is not None:
+            return self.scan_hosts([host], ports)[0]
 
-            # send SYN
-            status = self.try_send_syn(src_port, (str(host), port), sock, pf)
-            pf.tcp_header.tcp_syn = 0
-            pf.tcp_header.seq_num = 0
-
-            if status != PortStatus.OPEN:
-                port_status[port] = status
-                continue
-
-            # send RST
-            pf.tcp_header.tcp_rst = 1
-            out_packet = pf.generate_packet()
-            # print("Sending RST")
-            sock.sendto(out_packet, (str(host), 0))
-
-            port_status[port] = PortStatus.OPEN
-
-        sock.close()
+        port_status = PortStates(self._scan_blocking(host, ports))
         res = ScanResult(port_status, host)
         return res
+
+    def _scan_blocking(
+        self, host: IPv4Address | IPv6Address, ports: list[int]
+    ) -> Iterator[tuple[int, PortStatus]]:
+        # do some actual work
+        src_ip = self.src_ip if host.version == 4 else local_ip(6)
+        src_addr = ip_address(src_ip).packed
+        dst_addr = host.packed
+
+        pool = SourcePool([src_ip], 1)
+        src_port = pool.reserve()[0][1]
+
+        if host.version == 4:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_HDRINCL, 1)
+        else:
+            sock = socket.socket(socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_TCP)
+            sock.setsockopt(socket.IPPROTO_IPV6, IPV6_HDRINCL, 1)
+        sock.bind((src_ip, 0))
+        buffer = memoryview(bytearray(65535))
+        classifier = ReplyClassifier(
+            self.options.profile, frozenset({src_port}), new_key()
+        )
+
+        try:
+            for port in ports:
+                pf = packet_factory(src_addr, src_port, dst_addr, port)
+
+                # send SYN
+                status = self.try_send_syn(
+                    classifier, (str(host), port), sock, pf, buffer
+                )
+                pf.tcp_header.flags = 0
+                pf.tcp_header.seq_num = 0
+                pf.tcp_header.ack_num = 0
+
+                # only a SYN opens a connection that has to be torn down
+                if status != PortStatus.OPEN or not classifier.profile.flags & TCP_SYN:
+                    yield port, status
+                    continue
+
+                # send RST
+                pf.tcp_header.tcp_rst = 1
+                out_packet = pf.generate_packet()
+                sock.sendto(out_packet, (str(host), 0))
+
+                yield port, PortStatus.OPEN
+        finally:
+            sock.close()
+            pool.release()
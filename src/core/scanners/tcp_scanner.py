@@ -1,17 +1,35 @@
 from ipaddress import IPv4Address, IPv6Address
+from errno import ECONNREFUSED
+from time import monotonic
+from typing import Iterator, Sequence
 import socket
 
 from core.scanners.scanner import Scanner
-from core.results import ScanResult, PortStatus
+from core.results import ScanResult, PortStates, PortStatus, PortFinding
+from core.rtt import RTTEstimator
 
 
 class TCPScanner(Scanner):
     def __init__(self, timeout: float = 1.0):
         self.timeout = timeout
+        self.rtt = RTTEstimator(initial_rto=timeout)
+
+    def iter_scan(
+        self, hosts: Sequence[IPv4Address | IPv6Address], ports: list[int]
+    ) -> Iterator[PortFinding]:
+        for host in hosts:
+            for port, status in self._scan_ports(host, ports):
+                yield PortFinding(host, port, status)
 
     def scan(self, host: IPv4Address | IPv6Address, ports: list[int]) -> ScanResult:
-        port_status = {}
+        port_status = PortStates(self._scan_ports(host, ports))
+
+        res = ScanResult(port_status, host)
+        return res
 
+    def _scan_ports(
+        self, host: IPv4Address | IPv6Address, ports: list[int]
+    ) -> Iterator[tuple[int, PortStatus]]:
         # dla 4 i 6 zeby dzialalo to jaka
         if isinstance(host, IPv4Address):
             family = socket.AF_INET
@@ -20,27 +38,26 @@ class TCPScanner(Scanner):
 
         for port in ports:
             try:
-                # print("asdfffffffffff")
                 sock = socket.socket(family, socket.SOCK_STREAM)
 
-                sock.settimeout(self.timeout)
+                sock.settimeout(self.rtt.rto(str(host)))
 
+                start = monotonic()
                 result = sock.connect_ex((str(host), port))
-                # print("asdassd")
-                # print(result)
-                # print("ruskidubger")
+                if result in (0, ECONNREFUSED):
+                    # both SYN/ACK and RST are a round trip
+                    self.rtt.update(str(host), monotonic() - start)
                 if result == 0:
                     # wedlug intenetow connectex 0 to ze jest open idk will see
-                    port_status[port] = PortStatus.OPEN
+                    status = PortStatus.OPEN
                 else:
-                    port_status[port] = PortStatus.CLOSED
+                    status = PortStatus.CLOSED
 
                 sock.close()
 
             except socket.timeout:
-                port_status[port] = PortStatus.FILTERED
+                status = PortStatus.FILTERED
             except socket.error:
-                port_status[port] = PortStatus.CLOSED
+                status = PortStatus.CLOSED
 
-        res = ScanResult(port_status, host)
-        return res
+            yield port, status
@@ -0,0 +1,48 @@
+from ipaddress import IPv4Address, IPv6Address
+import socket
+
+from core.results import PortFinding, PortStatus
+from core.scanners.async_tcp_scanner import AsyncTCPScanner
+
+
+def listener(host: str) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.bind((host, 0))
+    sock.listen()
+    return sock
+
+
+def closed_port(host: str) -> int:
+    # free once the socket is gone, nobody listens on it
+    with listener(host) as sock:
+        return sock.getsockname()[1]
+
+
+def test_scan_finds_open_and_closed_ports():
+    with listener("127.0.0.1") as server:
+        open_port, closed = server.getsockname()[1], closed_port("127.0.0.1")
+        result = AsyncTCPScanner(timeout=1, concurrency=4).scan(
+            IPv4Address("127.0.0.1"), [open_port, closed]
+        )
+
+    assert result.port_status[open_port] == PortStatus.OPEN
+    assert result.port_status[closed] == PortStatus.CLOSED
+
+
+def test_every_probe_is_streamed_once():
+    with listener("127.0.0.1") as v4, listener("::1") as v6:
+        hosts: list[IPv4Address | IPv6Address] = [
+            IPv4Address("127.0.0.1"),
+            IPv6Address("::1"),
+        ]
+        ports = [v4.getsockname()[1], v6.getsockname()[1], closed_port("::1")]
+        findings = list(
+            AsyncTCPScanner(timeout=1, concurrency=2, seed=1).iter_scan(hosts, ports)
+        )
+
+    assert sorted((str(f.host), f.port) for f in findings) == sorted(
+        (str(host), port) for host in hosts for port in ports
+    )
+    assert PortFinding(hosts[0], ports[0], PortStatus.OPEN) in findings
+    assert PortFinding(hosts[1], ports[1], PortStatus.OPEN) in findings
+    assert PortFinding(hosts[1], ports[2], PortStatus.CLOSED) in findings
@@ -0,0 +1,110 @@
+# pylint: disable=protected-access
+from ipaddress import IPv4Address
+import os
+import socket
+
+import pytest
+
+from core.headers import TCP_ACK, TCP_RST
+from core.metrics import REPLY_RST, REPLY_UNRELATED
+from core.packet_factory import PacketFactory
+from core.pacer import Pacer
+from core.results import PortStatus
+from core.rtt import RTTEstimator
+from core.scanners.probe_engine import EngineOptions, ProbeEngine
+from core.scanners.syn_scanner import SYNScanner
+
+LOCAL = "192.0.2.1"
+SRC_PORT = 40000
+HOST = IPv4Address("198.51.100.7")
+
+
+def make_engine() -> ProbeEngine:
+    return ProbeEngine(
+        [(LOCAL, SRC_PORT)], EngineOptions(), RTTEstimator(), Pacer(1000)
+    )
+
+
+def rst_reply(engine: ProbeEngine, port: int) -> memoryview:
+    # what a closed port sends back to a probe of the engine
+    pf = PacketFactory(HOST.packed, port, socket.inet_aton(LOCAL), SRC_PORT)
+    pf.tcp_header.flags = TCP_RST | TCP_ACK
+    pf.tcp_header.ack_num = (engine.classifier.cookie(HOST.packed, port) + 1) & (
+        2**32 - 1
+    )
+    return memoryview(pf.generate_packet())
+
+
+def handle(engine: ProbeEngine, packet: memoryview) -> str:
+    return engine._handle(None, packet, engine.classifier.classify(packet))  # type: ignore[arg-type]
+
+
+def test_replies_resolve_their_probe_once():
+    engine = make_engine()
+    results: list = []
+    engine._reset([HOST], [80, 443], lambda *result: results.append(result))
+
+    assert handle(engine, rst_reply(engine, 80)) == REPLY_RST
+    assert handle(engine, rst_reply(engine, 80)) == REPLY_RST
+    # a valid cookie, but not a port of this scan
+    handle(engine, rst_reply(engine, 22))
+
+    assert results == [((HOST.packed, 80), PortStatus.CLOSED)]
+    assert not engine._resolved.is_set()
+
+    handle(engine, rst_reply(engine, 443))
+    assert engine._resolved.is_set()
+
+
+def test_replies_to_other_scans_are_ignored():
+    engine = make_engine()
+    results: list = []
+    engine._reset([HOST], [80], lambda *result: results.append(result))
+
+    assert handle(engine, rst_reply(make_engine(), 80)) == REPLY_UNRELATED
+    assert not results
+
+
+def test_unsampled_hosts_wait_the_initial_timeout():
+    engine = make_engine()
+    other = IPv4Address("198.51.100.8")
+    engine._reset([HOST, other], [80], lambda *_: None)
+    engine.rtt.update(str(HOST), 0.01)
+    assert engine._timeout([HOST, other]) == engine.rtt.initial_rto
+
+    engine.rtt.update(str(other), 0.01)
+    assert engine._timeout([HOST, other]) == engine.rtt.min_rto
+
+
+def test_host_lists_are_indexed_by_address(monkeypatch):
+    class Unsearchable(list):
+        def index(self, *_):
+            raise AssertionError("hosts searched one by one")
+
+    engine = make_engine()
+    monkeypatch.setattr(ProbeEngine, "HOST_CACHE", 1)
+    other = IPv4Address("198.51.100.8")
+    index_of = engine._probe_index(Unsearchable([HOST, other]), [80, 443])
+    assert index_of((other.packed, 443)) == 3
+    assert index_of((IPv4Address("198.51.100.9").packed, 80)) is None
+
+
+def test_sources_need_their_own_ports():
+    # an rst for an ipv6 reply goes out from the address its port belongs to
+    sources = [("2001:db8::1", 40000), ("2001:db8::2", 40000)]
+    with pytest.raises(ValueError):
+        ProbeEngine(sources, EngineOptions(), RTTEstimator(), Pacer(1000))
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="raw sockets need root")
+def test_scan_over_loopback():
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+
+        scanner = SYNScanner(timeout=1, pacer=Pacer(10_000))
+        result = scanner.scan(IPv4Address("127.0.0.1"), [port, 1])
+
+    assert result.port_status[port] == PortStatus.OPEN
+    assert result.port_status[1] == PortStatus.CLOSED
@@ -0,0 +1,36 @@
+from core.headers import TCP_ACK, TCP_RST, TCP_SYN
+from core.results import PortStatus
+from core.scanners.probe_profiles import ACK, FIN, NULL, SYN, WINDOW, XMAS
+
+
+def test_syn_verdicts():
+    assert SYN.classify(TCP_SYN | TCP_ACK, 65535) == PortStatus.OPEN
+    assert SYN.classify(TCP_RST | TCP_ACK, 0) == PortStatus.CLOSED
+    assert SYN.classify(TCP_ACK, 0) is None
+    assert SYN.no_reply == PortStatus.FILTERED
+
+
+def test_inverse_scans_only_hear_from_closed_ports():
+    for profile in (FIN, NULL, XMAS):
+        assert profile.classify(TCP_RST | TCP_ACK, 0) == PortStatus.CLOSED
+        assert profile.classify(TCP_SYN | TCP_ACK, 0) is None
+        assert profile.no_reply == PortStatus.OPEN_FILTERED
+
+
+def test_ack_and_window_verdicts():
+    assert ACK.classify(TCP_RST, 0) == PortStatus.UNFILTERED
+    assert ACK.classify(TCP_RST, 1024) == PortStatus.UNFILTERED
+    assert WINDOW.classify(TCP_RST, 0) == PortStatus.CLOSED
+    assert WINDOW.classify(TCP_RST, 1024) == PortStatus.OPEN
+    assert ACK.no_reply == WINDOW.no_reply == PortStatus.FILTERED
+
+
+def test_reply_cookie():
+    # replies ack past the sequence numbers SYN and FIN take
+    assert SYN.reply_cookie(7, 1001) == 1000
+    assert FIN.reply_cookie(7, 1001) == 1000
+    assert XMAS.reply_cookie(7, 1001) == 1000
+    assert NULL.reply_cookie(7, 1000) == 1000
+    assert SYN.reply_cookie(7, 0) == 0xFFFFFFFF
+    # an RST to an ACK probe takes its sequence number from the probe's ack
+    assert ACK.reply_cookie(1000, 0) == 1000
@@ -0,0 +1,108 @@
+from struct import pack
+import socket
+
+from core.headers import TCP_ACK, TCP_RST, TCP_SYN
+from core.metrics import REPLY_ICMP, REPLY_RST, REPLY_SYN_ACK
+from core.packet_factory import PacketFactory
+from core.results import PortStatus
+from core.scanners.probe_profiles import SYN, WINDOW
+from core.scanners.reply_classifier import ReplyClassifier
+
+LOCAL = socket.inet_aton("192.0.2.1")
+HOST = socket.inet_aton("198.51.100.7")
+SRC_PORT = 40000
+KEY = b"0123456789abcdef"
+
+
+def make_reply(
+    flags: int, seq: int = 0, ack_num: int = 0, window: int = 0
+) -> memoryview:
+    pf = PacketFactory(HOST, 80, LOCAL, SRC_PORT)
+    pf.tcp_header.flags = flags
+    pf.tcp_header.seq_num = seq
+    pf.tcp_header.ack_num = ack_num
+    pf.tcp_header.window = window
+    return memoryview(pf.generate_packet())
+
+
+def make_unreachable(
+    classifier: ReplyClassifier, code: int, seq: int = 0
+) -> memoryview:
+    # a router quotes the ip header and 8 bytes of tcp of the probe
+    pf = PacketFactory(LOCAL, SRC_PORT, HOST, 80)
+    pf.tcp_header.seq_num = seq or classifier.cookie(HOST, 80)
+    probe = pf.generate_packet()[:28]
+    router = socket.inet_aton("203.0.113.1")
+    ip_hdr = pack("!BBHHHBBH4s4s", 0x45, 0, 56, 0, 0, 64, 1, 0, router, LOCAL)
+    return memoryview(ip_hdr + pack("!BBHL", 3, code, 0, 0) + probe)
+
+
+def test_tcp_replies():
+    classifier = ReplyClassifier(SYN, frozenset({SRC_PORT}), KEY)
+    ack_num = classifier.cookie(HOST, 80) + 1
+
+    assert classifier.classify(make_reply(TCP_SYN | TCP_ACK, ack_num=ack_num)) == (
+        (HOST, 80),
+        PortStatus.OPEN,
+        REPLY_SYN_ACK,
+    )
+    assert classifier.classify(make_reply(TCP_RST | TCP_ACK, ack_num=ack_num)) == (
+        (HOST, 80),
+        PortStatus.CLOSED,
+        REPLY_RST,
+    )
+    assert classifier.classify(make_reply(TCP_ACK, ack_num=ack_num)) is None
+
+
+def test_foreign_replies_are_ignored():
+    classifier = ReplyClassifier(SYN, frozenset({SRC_PORT}), KEY)
+    other = ReplyClassifier(SYN, frozenset({SRC_PORT}), b"other key")
+    ack_num = other.cookie(HOST, 80) + 1
+
+    assert classifier.classify(make_reply(TCP_SYN | TCP_ACK, ack_num=ack_num)) is None
+    assert classifier.classify(make_unreachable(other, 3)) is None
+
+
+def test_window_is_in_the_table():
+    classifier = ReplyClassifier(WINDOW, frozenset({SRC_PORT}), KEY)
+    # the rst to an ack probe takes its seq from the probe's ack, the cookie
+    seq = classifier.cookie(HOST, 80)
+
+    assert classifier.classify(make_reply(TCP_RST, seq=seq)) == (
+        (HOST, 80),
+        PortStatus.CLOSED,
+        REPLY_RST,
+    )
+    assert classifier.classify(make_reply(TCP_RST, seq=seq, window=1024)) == (
+        (HOST, 80),
+        PortStatus.OPEN,
+        REPLY_RST,
+    )
+
+
+def test_unreachable_matches_the_quoted_probe():
+    classifier = ReplyClassifier(SYN, frozenset({SRC_PORT}), KEY)
+    key = (HOST, 80)
+
+    assert classifier.classify(make_unreachable(classifier, 13)) == (
+        key,
+        PortStatus.FILTERED,
+        REPLY_ICMP,
+    )
+    assert classifier.classify(make_unreachable(classifier, 0)) == (
+        key,
+        PortStatus.CLOSED,
+        REPLY_ICMP,
+    )
+    assert classifier.classify(make_unreachable(classifier, 13, seq=1)) is None
+
+
+def test_cookies_cannot_be_forged():
+    # with a crc the xor of three cookies is the cookie of the xor of their inputs
+    classifier = ReplyClassifier(SYN, frozenset({SRC_PORT}), KEY)
+    forged = (
+        classifier.cookie(HOST, 80)
+        ^ classifier.cookie(HOST, 81)
+        ^ classifier.cookie(HOST, 82)
+    )
+    assert forged != classifier.cookie(HOST, 80 ^ 81 ^ 82)
@@ -0,0 +1,195 @@
+from dataclasses import dataclass
+from ipaddress import IPv4Address, IPv6Address
+from struct import pack
+from typing import Callable, Iterable, Iterator
+import asyncio
+import re
+
+from core.results import PortFinding, Service, ServiceFinding
+from core.streaming import stream
+
+Connection = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+def _client_hello() -> bytes:
+    # a TLS 1.2 hello, any server answers it with a ServerHello or an alert
+    suites = bytes.fromhex("c02bc02fc02cc030cca9cca8009c009d002f0035")
+    body = b"\x03\x03" + bytes(32) + b"\x00"
+    body += pack("!H", len(suites)) + suites + b"\x01\x00"
+    handshake = b"\x01" + pack("!I", len(body))[1:] + body
+    return b"\x16\x03\x01" + pack("!H", len(handshake)) + handshake
+
+
+@dataclass(frozen=True)
+class ServiceProbe:
+    name: str
+    # sent once connected, empty to wait for the server to speak first
+    payload: bytes
+    # ports it is tried on first
+    ports: frozenset[int]
+    # seconds to wait for an answer
+    timeout: float
+    # tried on the other ports too, once the ones for the port had no luck
+    fallback: bool = True
+
+
+PROBES = (
+    ServiceProbe(
+        "ssh", b"SSH-2.0-PortScanner\r\n", frozenset({22, 2222}), 3.0, fallback=False
+    ),
+    ServiceProbe("banner", b"", frozenset({21, 25, 110, 143, 587, 3306}), 2.0),
+    ServiceProbe(
+        "http", b"HEAD / HTTP/1.0\r\n\r\n", frozenset({80, 8000, 8008, 8080}), 3.0
+    ),
+    ServiceProbe(
+        "tls", _client_hello(), frozenset({443, 465, 636, 993, 995, 8443}), 3.0
+    ),
+)
+
+# checked in order, the version group is what is reported next to the name
+SIGNATURES = tuple(
+    (name, re.compile(pattern, re.DOTALL | re.IGNORECASE))
+    for name, pattern in (
+        ("ssh", rb"^SSH-[\d.]+-(?P<version>[^\r\n]+)\r?\n"),
+        # up to the Server header, or to the end of the headers without one
+        ("http", rb"^HTTP/1\.[01] \d{3}.*?\r\n(?:server: (?P<version>[^\r\n]*)|\r\n)"),
+        ("ftp", rb"^220[ -](?P<version>[^\r\n]*ftp[^\r\n]*)\r?\n"),
+        ("smtp", rb"^220[ -](?P<version>[^\r\n]*smtp[^\r\n]*)\r?\n"),
+        ("pop3", rb"^\+OK(?P<version>[^\r\n]*)\r?\n"),
+        ("imap", rb"^\* OK(?P<version>[^\r\n]*)\r?\n"),
+        ("mysql", rb"^...\x00\x0a(?P<version>[\w.-]+)\x00"),
+        # a ServerHello or an alert record
+        ("tls", rb"^[\x15\x16]\x03[\x00-\x04]"),
+    )
+)
+
+
+def _text(data: bytes) -> str:
+    return data.decode("ascii", "replace").strip()
+
+
+def match_banner(banner: bytes) -> Service | None:
+    for name, pattern in SIGNATURES:
+        found = pattern.search(banner)
+        if found is not None:
+            version = found.groupdict().get("version")
+            return Service(name, _text(version) if version else "")
+    return None
+
+
+class ServiceDetector:
+    """Finds out what runs on open ports, from what they say when probed.
+
+    One connection per port is kept for as long as the server does not
+    close it, the probes for the port are tried over it in turn. At most
+    `concurrency` ports are probed at once, and findings are reported as
+    they complete.
+    """
+
+    # more than any signature needs
+    MAX_BANNER = 4096
+
+    def __init__(
+        self,
+        concurrency: int = 100,
+        connect_timeout: float = 3.0,
+        probes: tuple[ServiceProbe, ...] = PROBES,
+    ):
+        self.concurrency = concurrency
+        self.connect_timeout = connect_timeout
+        self.probes = probes
+
+    def probes_for(self, port: int) -> list[ServiceProbe]:
+        first = [probe for probe in self.probes if port in probe.ports]
+        return first + [
+            probe for probe in self.probes if probe.fallback and probe not in first
+        ]
+
+    async def _connect(
+        self, host: IPv4Address | IPv6Address, port: int
+    ) -> Connection | None:
+        try:
+            return await asyncio.wait_for(
+                asyncio.open_connection(str(host), port), self.connect_timeout
+            )
+        except (asyncio.TimeoutError, OSError):
+            return None
+
+    async def _read(self, reader: asyncio.StreamReader, timeout: float) -> bytes:
+        # until a signature matches, the server closes or the time is up
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        data = b""
+        while len(data) < self.MAX_BANNER and match_banner(data) is None:
+            try:
+                chunk = await asyncio.wait_for(
+                    reader.read(self.MAX_BANNER), deadline - loop.time()
+                )
+            except (asyncio.TimeoutError, OSError):
+                break
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    async def _exchange(self, connection: Connection, probe: ServiceProbe) -> bytes:
+        reader, writer = connection
+        try:
+            if probe.payload:
+                writer.write(probe.payload)
+                await writer.drain()
+        except OSError:
+            return b""
+        return await self._read(reader, probe.timeout)
+
+    async def detect(
+        self, host: IPv4Address | IPv6Address, port: int
+    ) -> Service | None:
+        banner = b""
+        connection: Connection | None = None
+        try:
+            for probe in self.probes_for(port):
+                if connection is None:
+                    connection = await self._connect(host, port)
+                    if connection is None:
+                        break
+                data = await self._exchange(connection, probe)
+                service = match_banner(data)
+                if service is not None:
+                    return service
+                banner = banner or data
+                # the server gave up on us, the next probe needs a new connection
+                if connection[0].at_eof():
+                    connection[1].close()
+                    connection = None
+        finally:
+            if connection is not None:
+                connection[1].close()
+
+        if not banner:
+            return None
+        return Service("unknown", banner=_text(banner.split(b"\n", 1)[0])[:80])
+
+    async def _detect_finding(
+        self, finding: PortFinding, limit: asyncio.Semaphore
+    ) -> ServiceFinding | None:
+        async with limit:
+            service = await self.detect(finding.host, finding.port)
+        if service is None:
+            return None
+        return ServiceFinding(finding.host, finding.port, service)
+
+    async def detect_async(
+        self, targets: list[PortFinding], emit: Callable[[ServiceFinding], None]
+    ):
+        limit = asyncio.Semaphore(self.concurrency)
+        probes = [self._detect_finding(finding, limit) for finding in targets]
+        for done in asyncio.as_completed(probes):
+            found = await done
+            if found is not None:
+                emit(found)
+
+    def run(self, targets: Iterable[PortFinding]) -> Iterator[ServiceFinding]:
+        # the event loop runs in a thread, findings are yielded as they come
+        ports = list(targets)
+        return stream(lambda emit: asyncio.run(self.detect_async(ports, emit)))
@@ -0,0 +1,94 @@
+from functools import cache
+from ipaddress import ip_address
+from socket import socket, AF_INET, AF_INET6, SOCK_DGRAM, SOCK_STREAM
+
+# (family, somewhere to route to, fallback) per ip version
+_DEFAULT_ROUTES = {
+    4: (AF_INET, "10.254.254.254", "127.0.0.1"),
+    6: (AF_INET6, "2001:db8::1", "::1"),
+}
+
+
+@cache
+def local_ip(version: int = 4) -> str:
+    # the address of the default route, looked up once per process
+    family, remote, fallback = _DEFAULT_ROUTES[version]
+    try:
+        s = socket(family, SOCK_DGRAM)
+    except OSError:
+        return fallback
+    s.settimeout(0)
+    try:
+        # does not have be reachable
+        s.connect((remote, 1))
+        ip = s.getsockname()[0]
+    except OSError:
+        ip = fallback
+    finally:
+        s.close()
+
+    return ip
+
+
+class SourcePool:
+    """Source addresses and ports reserved for raw probes.
+
+    Every port is held by a bound TCP socket while the pool is reserved, so
+    the kernel does not give it to another connection. Probes take the
+    (address, port) pairs round robin and replies are told apart by the
+    port they come back to, so many probes to one host can be in flight.
+    Ports are unique across addresses as well, ipv6 replies do not say
+    which local address they went to.
+    """
+
+    PORTS_PER_ADDRESS = 16
+
+    def __init__(
+        self,
+        addresses: list[str] | None = None,
+        ports_per_address: int = PORTS_PER_ADDRESS,
+    ):
+        self.addresses = addresses or [local_ip()]
+        self.ports_per_address = ports_per_address
+        self.sources: list[tuple[str, int]] = []
+        self._sockets: list[socket] = []
+
+    @property
+    def ports(self) -> frozenset[int]:
+        return frozenset(port for _, port in self.sources)
+
+    def reserve(self) -> list[tuple[str, int]]:
+        taken: set[int] = set()
+        try:
+            for address in self.addresses:
+                family = AF_INET6 if ip_address(address).version == 6 else AF_INET
+                reserved = 0
+                while reserved < self.ports_per_address:
+                    s = socket(family, SOCK_STREAM)
+                    self._sockets.append(s)
+                    # the kernel picks a free ephemeral port
+                    s.bind((address, 0))
+                    port = s.getsockname()[1]
+                    # held all the same, so the kernel picks another one next
+                    if port in taken:
+                        continue
+                    taken.add(port)
+                    self.sources.append((address, port))
+                    reserved += 1
+        except OSError as e:
+            self.release()
+            raise ValueError(f"Cannot send from {address}: {e.strerror}") from e
+        return self.sources
+
+    def release(self):
+        for s in self._sockets:
+            s.close()
+        self._sockets = []
+        self.sources = []
+
+    def __enter__(self) -> "SourcePool":
+        self.reserve()
+        return self
+
+    def __exit__(self, *_):
+        self.release()
@@ -0,0 +1,24 @@
+from queue import Queue
+from threading import Thread
+from typing import Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+def stream(run: Callable[[Callable[[T], None]], None]) -> Iterator[T]:
+    # runs a job that reports through a callback in a thread of its own
+    queue: Queue[T | BaseException | None] = Queue()
+
+    def target():
+        try:
+            run(queue.put)
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            queue.put(e)
+        queue.put(None)
+
+    Thread(target=target, daemon=True).start()
+
+    while (item := queue.get()) is not None:
+        if isinstance(item, BaseException):
+            raise item
+        yield item
@@ -0,0 +1,256 @@
+from bisect import bisect_right
+from collections.abc import Iterator, Sequence
+from ipaddress import (
+    IPv4Address,
+    IPv6Address,
+    IPv4Network,
+    IPv6Network,
+)
+from typing import overload
+
+Address = IPv4Address | IPv6Address
+Network = IPv4Network | IPv6Network
+
+# (ip version, first address, last address), both ends inclusive
+Block = tuple[int, int, int]
+
+_ADDRESS_TYPES: dict[int, type[IPv4Address] | type[IPv6Address]] = {
+    4: IPv4Address,
+    6: IPv6Address,
+}
+
+
+def _network_hosts(network: Network) -> Block:
+    # same addresses as network.hosts(), without building them
+    first = int(network.network_address)
+    last = int(network.broadcast_address)
+    if isinstance(network, IPv4Network):
+        if network.prefixlen < 31:
+            first, last = first + 1, last - 1
+    elif network.prefixlen < 127:
+        # the subnet router anycast address
+        first += 1
+    return network.version, first, last
+
+
+def host_count(hosts: Sequence[Address]) -> int:
+    # len() raises OverflowError past sys.maxsize, a /64 is well past it
+    if isinstance(hosts, (TargetSet, TargetView)):
+        return hosts.size
+    return len(hosts)
+
+
+def _merge(blocks: list[Block]) -> list[Block]:
+    merged: list[Block] = []
+    for version, first, last in sorted(blocks):
+        if merged and merged[-1][0] == version and first <= merged[-1][2] + 1:
+            prev = merged[-1]
+            merged[-1] = (version, prev[1], max(prev[2], last))
+        else:
+            merged.append((version, first, last))
+    return merged
+
+
+def _subtract(blocks: list[Block], excluded: list[Block]) -> list[Block]:
+    result: list[Block] = []
+    for version, first, last in blocks:
+        for ex_version, ex_first, ex_last in excluded:
+            if ex_version != version or ex_last < first or ex_first > last:
+                continue
+            if ex_first > first:
+                result.append((version, first, ex_first - 1))
+            first = ex_last + 1
+            if first > last:
+                break
+        else:
+            result.append((version, first, last))
+    return result
+
+
+class TargetSet(Sequence[Address]):
+    """Hosts to scan, kept as ranges of integers.
+
+    Networks, ranges and exclusions are stored as a few integer blocks and
+    address objects are only built when a host is read, so a /8 costs the
+    same memory as a single host. Hosts are sorted and deduplicated, and
+    can be read by index, which lets shards be lazy views of the set.
+    """
+
+    def __init__(self):
+        self._included: list[Block] = []
+        self._excluded: list[Block] = []
+        self._blocks: list[Block] | None = None
+        self._offsets: list[int] = []
+        self._size = 0
+
+    def add_host(self, address: Address):
+        self.add_range(address, address)
+
+    def add_network(self, network: Network):
+        version, first, last = _network_hosts(network)
+        if first <= last:
+            self._add(self._included, (version, first, last))
+
+    def add_range(self, first: Address, last: Address):
+        if first.version != last.version:
+            raise ValueError(f"Mixed address versions: {first} - {last}")
+        self._add(self._included, (first.version, int(first), int(last)))
+
+    def exclude(self, target: Address | Network):
+        if isinstance(target, (IPv4Network, IPv6Network)):
+            block = (
+                target.version,
+                int(target.network_address),
+                int(target.broadcast_address),
+            )
+        else:
+            block = (target.version, int(target), int(target))
+        self._add(self._excluded, block)
+
+    def _add(self, blocks: list[Block], block: Block):
+        version, first, last = block
+        if first > last:
+            first, last = last, first
+        blocks.append((version, first, last))
+        self._blocks = None
+
+    @property
+    def blocks(self) -> list[Block]:
+        if self._blocks is None:
+            self._blocks = _subtract(_merge(self._included), _merge(self._excluded))
+            self._offsets = []
+            total = 0
+            for _, first, last in self._blocks:
+                self._offsets.append(total)
+                total += last - first + 1
+            self._size = total
+        return self._blocks
+
+    @property
+    def size(self) -> int:
+        # len() does not fit ipv6 networks, this does
+        _ = self.blocks
+        return self._size
+
+    @property
+    def versions(self) -> set[int]:
+        return self.versions_in(range(self.size))
+
+    def versions_in(self, indexes: range) -> set[int]:
+        # ip versions of the hosts at these indexes, without reading them
+        if indexes.step < 0:
+            indexes = indexes[::-1]
+        found = set()
+        for (version, first, last), offset in zip(self.blocks, self._offsets):
+            end = offset + last - first + 1
+            # the first index at or past the start of the block
+            start = max(offset, indexes.start)
+            start += -(start - indexes.start) % indexes.step
+            if start < min(end, indexes.stop):
+                found.add(version)
+        return found
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return bool(self.blocks)
+
+    @overload
+    def __getitem__(self, index: int) -> Address: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "TargetView": ...
+
+    def __getitem__(self, index: int | slice) -> "Address | TargetView":
+        if isinstance(index, slice):
+            return TargetView(self, range(self.size)[index])
+
+        blocks = self.blocks
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("target index out of range")
+
+        i = bisect_right(self._offsets, index) - 1
+        version, first, _ = blocks[i]
+        return _ADDRESS_TYPES[version](first + index - self._offsets[i])
+
+    def __iter__(self) -> Iterator[Address]:
+        for version, first, last in self.blocks:
+            address_type = _ADDRESS_TYPES[version]
+            for value in range(first, last + 1):
+                yield address_type(value)
+
+    def __contains__(self, value: object) -> bool:
+        if not isinstance(value, (IPv4Address, IPv6Address)):
+            return False
+        number = int(value)
+        return any(
+            version == value.version and first <= number <= last
+            for version, first, last in self.blocks
+        )
+
+    def index(self, value: object, start: int = 0, stop: int | None = None) -> int:
+        # found from the blocks, Sequence.index would read every host before it
+        if isinstance(value, (IPv4Address, IPv6Address)):
+            number = int(value)
+            for i, (version, first, last) in enumerate(self.blocks):
+                if version == value.version and first <= number <= last:
+                    index = self._offsets[i] + number - first
+                    if start <= index and (stop is None or index < stop):
+                        return index
+        raise ValueError(f"{value} is not in the targets")
+
+    def __getstate__(self):
+        # the cache is rebuilt on demand, only the ranges are pickled
+        return self._included, self._excluded
+
+    def __setstate__(self, state):
+        self._included, self._excluded = state
+        self._blocks = None
+        self._offsets = []
+        self._size = 0
+
+
+class TargetView(Sequence[Address]):
+    """Lazy slice of a TargetSet, used to hand out shards."""
+
+    def __init__(self, targets: TargetSet, indexes: range):
+        self.targets = targets
+        self.indexes = indexes
+
+    @property
+    def versions(self) -> set[int]:
+        return self.targets.versions_in(self.indexes)
+
+    @property
+    def size(self) -> int:
+        indexes = self.indexes
+        return max(0, -((indexes.start - indexes.stop) // indexes.step))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    @overload
+    def __getitem__(self, index: int) -> Address: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "TargetView": ...
+
+    def __getitem__(self, index: int | slice) -> "Address | TargetView":
+        if isinstance(index, slice):
+            return TargetView(self.targets, self.indexes[index])
+        return self.targets[self.indexes[index]]
+
+    def index(self, value: object, start: int = 0, stop: int | None = None) -> int:
+        found = self.targets.index(value)
+        if found not in self.indexes:
+            raise ValueError(f"{value} is not in the view")
+        index = self.indexes.index(found)
+        if index < start or (stop is not None and index >= stop):
+            raise ValueError(f"{value} is not in the view")
+        return index
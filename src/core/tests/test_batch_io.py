@@ -0,0 +1,105 @@
+import socket
+
+import pytest
+
+from core.batch_io import BatchReceiver, BatchSender
+
+FAMILIES = [(socket.AF_INET, "127.0.0.1"), (socket.AF_INET6, "::1")]
+
+
+def udp_socket(family: int, host: str, timeout: float | None = 1) -> socket.socket:
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    sock.bind((host, 0))
+    sock.settimeout(timeout)
+    return sock
+
+
+def blocking_socket(family: int, host: str) -> socket.socket:
+    # recv_into waits out a socket timeout even with MSG_DONTWAIT
+    return udp_socket(family, host, None)
+
+
+def received(sock: socket.socket, count: int) -> list[bytes]:
+    return [sock.recv(2048) for _ in range(count)]
+
+
+@pytest.mark.parametrize("use_sendmmsg", [True, False])
+@pytest.mark.parametrize("family, host", FAMILIES)
+def test_batch_round_trip(family, host, use_sendmmsg):
+    with udp_socket(family, host) as out, udp_socket(family, host) as into:
+        sender = BatchSender(out, batch_size=8, use_sendmmsg=use_sendmmsg)
+        packets = [bytes([i]) * (i + 1) for i in range(5)]
+        for packet in packets:
+            sender.send(packet, into.getsockname()[:2])
+        sender.flush()
+
+        assert received(into, 5) == packets
+        assert sender.packets == 5
+        # one call for the batch, or one per packet without sendmmsg
+        assert sender.syscalls == (1 if sender.batched else 5)
+
+
+@pytest.mark.parametrize("family, host", FAMILIES)
+def test_batch_to_mixed_destinations(family, host):
+    with (
+        udp_socket(family, host) as out,
+        udp_socket(family, host) as first,
+        udp_socket(family, host) as second,
+    ):
+        sender = BatchSender(out, batch_size=8)
+        for i in range(6):
+            target = first if i % 2 == 0 else second
+            sender.send(bytes([i]), target.getsockname()[:2])
+        sender.flush()
+
+        assert received(first, 3) == [b"\x00", b"\x02", b"\x04"]
+        assert received(second, 3) == [b"\x01", b"\x03", b"\x05"]
+
+
+def test_full_batch_is_flushed():
+    with udp_socket(*FAMILIES[0]) as out, udp_socket(*FAMILIES[0]) as into:
+        sender = BatchSender(out, batch_size=4, flush_interval=60)
+        for i in range(4):
+            sender.send(bytes([i]), into.getsockname())
+
+        # nothing left queued, the fourth packet filled the batch
+        assert received(into, 4) == [bytes([i]) for i in range(4)]
+        assert sender.packets == 4
+
+
+@pytest.mark.parametrize("use_recvmmsg", [True, False])
+@pytest.mark.parametrize("family, host", FAMILIES)
+def test_receive_into_the_pool(family, host, use_recvmmsg):
+    with udp_socket(family, host) as out, blocking_socket(family, host) as into:
+        receiver = BatchReceiver(into, batch_size=4, use_recvmmsg=use_recvmmsg)
+        for i in range(6):
+            out.sendto(bytes([i]) * (i + 1), into.getsockname())
+
+        # a batch at most per call, the rest waits for the next one
+        first = [bytes(packet) for packet in receiver.receive()]
+        second = [bytes(packet) for packet in receiver.receive()]
+
+        assert first + second == [bytes([i]) * (i + 1) for i in range(6)]
+        assert len(first) == 4
+        assert receiver.packets == 6
+        assert not receiver.receive()
+
+
+@pytest.mark.parametrize("use_recvmmsg", [True, False])
+@pytest.mark.parametrize("family, host", FAMILIES)
+def test_receive_from_gives_the_sender(family, host, use_recvmmsg):
+    with udp_socket(family, host) as out, blocking_socket(family, host) as into:
+        receiver = BatchReceiver(into, batch_size=4, use_recvmmsg=use_recvmmsg)
+        out.sendto(b"probe", into.getsockname())
+
+        assert [(bytes(packet), addr) for packet, addr in receiver.receive_from()] == [
+            (b"probe", socket.inet_pton(family, host))
+        ]
+
+
+def test_long_packets_are_truncated():
+    with udp_socket(*FAMILIES[0]) as out, blocking_socket(*FAMILIES[0]) as into:
+        receiver = BatchReceiver(into, batch_size=2, buffer_size=16)
+        out.sendto(bytes(100), into.getsockname())
+
+        assert [len(packet) for packet in receiver.receive()] == [16]
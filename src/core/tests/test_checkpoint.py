@@ -0,0 +1,96 @@
+from ipaddress import IPv4Address
+
+import pytest
+
+from core.checkpoint import Checkpoint
+from core.results import HostFinding, PingStatus, PortFinding, PortStatus
+
+HOST = IPv4Address("192.0.2.1")
+
+
+def test_resume_replays_finished_chunks(tmp_path):
+    path = str(tmp_path / "scan.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.open("scan")
+    checkpoint.record_ping([HostFinding(HOST, PingStatus(3, True))])
+    checkpoint.record_chunk(0, [PortFinding(HOST, 22, PortStatus.OPEN)])
+    checkpoint.record_chunk(2, [PortFinding(HOST, 80, PortStatus.CLOSED)])
+    checkpoint.close()
+
+    resumed = Checkpoint(path, resume=True)
+    resumed.open("scan")
+    resumed.close()
+
+    assert resumed.done == {0, 2}
+    assert resumed.pinged == [HostFinding(HOST, PingStatus(3, True))]
+    assert list(resumed.saved_findings()) == [
+        PortFinding(HOST, 22, PortStatus.OPEN),
+        PortFinding(HOST, 80, PortStatus.CLOSED),
+    ]
+
+
+def test_torn_record_is_dropped(tmp_path):
+    path = str(tmp_path / "scan.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.open("scan")
+    checkpoint.record_chunk(0, [PortFinding(HOST, 22, PortStatus.OPEN)])
+    checkpoint.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"chunk":1,"po')
+
+    resumed = Checkpoint(path, resume=True)
+    resumed.open("scan")
+    resumed.record_chunk(1, [PortFinding(HOST, 23, PortStatus.CLOSED)])
+    resumed.close()
+
+    again = Checkpoint(path, resume=True)
+    again.open("scan")
+    again.close()
+    assert again.done == {0, 1}
+
+
+def test_other_scan_is_refused(tmp_path):
+    path = str(tmp_path / "scan.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.open("scan")
+    checkpoint.close()
+
+    with pytest.raises(ValueError):
+        Checkpoint(path, resume=True).open("another scan")
+
+
+def test_resume_keeps_the_shard_layout(tmp_path):
+    path = str(tmp_path / "scan.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.open("scan", shards=8)
+    checkpoint.close()
+
+    resumed = Checkpoint(path, resume=True)
+    resumed.open("scan", shards=1)
+    resumed.close()
+
+    assert resumed.shards == 8
+
+
+def test_empty_file_starts_a_new_scan(tmp_path):
+    path = tmp_path / "scan.ckpt"
+    path.write_text("")
+
+    checkpoint = Checkpoint(str(path), resume=True)
+    checkpoint.open("scan", shards=4)
+    checkpoint.record_chunk(0, [PortFinding(HOST, 22, PortStatus.OPEN)])
+    checkpoint.close()
+
+    resumed = Checkpoint(str(path), resume=True)
+    resumed.open("scan")
+    resumed.close()
+    assert resumed.done == {0}
+    assert resumed.shards == 4
+
+
+def test_file_without_header_is_refused(tmp_path):
+    path = tmp_path / "scan.ckpt"
+    path.write_text('{"chunk":0,"ports":{}}\n')
+
+    with pytest.raises(ValueError):
+        Checkpoint(str(path), resume=True).open("scan")
@@ -0,0 +1,39 @@
+from ipaddress import IPv4Address, IPv6Address
+
+from core.discovery import ICMP_ECHO_REPLY, ICMPV6_ECHO_REPLY, ICMPDiscovery, checksum
+from core.pacer import Pacer
+
+
+def make_reply(discovery: ICMPDiscovery, host, reply_type: int) -> memoryview:
+    # hosts echo the request back with only the type changed
+    request = bytearray(discovery.echo_request(host))
+    request[0] = reply_type
+    return memoryview(bytes(request))
+
+
+def test_echo_request_checksum():
+    discovery = ICMPDiscovery(Pacer(1000))
+    request = discovery.echo_request(IPv4Address("192.0.2.1"))
+    assert checksum(request) == 0
+
+
+def test_reply_marks_host_alive():
+    discovery = ICMPDiscovery(Pacer(1000))
+    v4, v6 = IPv4Address("192.0.2.1"), IPv6Address("2001:db8::1")
+
+    discovery.handle_reply(make_reply(discovery, v4, ICMP_ECHO_REPLY), 0, 4)
+    discovery.handle_reply(make_reply(discovery, v6, ICMPV6_ECHO_REPLY), 0, 6)
+
+    assert set(discovery.alive) == {v4, v6}
+
+
+def test_foreign_replies_are_ignored():
+    discovery = ICMPDiscovery(Pacer(1000))
+    other = ICMPDiscovery(Pacer(1000))
+    host = IPv4Address("192.0.2.1")
+
+    # a reply to another scan, and our own request looped back
+    discovery.handle_reply(make_reply(other, host, ICMP_ECHO_REPLY), 0, 4)
+    discovery.handle_reply(memoryview(discovery.echo_request(host)), 0, 4)
+
+    assert not discovery.alive
@@ -0,0 +1,84 @@
+from struct import pack
+import socket
+
+from core.headers import IPv6Header, unpack_headers
+from core.packet_factory import PacketFactory
+
+
+def make_reply(ip_options: bytes, tcp_options: bytes) -> bytes:
+    src = socket.inet_aton("198.51.100.7")
+    dst = socket.inet_aton("192.0.2.1")
+
+    pf = PacketFactory(src, 443, dst, 40000)
+    pf.tcp_header.tcp_syn = 1
+    pf.tcp_header.tcp_ack = 1
+    pf.tcp_header.ack_num = 1234
+    pf.tcp_header.data_off = 5 + len(tcp_options) // 4
+    pf.ip_header.ihl = 5 + len(ip_options) // 4
+
+    packet = pf.generate_packet()
+    return packet[:20] + ip_options + packet[20:40] + tcp_options
+
+
+def test_plain_headers():
+    ip_hdr, tcp_hdr = unpack_headers(make_reply(b"", b""))
+
+    assert ip_hdr.ihl == 5
+    assert ip_hdr.options == b""
+    assert tcp_hdr.src_port == 443
+    assert tcp_hdr.dst_port == 40000
+    assert tcp_hdr.mss is None
+
+
+def test_ip_options_shift_tcp_header():
+    # record route with room for one address
+    ip_options = bytes([7, 7, 4]) + bytes(4) + b"\x00"
+
+    ip_hdr, tcp_hdr = unpack_headers(make_reply(ip_options, b""))
+
+    assert ip_hdr.ihl == 7
+    assert ip_hdr.options == ip_options
+    assert tcp_hdr.src_port == 443
+    assert tcp_hdr.ack_num == 1234
+    assert tcp_hdr.tcp_syn == 1 and tcp_hdr.tcp_ack == 1
+
+
+def test_tcp_options():
+    tcp_options = (
+        pack("!BBH", 2, 4, 1460)  # mss
+        + bytes([4, 2])  # sack permitted
+        + pack("!BBLL", 8, 10, 111, 222)  # timestamps
+        + bytes([1])  # nop
+        + bytes([3, 3, 7])  # window scale
+    )
+
+    _, tcp_hdr = unpack_headers(make_reply(b"", tcp_options))
+
+    assert tcp_hdr.data_off == 10
+    assert tcp_hdr.mss == 1460
+    assert tcp_hdr.sack_permitted
+    assert (tcp_hdr.ts_val, tcp_hdr.ts_ecr) == (111, 222)
+    assert tcp_hdr.window_scale == 7
+
+
+def test_truncated_tcp_options():
+    tcp_options = pack("!BBH", 2, 4, 1460) + bytes([8, 10, 0, 0])
+
+    _, tcp_hdr = unpack_headers(make_reply(b"", tcp_options))
+
+    assert tcp_hdr.mss == 1460
+    assert tcp_hdr.ts_val is None
+
+
+def test_ipv6_header_round_trip():
+    src = socket.inet_pton(socket.AF_INET6, "2001:db8::1")
+    dst = socket.inet_pton(socket.AF_INET6, "2001:db8::2")
+    header = IPv6Header(
+        src, dst, traffic_class=0x2E, flow_label=0xABCDE, payload_len=20
+    )
+
+    data = header.get_header()
+
+    assert len(data) == 40
+    assert data[0] >> 4 == 6
+    assert IPv6Header.from_bytes(data) == header
@@ -0,0 +1,91 @@
+from urllib.request import urlopen
+import json
+
+import pytest
+
+from core.metrics import (
+    REPLY_RST,
+    REPLY_SYN_ACK,
+    Histogram,
+    ScanMetrics,
+    serve_prometheus,
+)
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(bounds=(0.001, 0.01, 0.1))
+    for value in [0.0005] * 50 + [0.005] * 49 + [0.05]:
+        histogram.observe(value)
+
+    assert histogram.count == 100
+    assert histogram.quantile(0.5) == 0.001
+    assert histogram.quantile(0.99) == 0.01
+    assert histogram.quantile(1.0) == 0.1
+
+    histogram.observe(1.0)
+    assert histogram.quantile(1.0) == float("inf")
+    assert Histogram().quantile(0.5) is None
+
+
+def test_metrics_merge():
+    first, second = ScanMetrics(), ScanMetrics()
+    first.on_probe(0.5, 1.0, retransmit=False)
+    second.on_probe(0.25, 0.5, retransmit=True)
+    first.replies[REPLY_SYN_ACK] += 1
+    second.replies[REPLY_RST] += 2
+    first.rtt.observe(0.002)
+    second.rtt.observe(0.003)
+
+    merged = first.merge(second)
+
+    assert merged.probes == 2
+    assert merged.retransmits == 1
+    assert merged.build_time == 0.75
+    assert merged.send_time == 1.5
+    assert merged.replies[REPLY_SYN_ACK] == 1
+    assert merged.replies[REPLY_RST] == 2
+    assert merged.rtt.count == 2
+
+
+def test_prometheus_histogram_is_cumulative():
+    metrics = ScanMetrics()
+    metrics.rtt.observe(0.00005)
+    metrics.rtt.observe(0.0003)
+    metrics.rtt.observe(100.0)
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'portscanner_rtt_seconds_bucket{le="0.0001"} 1' in lines
+    assert 'portscanner_rtt_seconds_bucket{le="0.0004"} 2' in lines
+    assert 'portscanner_rtt_seconds_bucket{le="+Inf"} 3' in lines
+    assert "portscanner_rtt_seconds_count 3" in lines
+    assert 'portscanner_replies_total{class="rst"} 0' in lines
+
+
+def test_json_dump():
+    metrics = ScanMetrics()
+    metrics.on_probe(0.1, 0.2, retransmit=False)
+    metrics.rtt.observe(0.003)
+
+    data = json.loads(metrics.to_json())
+
+    assert data["probes"] == 1
+    assert data["rtt"]["count"] == 1
+    assert data["rtt"]["p50"] == pytest.approx(0.0032)
+
+
+@pytest.mark.parametrize("host, url_host", [(None, "127.0.0.1"), ("::1", "[::1]")])
+def test_metrics_are_served_locally(host, url_host):
+    metrics = ScanMetrics()
+    metrics.on_probe(0.1, 0.2, retransmit=False)
+    args = () if host is None else (host,)
+    server = serve_prometheus(lambda: metrics, 0, *args)
+    try:
+        # nobody but this machine can scrape them unless asked for
+        assert server.server_address[0] == (host or "127.0.0.1")
+        port = server.server_address[1]
+        with urlopen(f"http://{url_host}:{port}/metrics", timeout=5) as response:
+            assert "portscanner_probes_total 1" in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
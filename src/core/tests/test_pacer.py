@@ -0,0 +1,92 @@
+# pylint: disable=protected-access
+from time import monotonic, sleep
+import pickle
+
+from core.pacer import Pacer
+
+
+def send_window(pacer: Pacer, probes: int, replies: int):
+    for _ in range(probes):
+        pacer.acquire()
+    for _ in range(replies):
+        pacer.on_reply()
+    pacer._adjust(monotonic())
+
+
+def test_rate_is_limited():
+    pacer = Pacer(2000)
+
+    start = monotonic()
+    for _ in range(500):
+        pacer.acquire()
+    elapsed = monotonic() - start
+
+    # the first burst and the last bit of debt are not slept off
+    assert elapsed >= 450 / 2000
+    assert pacer.stats().sent == 500
+
+
+def test_backs_off_when_replies_collapse():
+    pacer = Pacer(1_000_000)
+
+    send_window(pacer, 200, 200)
+    send_window(pacer, 200, 10)
+
+    assert pacer.stats().backoffs == 1
+    assert pacer.rate == 500_000
+
+    send_window(pacer, 200, 0)
+
+    assert pacer.stats().backoffs == 2
+    assert pacer.rate == 250_000
+
+
+def test_recovers_towards_ceiling():
+    pacer = Pacer(1_000_000)
+    send_window(pacer, 200, 200)
+    send_window(pacer, 200, 10)
+    send_window(pacer, 200, 200)
+
+    assert pacer.rate == 550_000
+
+
+def test_late_replies_do_not_raise_the_baseline():
+    pacer = Pacer(1_000_000)
+    # replies to an earlier window arriving late
+    send_window(pacer, 100, 1000)
+    send_window(pacer, 200, 200)
+
+    assert pacer.stats().backoffs == 0
+
+
+def test_split_and_pickle():
+    pacer = pickle.loads(pickle.dumps(Pacer(1000).split(4)))
+
+    assert pacer.ceiling == 250
+    pacer.acquire()
+    assert pacer.stats().sent == 1
+
+
+def test_rate_is_measured_up_to_the_flush():
+    pacer = Pacer(1000)
+    pacer.start()
+    # a burst goes out at once, it is no faster than the ceiling
+    for _ in range(4):
+        pacer.acquire()
+    pacer.on_flush()
+    assert pacer.stats().achieved_rate <= 1000
+
+    # then the sender waits to flush the last ones
+    sleep(0.1)
+    pacer.on_flush()
+    assert pacer.stats().achieved_rate <= 4 / 0.1
+
+
+def test_queued_probes_go_out_before_the_sleep():
+    pacer = Pacer(100)
+    flushes = []
+    # the burst is a single probe at this rate, the second one waits for it
+    pacer.acquire(before_sleep=lambda: flushes.append(1))
+    pacer.acquire(before_sleep=lambda: flushes.append(2))
+
+    assert flushes == [2]
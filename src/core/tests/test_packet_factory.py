@@ -0,0 +1,107 @@
+from random import randint
+from struct import pack, unpack
+import socket
+
+from core.headers import TCP_ACK
+from core.packet_factory import IPv6PacketFactory, PacketFactory
+
+
+def make_factory(dst_port: int) -> PacketFactory:
+    src_addr = socket.inet_aton("192.0.2.1")
+    dst_addr = socket.inet_aton("198.51.100.7")
+    pf = PacketFactory(src_addr, 40000, dst_addr, dst_port)
+    pf.tcp_header.tcp_syn = 1
+    return pf
+
+
+def test_template_matches_generate_packet():
+    template = make_factory(0).generate_template()
+
+    for _ in range(10_000):
+        port = randint(1, 65535)
+        seq = randint(0, 0xFFFFFFFF)
+
+        pf = make_factory(port)
+        pf.tcp_header.seq_num = seq
+
+        assert template.build(port, seq) == pf.generate_packet()
+
+
+def test_template_patches_ip_id():
+    template = make_factory(0).generate_template()
+
+    packet = template.build(80, 1, ip_id=0xBEEF)
+
+    assert packet[4:6] == b"\xbe\xef"
+
+
+def test_shared_template_patches_dst_addr():
+    src_addr = socket.inet_aton("192.0.2.1")
+    shared = PacketFactory(src_addr, 40000, bytes(4), 0)
+    shared.tcp_header.tcp_syn = 1
+    template = shared.generate_template()
+
+    for _ in range(1_000):
+        port = randint(1, 65535)
+        seq = randint(0, 0xFFFFFFFF)
+        dst_addr = randint(0, 0xFFFFFFFF).to_bytes(4, "big")
+
+        pf = PacketFactory(src_addr, 40000, dst_addr, port)
+        pf.tcp_header.tcp_syn = 1
+        pf.tcp_header.seq_num = seq
+
+        assert template.build(port, seq, dst_addr=dst_addr) == pf.generate_packet()
+
+
+def test_ipv6_shared_template_patches_dst_addr():
+    src_addr = socket.inet_pton(socket.AF_INET6, "2001:db8::1")
+    shared = IPv6PacketFactory(src_addr, 40000, bytes(16), 0)
+    shared.tcp_header.tcp_syn = 1
+    template = shared.generate_template()
+
+    for _ in range(1_000):
+        port = randint(1, 65535)
+        seq = randint(0, 0xFFFFFFFF)
+        dst_addr = randint(0, (1 << 128) - 1).to_bytes(16, "big")
+
+        pf = IPv6PacketFactory(src_addr, 40000, dst_addr, port)
+        pf.tcp_header.tcp_syn = 1
+        pf.tcp_header.seq_num = seq
+
+        assert template.build(port, seq, dst_addr=dst_addr) == pf.generate_packet()
+
+
+def test_ipv6_checksum():
+    src_addr = socket.inet_pton(socket.AF_INET6, "2001:db8::1")
+    dst_addr = socket.inet_pton(socket.AF_INET6, "2001:db8::2")
+    pf = IPv6PacketFactory(src_addr, 40000, dst_addr, 443)
+    pf.tcp_header.tcp_syn = 1
+    packet = pf.generate_packet()
+
+    # the header carries the payload length, the kernel does not fill it in
+    assert unpack("!H", packet[4:6])[0] == 20
+
+    # summed with the pseudo header of RFC 8200, a valid segment gives ~0
+    psh = src_addr + dst_addr + pack("!L3xB", 20, socket.IPPROTO_TCP)
+    data = psh + packet[40:]
+    s = sum(unpack(f"!{len(data) // 2}H", data))
+    while s >> 16:
+        s = (s & 0xFFFF) + (s >> 16)
+    assert s == 0xFFFF
+
+
+def test_ack_template_carries_seq_in_ack():
+    shared = make_factory(0)
+    shared.tcp_header.flags = TCP_ACK
+    template = shared.generate_template()
+
+    for _ in range(1_000):
+        port = randint(1, 65535)
+        seq = randint(0, 0xFFFFFFFF)
+
+        pf = make_factory(port)
+        pf.tcp_header.flags = TCP_ACK
+        pf.tcp_header.seq_num = seq
+        pf.tcp_header.ack_num = seq
+
+        assert template.build(port, seq) == pf.generate_packet()
@@ -0,0 +1,34 @@
+from core.permutation import CyclicPermutation, is_prime
+
+
+def test_is_prime():
+    primes = [n for n in range(100) if is_prime(n)]
+
+    assert primes == [n for n in range(2, 100) if all(n % d for d in range(2, n))]
+    assert is_prime(2**61 - 1)
+    assert not is_prime(2**61 + 1)
+
+
+def test_visits_every_index_once():
+    for size in (0, 1, 2, 3, 10, 1000, 65535):
+        order = list(CyclicPermutation(size, seed=1))
+
+        assert sorted(order) == list(range(size))
+
+
+def test_seed_fixes_the_order():
+    assert list(CyclicPermutation(1000, seed=7)) == list(
+        CyclicPermutation(1000, seed=7)
+    )
+    assert list(CyclicPermutation(1000, seed=7)) != list(
+        CyclicPermutation(1000, seed=8)
+    )
+    assert list(CyclicPermutation(1000, seed=7)) != list(range(1000))
+
+
+def test_resume_from_step():
+    perm = CyclicPermutation(1000, seed=3)
+    walked = list(perm.walk())
+    step = walked[400][0]
+
+    assert list(perm.walk(step)) == walked[400:]
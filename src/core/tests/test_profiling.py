@@ -0,0 +1,32 @@
+from threading import Thread
+
+from core import headers, packet_factory, pinger
+from core.profiling import ScanProfiler, subsystem
+from core.scanners import probe_engine
+
+
+def test_subsystems():
+    assert subsystem(headers.__file__) == "headers"
+    assert subsystem(packet_factory.__file__) == "packet_factory"
+    assert subsystem(pinger.__file__) == "pinger"
+    assert subsystem(probe_engine.__file__) == "scanners"
+    assert subsystem(Thread.__init__.__code__.co_filename) == "python"
+    assert subsystem("~") == "builtins"
+
+
+def build_packets():
+    pf = packet_factory.PacketFactory(bytes(4), 1, bytes(4), 2)
+    for _ in range(100):
+        pf.generate_packet()
+
+
+def test_profiles_threads():
+    with ScanProfiler() as profiler:
+        thread = Thread(target=build_packets)
+        thread.start()
+        thread.join()
+
+    report = profiler.report()
+
+    assert "packet_factory" in report
+    assert "generate_packet" in report
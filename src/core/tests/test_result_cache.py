@@ -0,0 +1,95 @@
+from ipaddress import IPv4Address
+
+from core import result_cache
+from core.result_cache import ResultCache
+from core.results import PortFinding, PortStatus
+
+FIRST = IPv4Address("192.0.2.1")
+SECOND = IPv4Address("192.0.2.2")
+
+
+def run_plan(cache: ResultCache, hosts, ports: list[int]):
+    plan = cache.plan(hosts, ports)
+    served = []
+    while True:
+        try:
+            served.append(next(plan))
+        except StopIteration as done:
+            return served, done.value
+
+
+def fill(path: str, findings: list[PortFinding], ttl: float = 60) -> ResultCache:
+    cache = ResultCache(path, ttl)
+    cache.open("SYN")
+    for finding in findings:
+        cache.record(finding)
+    cache.close()
+    return cache
+
+
+def test_fresh_results_are_served(tmp_path):
+    path = str(tmp_path / "cache.db")
+    fill(
+        path,
+        [
+            PortFinding(FIRST, 22, PortStatus.OPEN),
+            PortFinding(FIRST, 80, PortStatus.CLOSED),
+            PortFinding(SECOND, 80, PortStatus.FILTERED),
+        ],
+    )
+
+    cache = ResultCache(path, 60)
+    cache.open("SYN")
+    served, groups = run_plan(cache, [FIRST, SECOND], [22, 80, 443])
+    cache.close()
+
+    assert served == [
+        PortFinding(FIRST, 80, PortStatus.CLOSED),
+        PortFinding(SECOND, 80, PortStatus.FILTERED),
+    ]
+    # open ports are probed again, hosts needing the same ports go together
+    assert groups == [([FIRST, SECOND], [22, 443])]
+    assert cache.served == 2
+
+
+def test_scan_types_are_kept_apart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    fill(path, [PortFinding(FIRST, 80, PortStatus.CLOSED)])
+
+    cache = ResultCache(path, 60)
+    cache.open("ACK")
+    served, groups = run_plan(cache, [FIRST], [80])
+    cache.close()
+
+    assert not served
+    assert groups == [([FIRST], [80])]
+
+
+def test_old_results_expire(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    monkeypatch.setattr(result_cache, "time", lambda: 1000.0)
+    fill(path, [PortFinding(FIRST, 80, PortStatus.CLOSED)])
+
+    monkeypatch.setattr(result_cache, "time", lambda: 1061.0)
+    cache = ResultCache(path, 60)
+    cache.open("SYN")
+    served, groups = run_plan(cache, [FIRST], [80])
+    cache.close()
+
+    assert not served
+    assert groups == [([FIRST], [80])]
+
+
+def test_oldest_results_are_evicted(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    for port, now in ((80, 1000.0), (81, 1001.0), (82, 1002.0)):
+        monkeypatch.setattr(result_cache, "time", lambda now=now: now)
+        fill(path, [PortFinding(FIRST, port, PortStatus.CLOSED)])
+
+    cache = ResultCache(path, 60, max_entries=2)
+    cache.open("SYN")
+    cache.evict()
+    served, _ = run_plan(cache, [FIRST], [80, 81, 82])
+    cache.close()
+
+    assert [finding.port for finding in served] == [81, 82]
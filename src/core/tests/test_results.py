@@ -0,0 +1,60 @@
+import pickle
+from ipaddress import IPv4Address
+
+import pytest
+
+from core.results import PortStates, PortStatus, ScanResult
+
+
+def test_reads_like_a_dict():
+    states = PortStates({443: PortStatus.OPEN, 22: PortStatus.CLOSED})
+
+    assert states[443] == PortStatus.OPEN
+    assert 22 in states
+    assert 80 not in states
+    assert states.get(80) is None
+    assert len(states) == 2
+    # ports iterate in ascending order
+    assert list(states.items()) == [(22, PortStatus.CLOSED), (443, PortStatus.OPEN)]
+
+
+def test_delete_and_missing_port():
+    states = PortStates({80: PortStatus.OPEN})
+
+    del states[80]
+
+    assert not states
+    with pytest.raises(KeyError):
+        _ = states[80]
+
+
+def test_wrong_port_is_rejected():
+    states = PortStates()
+
+    with pytest.raises(ValueError):
+        states[65536] = PortStatus.OPEN
+
+
+def test_aggregate_queries():
+    states = PortStates((port, PortStatus.CLOSED) for port in range(1, 65536))
+    for port in (22, 80, 65535):
+        states[port] = PortStatus.OPEN
+
+    assert states.count_open() == 3
+    assert states.open_ports() == [22, 80, 65535]
+    assert states.count(PortStatus.CLOSED) == 65532
+
+
+def test_storage_grows_only_to_highest_port():
+    states = PortStates({80: PortStatus.OPEN})
+
+    assert len(states.to_bytes()) == 81
+
+
+def test_serialization_round_trip():
+    res = ScanResult(PortStates({22: PortStatus.OPEN}), IPv4Address("192.0.2.1"))
+
+    restored = pickle.loads(pickle.dumps(res))
+
+    assert restored == res
+    assert PortStates.from_bytes(res.port_status.to_bytes()) == res.port_status
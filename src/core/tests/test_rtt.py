@@ -0,0 +1,55 @@
+from core.rtt import RTTEstimator
+
+
+def test_initial_rto_without_samples():
+    rtt = RTTEstimator(initial_rto=10)
+
+    assert rtt.rto("192.0.2.1") == 10
+
+
+def test_lan_host_converges_to_min_rto():
+    rtt = RTTEstimator(initial_rto=10, min_rto=0.05)
+
+    for _ in range(20):
+        rtt.update("192.0.2.1", 0.0002)
+
+    assert rtt.rto("192.0.2.1") == 0.05
+
+
+def test_rto_follows_first_sample():
+    rtt = RTTEstimator(initial_rto=10)
+
+    rtt.update("192.0.2.1", 0.3)
+
+    # srtt + 4 * rttvar with rttvar = rtt / 2
+    assert abs(rtt.rto("192.0.2.1") - 0.9) < 1e-9
+
+
+def test_unknown_host_uses_initial_rto():
+    rtt = RTTEstimator(initial_rto=10)
+
+    # a nearby host does not cut the timeout of the others
+    for _ in range(20):
+        rtt.update("127.0.0.1", 0.0001)
+
+    assert rtt.rto("127.0.0.1") == rtt.min_rto
+    assert rtt.rto("192.0.2.2") == 10
+
+
+def test_longest_rto_is_kept():
+    rtt = RTTEstimator(initial_rto=10)
+    assert rtt.longest_rto() == 10
+
+    rtt.update("192.0.2.1", 0.3)
+    rtt.update("192.0.2.2", 0.1)
+
+    assert abs(rtt.longest_rto() - 0.9) < 1e-9
+
+
+def test_seed_only_counts_once():
+    rtt = RTTEstimator(initial_rto=10)
+
+    rtt.seed("192.0.2.1", 0.3)
+    rtt.seed("192.0.2.1", 5)
+
+    assert rtt.srtt("192.0.2.1") == 0.3
@@ -0,0 +1,83 @@
+# pylint: disable=protected-access
+from ipaddress import IPv4Address, IPv4Network
+import socket
+
+import pytest
+
+from core.checkpoint import Checkpoint
+from core.results import HostFinding, PingStatus, PortFinding, PortStatus
+from core.scan_manager import ScanManager
+from core.scanners.scanner import ScanType
+
+
+def make_manager(workers: int) -> ScanManager:
+    manager = ScanManager(ScanType.TCP, workers=workers)
+    manager.add_target_network(IPv4Network("192.0.2.0/28"))
+    manager.set_target_port_range(1, 100)
+    return manager
+
+
+def test_resumed_scan_is_split_like_the_saved_one(tmp_path):
+    path = str(tmp_path / "scan.ckpt")
+    saved = make_manager(4)
+    saved.set_checkpoint(path)
+    saved._open_stores()
+    saved._close_stores()
+
+    resumed = make_manager(1)
+    resumed.set_checkpoint(path, resume=True)
+    resumed._open_stores()
+    resumed._close_stores()
+
+    hosts, ports = list(saved.target_hosts), saved.target_ports
+    assert resumed._shard(hosts, ports) == saved._shard(hosts, ports)
+
+
+def test_resumed_ping_reports_down_hosts(tmp_path):
+    path = str(tmp_path / "scan.ckpt")
+    manager = make_manager(1)
+    live = HostFinding(IPv4Address("192.0.2.3"), PingStatus(2, True))
+    checkpoint = Checkpoint(path)
+    checkpoint.open(manager._fingerprint())
+    checkpoint.record_ping([live])
+    checkpoint.close()
+
+    manager.set_checkpoint(path, resume=True)
+    manager._open_stores()
+    pinged = list(manager._discover(manager._create_scanner(1)))
+    manager._close_stores()
+
+    assert len(pinged) == len(manager.target_hosts)
+    assert [finding for finding in pinged if finding.ping_status.success] == [live]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_open_only_streams_open_ports(workers):
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+
+        manager = ScanManager(ScanType.TCP, do_ping=False, workers=workers)
+        manager.add_target_host(IPv4Address("127.0.0.1"))
+        manager.set_target_ports([port, 1, 2, 3])
+        findings = list(manager.iter_results(open_only=True))
+
+    assert findings == [PortFinding(IPv4Address("127.0.0.1"), port, PortStatus.OPEN)]
+
+
+@pytest.mark.parametrize("workers", [1, 2, 3, 8, 64])
+@pytest.mark.parametrize("hosts", [1, 5, 14])
+def test_shards_cover_every_probe_once(workers, hosts):
+    manager = make_manager(workers)
+    targets = manager.target_hosts[:hosts]
+    ports = manager.target_ports
+
+    probes = [
+        (host, port)
+        for shard_hosts, shard_ports in manager._shard(targets, ports)
+        for host in shard_hosts
+        for port in shard_ports
+    ]
+
+    assert sorted(probes) == sorted((host, port) for host in targets for port in ports)
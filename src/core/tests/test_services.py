@@ -0,0 +1,109 @@
+from dataclasses import replace
+from ipaddress import IPv4Address
+from threading import Thread
+from time import monotonic
+import asyncio
+import socket
+
+from core.results import PortFinding, PortStatus, Service
+from core.services import PROBES, ServiceDetector, match_banner
+
+
+def test_signatures():
+    assert match_banner(b"SSH-2.0-OpenSSH_8.9p1 Ubuntu-3\r\n") == Service(
+        "ssh", "OpenSSH_8.9p1 Ubuntu-3"
+    )
+    assert match_banner(
+        b"HTTP/1.1 200 OK\r\nDate: today\r\nServer: nginx/1.24.0\r\n\r\n"
+    ) == Service("http", "nginx/1.24.0")
+    assert match_banner(b"HTTP/1.0 404 Not Found\r\nDate: today\r\n\r\n") == Service(
+        "http"
+    )
+    assert match_banner(b"220 mail.example.com ESMTP Postfix\r\n") == Service(
+        "smtp", "mail.example.com ESMTP Postfix"
+    )
+    assert match_banner(b"J\x00\x00\x00\x0a8.0.36\x00rest") == Service(
+        "mysql", "8.0.36"
+    )
+    assert match_banner(b"\x15\x03\x03\x00\x02\x02\x28") == Service("tls")
+
+
+def test_partial_replies_do_not_match():
+    # the rest of the headers may still hold the server
+    assert match_banner(b"HTTP/1.1 200 OK\r\nDate: today") is None
+    assert match_banner(b"SSH-2.0-Open") is None
+
+
+def test_ports_get_their_probes_first():
+    names = [probe.name for probe in ServiceDetector().probes_for(443)]
+    assert names == ["tls", "banner", "http"]
+    names = [probe.name for probe in ServiceDetector().probes_for(22)]
+    assert names == ["ssh", "banner", "http", "tls"]
+
+
+async def detect_http() -> tuple[list, int]:
+    connections = 0
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        nonlocal connections
+        connections += 1
+        # quiet until asked, like a web server
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.0 200 OK\r\nServer: test/1.0\r\n\r\n")
+        writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    fast = tuple(replace(probe, timeout=0.2) for probe in PROBES)
+    found: list = []
+    async with server:
+        finding = PortFinding(IPv4Address("127.0.0.1"), port, PortStatus.OPEN)
+        await ServiceDetector(probes=fast).detect_async([finding], found.append)
+    return found, connections
+
+
+def test_probes_share_a_connection():
+    found, connections = asyncio.run(detect_http())
+
+    # the banner wait and the HEAD went over the same connection
+    assert connections == 1
+    assert [finding.service for finding in found] == [Service("http", "test/1.0")]
+
+
+def greeter() -> socket.socket:
+    # says who it is as soon as someone connects, like a mail server
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def greet():
+        connection, _ = server.accept()
+        with connection:
+            connection.sendall(b"220 mail.example.com ESMTP test\r\n")
+            connection.recv(1)
+
+    Thread(target=greet, daemon=True).start()
+    return server
+
+
+def test_findings_are_streamed():
+    host = IPv4Address("127.0.0.1")
+    fast = tuple(replace(probe, timeout=0.5) for probe in PROBES)
+    with greeter() as talker, socket.socket() as silent:
+        # connections are accepted by the kernel, nothing is ever said on them
+        silent.bind(("127.0.0.1", 0))
+        silent.listen()
+        targets = [
+            PortFinding(host, silent.getsockname()[1], PortStatus.OPEN),
+            PortFinding(host, talker.getsockname()[1], PortStatus.OPEN),
+        ]
+
+        start = monotonic()
+        found = ServiceDetector(probes=fast).run(targets)
+        first = next(found)
+
+        # out before the silent port ran through its probes
+        assert monotonic() - start < 0.5
+        assert first.port == talker.getsockname()[1]
+        assert first.service.name == "smtp"
+        assert not list(found)
@@ -0,0 +1,29 @@
+import socket
+
+import pytest
+
+from core.source_pool import SourcePool, local_ip
+
+
+def test_reserves_distinct_ports_per_address():
+    with SourcePool(["127.0.0.1", "127.0.0.2"], 4) as pool:
+        assert len(pool.sources) == 8
+        assert len(pool.ports) == 8
+        assert {ip for ip, _ in pool.sources} == {"127.0.0.1", "127.0.0.2"}
+
+        # a reserved port cannot be taken by anyone else
+        ip, port = pool.sources[0]
+        with socket.socket() as s, pytest.raises(OSError):
+            s.bind((ip, port))
+
+    assert not pool.sources
+
+
+def test_foreign_address_is_rejected():
+    with pytest.raises(ValueError):
+        SourcePool(["192.0.2.77"]).reserve()
+
+
+def test_default_address_is_cached():
+    assert SourcePool().addresses == [local_ip()]
+    assert local_ip.cache_info().hits > 0
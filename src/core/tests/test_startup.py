@@ -0,0 +1,42 @@
+from pathlib import Path
+import subprocess
+import sys
+
+SRC = Path(__file__).resolve().parents[2]
+
+# microseconds for `import main`, a few times what it takes on a laptop
+IMPORT_BUDGET_US = 300_000
+# only imported by the features that need them
+LAZY_MODULES = ("scapy", "asyncio", "sqlite3")
+
+
+def import_times() -> dict[str, int]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # "import time: self [us] | cumulative | imported package"
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_startup_skips_lazy_modules():
+    times = import_times()
+    for module in times:
+        assert module.split(".")[0] not in LAZY_MODULES
+
+
+def test_startup_within_budget():
+    # the first run also compiles the bytecode, only the second is timed
+    import_times()
+    assert import_times()["main"] < IMPORT_BUDGET_US
@@ -0,0 +1,90 @@
+from ipaddress import IPv4Address, IPv4Network, IPv6Network
+import pickle
+
+import pytest
+
+from core.targets import TargetSet, host_count
+
+
+def test_network_matches_hosts():
+    for network in (
+        IPv4Network("192.0.2.0/29"),
+        IPv4Network("192.0.2.0/31"),
+        IPv4Network("192.0.2.1/32"),
+        IPv6Network("2001:db8::/125"),
+    ):
+        targets = TargetSet()
+        targets.add_network(network)
+
+        assert list(targets) == list(network.hosts())
+        assert len(targets) == len(list(network.hosts()))
+
+
+def test_large_network_is_not_expanded():
+    targets = TargetSet()
+    targets.add_network(IPv4Network("10.0.0.0/8"))
+
+    assert len(targets) == 2**24 - 2
+    assert targets[0] == IPv4Address("10.0.0.1")
+    assert targets[-1] == IPv4Address("10.255.255.254")
+
+
+def test_exclusions_and_duplicates():
+    targets = TargetSet()
+    targets.add_network(IPv4Network("192.0.2.0/28"))
+    targets.add_host(IPv4Address("192.0.2.5"))
+    targets.exclude(IPv4Network("192.0.2.4/30"))
+    targets.exclude(IPv4Address("192.0.2.10"))
+
+    expected = [
+        host
+        for host in IPv4Network("192.0.2.0/28").hosts()
+        if host not in IPv4Network("192.0.2.4/30") and host != IPv4Address("192.0.2.10")
+    ]
+    assert list(targets) == expected
+    assert [targets[i] for i in range(len(targets))] == expected
+    assert IPv4Address("192.0.2.10") not in targets
+
+
+def test_slices_are_lazy_views():
+    targets = TargetSet()
+    targets.add_range(IPv4Address("192.0.2.1"), IPv4Address("192.0.2.10"))
+
+    shard = targets[1::3]
+
+    assert list(shard) == [IPv4Address(f"192.0.2.{i}") for i in (2, 5, 8)]
+    assert list(pickle.loads(pickle.dumps(shard))) == list(shard)
+
+
+def test_hosts_are_found_by_index():
+    targets = TargetSet()
+    targets.add_network(IPv4Network("10.0.0.0/8"))
+    targets.add_network(IPv6Network("2001:db8::/64"))
+    host = IPv4Address("10.1.2.3")
+
+    assert targets[targets.index(host)] == host
+    assert targets[::2].index(host) == targets.index(host) // 2
+    with pytest.raises(ValueError):
+        targets[1::2].index(host)
+    with pytest.raises(ValueError):
+        targets.index(IPv4Address("192.0.2.1"))
+
+
+def test_versions_of_views():
+    targets = TargetSet()
+    targets.add_network(IPv4Network("192.0.2.0/30"))
+    targets.add_network(IPv6Network("2001:db8::/126"))
+
+    assert targets.versions == {4, 6}
+    for view in (targets[:2], targets[2:], targets[1::2], targets[::3], targets[:0]):
+        assert view.versions == {host.version for host in view}
+
+
+def test_ipv6_networks_past_len():
+    targets = TargetSet()
+    targets.add_network(IPv6Network("2001:db8::/64"))
+
+    assert host_count(targets) == 2**64 - 1
+    assert host_count(targets[::2]) == 2**63
+    assert host_count(targets[1:][::-3]) == (2**64 - 2 + 2) // 3
+    assert host_count([IPv4Address("192.0.2.1")]) == 1
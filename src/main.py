@@ -1,9 +1,12 @@
 from socket import gethostbyname, gaierror
 from typing import Any
-from ipaddress import IPv4Address
+from ipaddress import IPv4Address, IPv6Address, ip_network
+import os
 import sys
 
 from util.argument_parser import ArgumentParser
+from core.metrics import ProgressReporter, serve_prometheus
+from core.profiling import ScanProfiler
 from core.scan_manager import ScanManager
 from core.scanners.scanner import ScanType
 
@@ -48,6 +51,16 @@ def parse_ports(port_str: str) -> tuple[bool, list[int]]:
     return is_range, ports
 
 
+def get_scan_type(args: dict[str, Any]) -> tuple[str, ScanType]:
+    if args["scanner_stealth"]:
+        return "stealth", ScanType.SYN
+    if args["raw_scanner"]:
+        return args["raw_scanner"], ScanType[args["raw_scanner"].upper()]
+    if args["scanner_async"]:
+        return "async", ScanType.ASYNC_TCP
+    return "regular", ScanType.TCP
+
+
 def print_configuration(args: dict[str, Any], scanner_type):
     print("Scan Configuration:")
     print(f"  Scanner Type: {scanner_type}")
@@ -63,8 +76,153 @@ def print_configuration(args: dict[str, Any], scanner_type):
         print(f"  Port Range: {args['port_range'][0]}-{args['port_range'][1]}")
     if args["ping"]:
         print("  Ping: Enabled")
-    if args["network_mask"]:
+    if args["network_mask"] is not None:
         print(f"  Network Mask: /{args['network_mask']}")
+    if args["network_prefix_v6"] is not None:
+        print(f"  IPv6 Network Prefix: /{args['network_prefix_v6']}")
+    if args["exclude"]:
+        print(f"  Excluded: {', '.join(str(net) for net in args['exclude'])}")
+    print_performance_options(args, scanner_type)
+
+
+def print_performance_options(args: dict[str, Any], scanner_type):
+    if args["rate"]:
+        print(f"  Rate: up to {args['rate']} packets/s")
+    if scanner_type == "async":
+        print(f"  Concurrency: {args['concurrency']}")
+    if args["workers"] > 1:
+        print(f"  Workers: {args['workers']}")
+    if args["open_only"]:
+        print("  Report: open ports only")
+    if args["services"]:
+        print("  Service Detection: Enabled")
+    if args["source"]:
+        print(f"  Source Addresses: {', '.join(args['source'])}")
+    if args["seed"] is not None:
+        print(f"  Probe Order Seed: {args['seed']}")
+    if args["checkpoint"]:
+        mode = "resume from" if args["resume"] else "save to"
+        print(f"  Checkpoint: {mode} {args['checkpoint']}")
+    if args["cache"]:
+        print(f"  Cache: {args['cache']} (fresh for {args['cache_ttl']:g}s)")
+    if metrics_enabled(args):
+        print("  Metrics: Enabled")
+    if args["profile"]:
+        print(f"  Profile: save to {args['profile']}")
+
+
+def set_scan_options(manager: ScanManager, args: dict[str, Any]):
+    manager.set_seed(args["seed"])
+    manager.set_source_ips(args["source"])
+    if args["checkpoint"]:
+        manager.set_checkpoint(args["checkpoint"], resume=args["resume"])
+    if args["services"]:
+        manager.enable_service_detection()
+    if args["cache"]:
+        manager.set_cache(args["cache"], args["cache_ttl"], args["cache_size"])
+
+
+def add_target(
+    manager: ScanManager, ip: IPv4Address | IPv6Address, mask: int | None
+) -> bool:
+    if mask is None:
+        manager.add_target_host(ip)
+        return True
+
+    try:
+        network = ip_network((ip, mask), strict=False)
+    except ValueError:
+        print(f"Invalid network mask for {ip}: /{mask}")
+        return False
+    try:
+        # the whole network is expanded lazily while it is scanned
+        manager.add_target_network(network)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
+    return True
+
+
+def add_targets(manager: ScanManager, args: dict[str, Any]) -> bool:
+    # each version has its own mask, a /24 means nothing to an ipv6 address
+    for ip, mask in (
+        (args["ip_v4"], args["network_mask"]),
+        (args["ip_v6"], args["network_prefix_v6"]),
+    ):
+        if ip and not add_target(manager, ip, mask):
+            return False
+
+    for network in args["exclude"]:
+        manager.exclude_target(network)
+    return True
+
+
+def run_scan(manager: ScanManager, args: dict[str, Any]) -> bool:
+    # findings are printed as soon as they are resolved
+    try:
+        for finding in manager.iter_results(open_only=args["open_only"]):
+            print(finding, flush=True)
+    except KeyboardInterrupt:
+        print("Scan interrupted")
+        if args["checkpoint"]:
+            print(f"Resume it with --checkpoint {args['checkpoint']} --resume")
+        return False
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
+    return True
+
+
+def metrics_enabled(args: dict[str, Any]) -> bool:
+    return bool(args["progress"] or args["metrics_json"] or args["metrics_port"])
+
+
+def run_with_metrics(manager: ScanManager, args: dict[str, Any]) -> bool:
+    if metrics_enabled(args):
+        manager.enable_metrics()
+    if args["metrics_port"]:
+        try:
+            serve_prometheus(
+                manager.get_metrics, args["metrics_port"], args["metrics_bind"]
+            )
+        except OSError as e:
+            print(
+                f"Error: Cannot serve metrics on {args['metrics_bind']} "
+                f"port {args['metrics_port']}: {e}"
+            )
+            return False
+
+    if args["progress"]:
+        with ProgressReporter(manager.get_metrics, args["progress"]):
+            done = run_scan(manager, args)
+    else:
+        done = run_scan(manager, args)
+
+    metrics = manager.get_metrics()
+    if args["metrics_json"] and metrics is not None:
+        with open(args["metrics_json"], "w", encoding="utf-8") as f:
+            f.write(metrics.to_json())
+    return done
+
+
+def run_profiled(manager: ScanManager, args: dict[str, Any]) -> bool:
+    if not args["profile"]:
+        return run_with_metrics(manager, args)
+
+    manager.set_profile(args["profile"])
+    with ScanProfiler() as profiler:
+        done = run_with_metrics(manager, args)
+
+    for path in manager.worker_profiles():
+        profiler.add_file(path)
+    profiler.dump(args["profile"])
+    print(f"Profile saved to {args['profile']}, own time by subsystem:")
+    print(profiler.report(), end="")
+
+    # merged into the saved profile
+    for path in manager.worker_profiles():
+        os.remove(path)
+    return done
 
 
 def main():
@@ -77,20 +235,20 @@ def main():
 
     check_args(args)
 
-    scanner_type = "stealth" if args["scanner_stealth"] else "regular"
-
+    scanner_type, scan_type = get_scan_type(args)
     print_configuration(args, scanner_type)
 
     manager = ScanManager(
-        scan_type=ScanType.SYN if args["scanner_stealth"] else ScanType.TCP,
+        scan_type=scan_type,
         do_ping=args["ping"],
-        threads=1,
+        workers=args["workers"],
+        rate=args["rate"],
+        concurrency=args["concurrency"],
     )
 
-    if args["ip_v4"]:
-        manager.add_target_host(args["ip_v4"])
-    if args["ip_v6"]:
-        manager.add_target_host(args["ip_v6"])
+    set_scan_options(manager, args)
+    if not add_targets(manager, args):
+        return
     if args["domain"]:
         try:
             manager.add_target_host(IPv4Address(gethostbyname(args["domain"])))
@@ -108,10 +266,14 @@ def main():
     elif args["port_range"] != (0, 0):
         manager.set_target_port_range(*args["port_range"])
 
-    manager.scan_all()
+    if not run_profiled(manager, args):
+        return
 
-    for result in manager.get_results():
-        print(result)
+    pacer_stats = manager.get_pacer_stats()
+    if pacer_stats is not None:
+        print(f"Rate: {pacer_stats}")
+    if manager.cache is not None:
+        print(f"Cache: {manager.cache}")
 
 
 if __name__ == "__main__":
@@ -3,6 +3,16 @@ import ipaddress
 from typing import Dict, Any
 
 
+# short flag, name and help of the raw scanners besides the stealth one
+RAW_SCANNERS = (
+    ("-sf", "fin", "Use FIN scanner"),
+    ("-sn", "null", "Use NULL scanner"),
+    ("-sx", "xmas", "Use XMAS scanner"),
+    ("-sk", "ack", "Use ACK scanner"),
+    ("-sw", "window", "Use window scanner"),
+)
+
+
 class ArgumentParser:
     def __init__(self):
         self._parser = argparse.ArgumentParser(
@@ -21,6 +31,16 @@ class ArgumentParser:
         self._parser.add_argument(
             "-ss", "--scanner-stealth", action="store_true", help="Use stealth scanner"
         )
+        self._parser.add_argument(
+            "-sa",
+            "--scanner-async",
+            action="store_true",
+            help="Use asynchronous connect scanner",
+        )
+        for short, name, help_text in RAW_SCANNERS:
+            self._parser.add_argument(
+                short, f"--scanner-{name}", action="store_true", help=help_text
+            )
         self._parser.add_argument("-ip", type=str, help="IPv4 address target")
         self._parser.add_argument("-ipv6", type=str, help="IPv6 address target")
         self._parser.add_argument("-d", "--domain", type=str, help="Target domain name")
@@ -40,7 +60,112 @@ class ArgumentParser:
             "-n",
             "--network",
             type=int,
-            help="Network mask (e.g., 24 for 255.255.255.0)",
+            help="Network mask of the IPv4 target (e.g., 24 for 255.255.255.0)",
+        )
+        self._parser.add_argument(
+            "-n6",
+            "--network6",
+            type=int,
+            help="Network prefix length of the IPv6 target (e.g., 120)",
+        )
+        self._parser.add_argument(
+            "-x",
+            "--exclude",
+            type=str,
+            help="Comma separated addresses or networks to skip",
+        )
+        self._parser.add_argument(
+            "-S",
+            "--source",
+            type=str,
+            help="Comma separated local addresses to send raw probes from",
+        )
+        self._parser.add_argument(
+            "-r",
+            "--rate",
+            type=int,
+            help="Maximum raw scan send rate in packets per second",
+        )
+        self._parser.add_argument(
+            "-c",
+            "--concurrency",
+            type=int,
+            default=5000,
+            help="Maximum connections in flight for the asynchronous scanner",
+        )
+        self._parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes",
+        )
+        self._parser.add_argument(
+            "--seed",
+            type=int,
+            help="Seed of the random probe order, to repeat a scan in the same order",
+        )
+        self._parser.add_argument(
+            "--checkpoint",
+            type=str,
+            help="File the scan progress is saved to",
+        )
+        self._parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Resume the scan saved in the checkpoint file",
+        )
+        self._parser.add_argument(
+            "--cache",
+            type=str,
+            help="SQLite file of past results, fresh ones are not probed again",
+        )
+        self._parser.add_argument(
+            "--cache-ttl",
+            type=float,
+            default=86400,
+            help="Seconds a cached result stays fresh",
+        )
+        self._parser.add_argument(
+            "--cache-size",
+            type=int,
+            default=1 << 22,
+            help="Most results kept in the cache, the oldest go first",
+        )
+        self._parser.add_argument(
+            "-o", "--open", action="store_true", help="Only report open ports"
+        )
+        self._parser.add_argument(
+            "-sV",
+            "--services",
+            action="store_true",
+            help="Find out which services run on the open ports",
+        )
+        self._parser.add_argument(
+            "--progress",
+            type=float,
+            help="Print a line of scan metrics every this many seconds",
+        )
+        self._parser.add_argument(
+            "--metrics-json",
+            type=str,
+            help="File the scan metrics are written to as JSON",
+        )
+        self._parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Port serving the scan metrics to Prometheus",
+        )
+        self._parser.add_argument(
+            "--metrics-bind",
+            type=str,
+            default="127.0.0.1",
+            help="Address the metrics are served on (default 127.0.0.1)",
+        )
+        self._parser.add_argument(
+            "--profile",
+            type=str,
+            help="Profile the scan and save the pstats to this file",
         )
 
     def parse(self) -> Dict[str, Any]:
@@ -50,6 +175,15 @@ class ArgumentParser:
             "help_": args.help,
             "scanner_regular": args.scanner_regular,
             "scanner_stealth": args.scanner_stealth,
+            "scanner_async": args.scanner_async,
+            "raw_scanner": next(
+                (
+                    name
+                    for _, name, _ in RAW_SCANNERS
+                    if getattr(args, f"scanner_{name}")
+                ),
+                None,
+            ),
             "ip_v4": None,
             "ip_v6": None,
             "domain": args.domain,
@@ -57,6 +191,25 @@ class ArgumentParser:
             "port_range": (0, 0),
             "ping": args.ping,
             "network_mask": args.network,
+            "network_prefix_v6": args.network6,
+            "exclude": [],
+            "source": [],
+            "rate": None,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "open_only": args.open,
+            "services": args.services,
+            "seed": args.seed,
+            "checkpoint": args.checkpoint,
+            "resume": args.resume,
+            "cache": args.cache,
+            "cache_ttl": args.cache_ttl,
+            "cache_size": args.cache_size,
+            "progress": None,
+            "metrics_json": args.metrics_json,
+            "metrics_port": args.metrics_port,
+            "metrics_bind": args.metrics_bind,
+            "profile": args.profile,
         }
 
         if args.ip:
@@ -82,8 +235,78 @@ class ArgumentParser:
             else:
                 print("Warning: Port values must be between 0 and 65535")
 
+        self._parse_address_options(args, args_dict)
+        self._parse_performance_options(args, args_dict)
+
         return args_dict
 
+    def _parse_address_options(
+        self, args: argparse.Namespace, args_dict: Dict[str, Any]
+    ) -> None:
+        if args.network is not None and not args.ip:
+            print("Warning: -n only applies to -ip, use -n6 for an IPv6 network")
+
+        if args.exclude:
+            for target in args.exclude.split(","):
+                try:
+                    args_dict["exclude"].append(
+                        ipaddress.ip_network(target.strip(), strict=False)
+                    )
+                except ValueError:
+                    print(f"Warning: Invalid exclusion: {target}")
+
+        try:
+            ipaddress.ip_address(args.metrics_bind)
+        except ValueError:
+            print(
+                f"Warning: Invalid metrics address, using 127.0.0.1: {args.metrics_bind}"
+            )
+            args_dict["metrics_bind"] = "127.0.0.1"
+
+        if args.source:
+            for source in args.source.split(","):
+                try:
+                    args_dict["source"].append(
+                        str(ipaddress.ip_address(source.strip()))
+                    )
+                except ValueError:
+                    print(f"Warning: Invalid source address: {source}")
+
+    def _parse_performance_options(
+        self, args: argparse.Namespace, args_dict: Dict[str, Any]
+    ) -> None:
+        if args.rate is not None:
+            if args.rate > 0:
+                args_dict["rate"] = args.rate
+            else:
+                print(f"Warning: Rate must be greater than 0: {args.rate}")
+            if args.scanner_regular or args.scanner_async:
+                print("Warning: -r only paces raw scans and ping, -sr and -sa are not")
+
+        if args.resume and not args.checkpoint:
+            print("Warning: --resume needs a --checkpoint file, starting a new scan")
+            args_dict["resume"] = False
+
+        if args.cache_ttl <= 0 or args.cache_size <= 0:
+            print("Warning: Cache TTL and size must be greater than 0, not caching")
+            args_dict["cache"] = None
+
+        if args.concurrency <= 0:
+            print(f"Warning: Concurrency must be greater than 0: {args.concurrency}")
+            args_dict["concurrency"] = 1
+
+        if args.workers <= 0:
+            print(f"Warning: Workers must be greater than 0: {args.workers}")
+            args_dict["workers"] = 1
+
+        if args.progress is not None:
+            if args.progress > 0:
+                args_dict["progress"] = args.progress
+            else:
+                print(
+                    f"Warning: Progress interval must be greater than 0: {args.progress}"
+                )
+
     def get_help_text(self) -> str:
         help_text = """
 Port Scanner Tool
@@ -93,17 +316,59 @@ Options:
   -h, --help             Show this help message
   -sr, --scanner-regular Use regular TCP scanner
   -ss, --scanner-stealth Use stealth scanner (SYN scan)
+  -sa, --scanner-async   Use asynchronous connect scanner
+  -sf, --scanner-fin     Use FIN scanner, open ports do not answer
+  -sn, --scanner-null    Use NULL scanner, a probe without flags
+  -sx, --scanner-xmas    Use XMAS scanner, FIN, PSH and URG set
+  -sk, --scanner-ack     Use ACK scanner, tells filtered from unfiltered ports
+  -sw, --scanner-window  Use window scanner, an ACK scan reading the RST window
   -ip IP                 Target IPv4 address
   -ipv6 IPV6             Target IPv6 address
   -p, --port PORT        Specific port to scan
   -ps, --port-start PORT Start of port range
   -pe, --port-end PORT   End of port range
   -pp, --ping            Enable ping before scanning
-  -n, --network MASK     Network mask (e.g., 24 for /24)
+  -n, --network MASK     Network mask of the IPv4 target (e.g., 24 for /24)
+  -n6, --network6 PREFIX Network prefix length of the IPv6 target (e.g., 120)
+  -x, --exclude LIST     Comma separated addresses or networks to skip
+  -S, --source LIST      Comma separated local addresses to send raw probes from
+  -r, --rate PPS         Maximum raw scan send rate in packets per second
+  -c, --concurrency N    Connections in flight for the async scanner (default 5000)
+  -w, --workers N        Number of worker processes (default 1)
+  --cache FILE           Keep results in FILE, fresh ones are served from it
+                         instead of probing again, open ports are always probed
+  --cache-ttl SECONDS    Seconds a cached result stays fresh (default 86400)
+  --cache-size N         Most results kept in the cache (default 4194304)
+  -o, --open             Only report open ports
+  -sV, --services        Probe open ports for the service and version behind
+                         them: banners, HTTP HEAD, TLS ClientHello, SSH ident
+  --seed N               Seed of the random probe order
+  --checkpoint FILE      Save the scan progress to FILE
+  --resume               Resume the scan saved in the checkpoint file
+  --progress SECONDS     Print probes, replies, rtt and time spent every SECONDS
+  --metrics-json FILE    Write the scan metrics to FILE as JSON
+  --metrics-port PORT    Serve the scan metrics to Prometheus on PORT
+  --metrics-bind ADDR    Address the metrics are served on (default 127.0.0.1),
+                         0.0.0.0 or :: to let other machines scrape them
+  --profile FILE         Profile the scan, save the pstats to FILE and print
+                         the hottest functions by subsystem
 
 Examples:
   python main.py -ip 192.168.1.1 -p 80 -pp
   python main.py -ip 192.168.1.1 -ps 1 -pe 1000 -sr
   python main.py -ip 192.168.1.0 -n 24 -ss
+  python main.py -ip 10.0.0.0 -n 8 -x 10.1.0.0/16,10.2.3.4 -p 22 -ss -r 50000
+  python main.py -ip 192.168.1.1 -ps 1 -pe 65535 -ss -r 10000 -o
+  python main.py -ip 10.0.0.0 -n 8 -p 22 -ss -r 50000 -S 10.9.0.2,10.9.0.3
+  python main.py -ipv6 2001:db8::1 -ps 1 -pe 1024 -ss -r 10000
+  python main.py -ip 192.168.1.1 -ps 1 -pe 65535 -sa -c 5000
+  python main.py -ip 192.168.1.0 -n 24 -ps 1 -pe 1024 -ss -r 10000 -o -sV
+  python main.py -ip 192.168.1.0 -n 24 -ps 1 -pe 1024 -sk -r 10000
+  python main.py -ip 192.168.0.0 -n 16 -ps 1 -pe 1024 -ss -w 8
+  python main.py -ip 10.0.0.0 -n 8 -p 22 -ss -r 50000 --checkpoint scan.ckpt
+  python main.py -ip 10.0.0.0 -n 8 -p 22 -ss -r 50000 --checkpoint scan.ckpt --resume
+  python main.py -ip 10.0.0.0 -n 16 -p 80 -ss -r 50000 --progress 5 --metrics-port 9100
+  python main.py -ip 10.0.0.0 -n 16 -ps 1 -pe 1024 -ss -r 50000 --cache fleet.db --cache-ttl 43200
+  python main.py -ip 192.168.1.0 -n 24 -ps 1 -pe 1024 -ss -r 10000 --profile scan.prof
         """
         return help_text